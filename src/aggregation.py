@@ -0,0 +1,109 @@
+import os
+import logging
+import pandas as pd
+from journal import sort_lines
+from rules import shopify_rules
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+# Niveaux de détail des écritures générées
+# - transaction: une série d'écritures par transaction/commande (comportement historique)
+# - day: un total par (journal, date, compte, section analytique, sens)
+# - day_category: idem, en distinguant en plus la catégorie de vente (zone Shopify)
+GRANULARITIES = ['transaction', 'day', 'day_category']
+
+# Libellés des écritures agrégées par source
+SOURCE_LABELS = {
+    'stripe': 'Stripe',
+    'shopify': 'Shopify',
+}
+
+# Index des colonnes d'une ligne comptable
+COL_JOURNAL, COL_DATE, COL_ACCOUNT, COL_ANALYTIC = 0, 1, 3, 4
+COL_DEBIT, COL_CREDIT, COL_REFERENCE = 7, 8, 15
+
+
+def detail_path(output_path):
+    """
+    Chemin du fichier annexe détaillé associé au fichier de sortie.
+
+    Args:
+        output_path: Chemin du fichier CSV de sortie
+
+    Returns:
+        Chemin '<sortie>_detail.csv'
+    """
+    root, ext = os.path.splitext(output_path)
+    return f"{root}_detail{ext or '.csv'}"
+
+
+def line_categories(lines, file_type):
+    """
+    Détermine la catégorie de vente de chaque ligne.
+
+    Pour Shopify, toutes les lignes d'une commande (même référence) reçoivent la
+    catégorie de ses comptes propres à une catégorie (table rules/shopify.csv).
+    Stripe n'a pas de catégorie: le code
+    journal distingue déjà les encaissements (B5) des ventes (VE).
+
+    Args:
+        lines: Lignes comptables d'un fichier
+        file_type: Type de source ('stripe', 'shopify'...)
+
+    Returns:
+        Liste des catégories (chaîne vide si non applicable)
+    """
+    if file_type != 'shopify':
+        return [''] * len(lines)
+
+    account_categories = shopify_rules().account_categories
+    by_reference = {}
+    for line in lines:
+        category = account_categories.get(line[COL_ACCOUNT])
+        if category:
+            by_reference.setdefault(line[COL_REFERENCE], category)
+    return [by_reference.get(line[COL_REFERENCE], '') for line in lines]
+
+
+def aggregate_lines(lines, file_type, granularity):
+    """
+    Agrège en masse les montants des lignes comptables selon la granularité demandée.
+
+    Args:
+        lines: Lignes comptables détaillées d'un fichier
+        file_type: Type de source ('stripe', 'shopify'...)
+        granularity: Niveau de détail (voir GRANULARITIES)
+
+    Returns:
+        Liste des lignes comptables agrégées, triées par (date, journal)
+    """
+    if granularity == 'transaction' or not lines:
+        return lines
+
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Granularité inconnue: {granularity} (attendu: {', '.join(GRANULARITIES)})")
+
+    df = pd.DataFrame(lines)
+    debit = pd.to_numeric(df[COL_DEBIT], errors='coerce')
+    credit = pd.to_numeric(df[COL_CREDIT], errors='coerce')
+
+    df['side'] = debit.notna().map({True: 'D', False: 'C'})
+    df['amount'] = debit.fillna(credit).fillna(0.0)
+    df['category'] = line_categories(lines, file_type) if granularity == 'day_category' else ''
+
+    keys = [COL_JOURNAL, COL_DATE, COL_ACCOUNT, COL_ANALYTIC, 'category', 'side']
+    totals = df.groupby(keys, sort=False, dropna=False)['amount'].sum().round(2)
+
+    label = SOURCE_LABELS.get(file_type, file_type.capitalize())
+    aggregated = []
+    for (journal, date, account, analytic, category, side), amount in totals.items():
+        aggregated.append([
+            journal, date, None, account, None if pd.isna(analytic) else analytic,
+            f"{label} {category}" if category else label, date,
+            amount if side == 'D' else None, amount if side == 'C' else None,
+            "", "", "", "", "", "", "", "", "", "", "", ""
+        ])
+
+    logger.info(f"✓ Agrégation '{granularity}': {len(lines)} ligne(s) → {len(aggregated)} ligne(s)")
+    return sort_lines(aggregated)
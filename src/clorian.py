@@ -4,6 +4,9 @@ import re
 import logging
 from datetime import datetime
 import warnings
+from excel_reader import read_excel
+from rules import clorian_payment_methods, clorian_complements
+from journal import sort_lines
 
 # Configuration du logging
 logging.basicConfig(level=logging.DEBUG)
@@ -12,13 +15,22 @@ logger = logging.getLogger(__name__)
 # Supprimer les avertissements openpyxl
 warnings.filterwarnings("ignore", category=UserWarning, module="openpyxl")
 
+# Méthodes de paiement à traiter: {méthode: {'account', 'label'}} (table rules/clorian.csv)
+PAYMENT_METHODS_CONFIG = clorian_payment_methods()
+
+# Écritures complémentaires: {ligne: {'account', 'analytic', 'label', 'side'}} (table rules/clorian_complements.csv)
+COMPLEMENTS_CONFIG = clorian_complements()
+
+# Colonnes utilisées pour la génération des écritures
+CLORIAN_COLUMNS = ['Méthode de paiement', 'Montant (€)', 'Montant (HT)', 'TVA (€)']
+
 
 def clorian(file_in_memory, file_path):
     """
     Traite un fichier Excel Clorian en mémoire et génère les écritures comptables.
     
     Args:
-        file_in_memory: Objet BytesIO contenant le fichier Excel Clorian
+        file_in_memory: Objet fichier binaire (BytesIO ou MappedFile) contenant le fichier Excel Clorian
         file_path: Chemin ou nom du fichier pour extraction de la date
     
     Returns:
@@ -38,32 +50,19 @@ def clorian(file_in_memory, file_path):
         logger.info("="*80)
         logger.info(f"Fichier: {file_path}")
         
-        # Validation de l'objet file_in_memory
-        if not isinstance(file_in_memory, io.BytesIO):
-            logger.error(f"L'objet file_in_memory n'est pas un BytesIO: {type(file_in_memory)}")
+        # Validation de l'objet file_in_memory (BytesIO ou fichier projeté en mémoire)
+        if not isinstance(file_in_memory, io.IOBase):
+            logger.error(f"L'objet file_in_memory n'est pas un objet fichier: {type(file_in_memory)}")
             return []
         
-        logger.debug("✓ Objet BytesIO valide")
+        logger.debug("✓ Objet fichier valide")
         
         # Extraction de la date du nom de fichier
-        file_date_pattern = r'clorian_(\d{2})-(\d{2})-(\d{4})\.xlsx'
-        match = re.search(file_date_pattern, file_path)
-        
-        if match:
-            file_date_str = f"{match.group(1)}-{match.group(2)}-{match.group(3)}"
-            try:
-                file_date = datetime.strptime(file_date_str, '%d-%m-%Y').strftime('%d/%m/%Y')
-                logger.info(f"✓ Date extraite du nom de fichier: {file_date}")
-            except ValueError as e:
-                logger.error(f"Erreur de format de date '{file_date_str}': {e}")
-                file_date = 'date_inconnue'
-        else:
-            logger.warning(f"Format de nom de fichier non reconnu, impossible d'extraire la date: {file_path}")
-            file_date = 'date_inconnue'
+        file_date = extract_file_date(file_path)
         
-        # Lecture du fichier Excel depuis BytesIO
+        # Lecture du fichier Excel depuis le tampon
         try:
-            df = pd.read_excel(file_in_memory, engine='openpyxl', sheet_name='Resultado consulta')
+            df = read_excel(file_in_memory, sheet_name='Resultado consulta')
             logger.info(f"✓ Fichier Excel chargé avec {len(df)} lignes")
             logger.info(f"✓ Colonnes détectées: {list(df.columns)}")
         except Exception as e:
@@ -92,34 +91,10 @@ def clorian(file_in_memory, file_path):
         logger.info(f"\n{df.to_string()}")
         logger.info("="*80)
         
-        # Définition des méthodes de paiement à traiter
-        payment_methods_config = {
-            "Carte bancaire": {
-                "account": 467300,
-                "label": "Caisse billeterie CLORIAN CB"
-            },
-            "Carte Bancaire (TPE Virtuel)": {
-                "account": 467300,
-                "label": "Caisse billeterie CLORIAN CB TPE Virtuel"
-            },
-            "Espèces": {
-                "account": 531005,
-                "label": "Caisse billeterie CLORIAN Espèces"
-            },
-            "Voucher": {
-                "account": 445712,
-                "label": "Caisse billeterie CLORIAN Voucher"
-            },
-            "Amex": {
-                "account": 511319,
-                "label": "Caisse billeterie CLORIAN Amex"
-            }
-        }
-        
         # Traitement de chaque méthode de paiement
         logger.info("\nTraitement des méthodes de paiement:")
         
-        for method, config in payment_methods_config.items():
+        for method, config in PAYMENT_METHODS_CONFIG.items():
             method_data = df.loc[df['Méthode de paiement'] == method, 'Montant (€)']
             
             if not method_data.empty:
@@ -176,7 +151,7 @@ def clorian(file_in_memory, file_path):
         logger.info(f"✓ {len(output)} lignes comptables générées au total")
         logger.info("="*80 + "\n")
         
-        return output
+        return sort_lines(output)
     
     except FileNotFoundError as e:
         logger.error(f"Fichier introuvable: {e}")
@@ -191,6 +166,132 @@ def clorian(file_in_memory, file_path):
         return []
 
 
+def extract_file_date(file_path):
+    """
+    Extrait la date d'un nom de fichier Clorian (clorian_DD-MM-YYYY.xlsx).
+    
+    Args:
+        file_path: Chemin ou nom du fichier
+    
+    Returns:
+        Date au format jj/mm/aaaa, ou 'date_inconnue'
+    """
+    file_date_pattern = r'clorian_(\d{2})-(\d{2})-(\d{4})\.xlsx'
+    match = re.search(file_date_pattern, file_path)
+    
+    if match:
+        file_date_str = f"{match.group(1)}-{match.group(2)}-{match.group(3)}"
+        try:
+            file_date = datetime.strptime(file_date_str, '%d-%m-%Y').strftime('%d/%m/%Y')
+            logger.info(f"✓ Date extraite du nom de fichier: {file_date}")
+            return file_date
+        except ValueError as e:
+            logger.error(f"Erreur de format de date '{file_date_str}': {e}")
+            return 'date_inconnue'
+    
+    logger.warning(f"Format de nom de fichier non reconnu, impossible d'extraire la date: {file_path}")
+    return 'date_inconnue'
+
+
+def clorian_batch(files):
+    """
+    Traite en une seule passe un lot de fichiers Clorian (ex: rejeu d'un mois).
+    
+    Toutes les feuilles sont concaténées puis indexées une seule fois par
+    (fichier, méthode de paiement); les lignes de paiement, HT, TVA et espèces
+    de tous les fichiers sont produites à partir de ce pivot. Deux fichiers
+    de même date (réexport, second site) produisent chacun leurs écritures.
+    
+    Args:
+        files: Liste de tuples (file_in_memory, file_path)
+    
+    Returns:
+        Liste des lignes comptables générées (mêmes lignes que clorian() fichier par fichier)
+    """
+    output = []
+    frames = []
+    sources = []  # (chemin du fichier, date), dans l'ordre du lot
+    # Fichiers dont la feuille contient les colonnes HT et TVA (sinon pas de lignes complémentaires)
+    has_totals = {}
+    files_by_date = {}
+    
+    logger.info("="*80)
+    logger.info(f"DÉBUT DU TRAITEMENT CLORIAN PAR LOT ({len(files)} fichier(s))")
+    logger.info("="*80)
+    
+    # Chargement de toutes les feuilles
+    for file_in_memory, file_path in files:
+        file_date = extract_file_date(file_path)
+        
+        try:
+            df = read_excel(file_in_memory, sheet_name='Resultado consulta')
+        except Exception as e:
+            logger.error(f"Erreur lors de la lecture du fichier Excel {file_path}: {e}")
+            continue
+        
+        if 'Méthode de paiement' not in df.columns or 'Montant (€)' not in df.columns:
+            logger.error(f"Colonnes requises manquantes dans {file_path}, fichier ignoré")
+            continue
+        
+        if file_date in files_by_date:
+            logger.warning(f"⚠️  Date {file_date} déjà présente dans le lot ({files_by_date[file_date]}): "
+                           f"les écritures de {file_path} s'y ajoutent")
+        files_by_date.setdefault(file_date, file_path)
+        
+        has_totals[file_path] = 'Montant (HT)' in df.columns and 'TVA (€)' in df.columns
+        df = df.reindex(columns=CLORIAN_COLUMNS)
+        df['fichier'] = file_path
+        frames.append(df)
+        sources.append((file_path, file_date))
+        logger.info(f"✓ {file_path}: {len(df)} lignes")
+    
+    if not frames:
+        logger.warning("Aucun fichier Clorian exploitable dans le lot")
+        return []
+    
+    # Indexation unique par (fichier, méthode): première occurrence, comme le traitement unitaire
+    data = pd.concat(frames, ignore_index=True)
+    data = data.drop_duplicates(['fichier', 'Méthode de paiement']).set_index(['fichier', 'Méthode de paiement'])
+    
+    pivot = data.unstack('Méthode de paiement')
+    present = pd.Series(True, index=data.index).unstack('Méthode de paiement', fill_value=False)
+    
+    for method in list(PAYMENT_METHODS_CONFIG) + ['Total']:
+        if method not in present.columns:
+            present[method] = False
+    
+    # Génération des écritures fichier par fichier, dans l'ordre du lot
+    for file_path, file_date in sources:
+        is_present = present.loc[file_path]
+        amounts = pivot.loc[file_path]
+        
+        for method, config in PAYMENT_METHODS_CONFIG.items():
+            if is_present[method]:
+                add_payment_line(
+                    output,
+                    method,
+                    config["account"],
+                    config["label"],
+                    amounts[('Montant (€)', method)],
+                    file_date
+                )
+            else:
+                logger.warning(f"✗ {file_date} - {method}: Non trouvé dans le fichier")
+        
+        if is_present['Total'] and has_totals[file_path]:
+            add_ht_line(output, file_date, amounts[('Montant (HT)', 'Total')])
+            add_tva_line(output, file_date, amounts[('TVA (€)', 'Total')])
+            if is_present['Espèces']:
+                add_cash_lines(output, file_date, amounts[('Montant (€)', 'Espèces')])
+        else:
+            logger.warning(f"✗ {file_date} - Ligne 'Total' non trouvée, lignes complémentaires ignorées")
+    
+    logger.info(f"✓ {len(output)} lignes comptables générées pour {len(sources)} fichier(s)")
+    logger.info("="*80 + "\n")
+    
+    return sort_lines(output)
+
+
 def add_payment_line(output, method, account_number, label, payment, file_date):
     """
     Ajoute une ligne au tableau de sortie pour une méthode de paiement spécifique.
@@ -230,53 +331,26 @@ def add_additional_lines(output, df, file_date):
         total_tva = df.loc[df['Méthode de paiement'] == 'Total', 'TVA (€)']
         cash_payment = df.loc[df['Méthode de paiement'] == 'Espèces', 'Montant (€)']
         
-        # Ligne HT (706101)
+        # Ligne HT
         if not total_payment_ht.empty:
-            ht_amount = total_payment_ht.values[0]
-            output.append([
-                "CA", file_date, None, 706101, "REVSAPVISIN", 
-                "Caisse billeterie CLORIAN", file_date, None, ht_amount,
-                "", "", "", "", "", "", "", "", "", "", "", ""
-            ])
-            logger.debug(f"  Ligne HT ajoutée: 706101, {ht_amount:.2f}€")
+            add_ht_line(output, file_date, total_payment_ht.values[0])
             lines_added += 1
         else:
             logger.warning("  Montant HT (Total) non trouvé")
         
-        # Ligne TVA (445712)
+        # Ligne TVA
         if not total_tva.empty:
-            tva_amount = total_tva.values[0]
-            output.append([
-                "CA", file_date, None, 445712, None, 
-                "Caisse billeterie CLORIAN", file_date, None, tva_amount,
-                "", "", "", "", "", "", "", "", "", "", "", ""
-            ])
-            logger.debug(f"  Ligne TVA ajoutée: 445712, {tva_amount:.2f}€")
+            add_tva_line(output, file_date, total_tva.values[0])
             lines_added += 1
         else:
             logger.warning("  Montant TVA (Total) non trouvé")
         
-        # Lignes Espèces (580005 et 531005)
+        # Lignes Espèces (remise et caisse)
         if not cash_payment.empty:
-            cash_amount = cash_payment.values[0]
-            
-            output.append([
-                "CA", file_date, None, 580005, None, 
-                "Caisse billeterie CLORIAN", file_date, cash_amount, None,
-                "", "", "", "", "", "", "", "", "", "", "", ""
-            ])
-            logger.debug(f"  Ligne Espèces débit ajoutée: 580005, {cash_amount:.2f}€")
-            lines_added += 1
-            
-            output.append([
-                "CA", file_date, None, 531005, None, 
-                "Caisse billeterie CLORIAN", file_date, None, cash_amount,
-                "", "", "", "", "", "", "", "", "", "", "", ""
-            ])
-            logger.debug(f"  Ligne Espèces crédit ajoutée: 531005, {cash_amount:.2f}€")
-            lines_added += 1
+            add_cash_lines(output, file_date, cash_payment.values[0])
+            lines_added += 2
         else:
-            logger.warning("  Montant Espèces non trouvé, lignes 580005/531005 non générées")
+            logger.warning("  Montant Espèces non trouvé, lignes de remise des espèces non générées")
         
         return lines_added
     
@@ -287,3 +361,39 @@ def add_additional_lines(output, df, file_date):
     except Exception as e:
         logger.error(f"Erreur lors de l'ajout des lignes supplémentaires: {e}")
         return lines_added
+
+
+def add_complement_line(output, name, file_date, amount):
+    """
+    Ajoute une écriture complémentaire décrite dans la table rules/clorian_complements.csv.
+    
+    Args:
+        output: Liste de sortie où ajouter la ligne
+        name: Nom de l'écriture dans la table (ht, tva, especes_remise, especes_caisse)
+        file_date: Date de l'écriture
+        amount: Montant de l'écriture
+    """
+    config = COMPLEMENTS_CONFIG[name]
+    debit, credit = (amount, None) if config['side'] == 'debit' else (None, amount)
+    output.append([
+        "CA", file_date, None, config['account'], config['analytic'], 
+        config['label'], file_date, debit, credit,
+        "", "", "", "", "", "", "", "", "", "", "", ""
+    ])
+    logger.debug(f"  Ligne {name} ajoutée: {config['account']} ({config['side']}), {amount:.2f}€")
+
+
+def add_ht_line(output, file_date, ht_amount):
+    """Ajoute la ligne de chiffre d'affaires HT."""
+    add_complement_line(output, 'ht', file_date, ht_amount)
+
+
+def add_tva_line(output, file_date, tva_amount):
+    """Ajoute la ligne de TVA collectée."""
+    add_complement_line(output, 'tva', file_date, tva_amount)
+
+
+def add_cash_lines(output, file_date, cash_amount):
+    """Ajoute les lignes de remise d'espèces (remise puis sortie de caisse)."""
+    add_complement_line(output, 'especes_remise', file_date, cash_amount)
+    add_complement_line(output, 'especes_caisse', file_date, cash_amount)
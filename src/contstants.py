@@ -25,27 +25,7 @@ PRINT_ERR = lambda msg: print((f"{PROGRAM_NAME}: {msg}"), file=sys.stderr)  # Fo
 # Paramètres spécifiques à la gestion des données
 # CLORIAN_IGNORED_LIGNES = 6  # Nombre de lignes à ignorer pour le traitement des fichiers Clorian
 
-# Liste des pays membres de l'Union Européenne à l'excxeption de la France pour traitement dans shopify
-PAYS_UE = [  
-    "Germany", "Austria", "Belgium", "Bulgaria", "Cyprus", "Croatia", "Denmark",
-    "Spain", "Estonia", "Finland", "Greece", "Hungary", "Ireland",
-    "Italy", "Latvia", "Lithuania", "Luxembourg", "Malta", "Netherlands", "Poland",
-    "Portugal", "Czech Republic", "Romania", "Slovakia", "Slovenia", "Sweden"
-]
+# Les pays de l'Union Européenne (zones Shopify) sont définis dans rules/pays.csv
 
-# Dictionnaire pour mapper les méthodes de paiement à leurs paramètres
-PAYMENT_METHODS = {
-    "Carte bancaire": {"account_number": 467300, "label": "Caisse billeterie CLORIAN CB"},
-    "Carte Bancaire (TPE Virtuel)": {"account_number": 467300, "label": "Caisse billeterie CLORIAN CB TPE Virtuel"},
-    "Espèces": {"account_number": 531005, "label": "Caisse billeterie CLORIAN"},
-    "Voucher": {"account_number": 511200, "label": "Caisse billeterie CLORIAN"},
-    "Amex":    {"account_number": 511319, "label": "Caisse billeterie CLORIAN"},
-}
-
-# # Lignes supplémentaires à ajouter à la fin
-# ADDITIONAL_LINES_TEMPLATE = [
-#     {"account_number": 706101, "label": "REVSAPVISIN", "description": "Caisse billeterie CLORIAN", "column_index": 3},
-#     {"account_number": 445712, "label": None, "description": "Caisse billeterie CLORIAN", "column_index": 4},
-#     {"account_number": 580005, "label": None, "description": "Caisse billeterie CLORIAN", "column_index": 1},
-#     {"account_number": 531005, "label": None, "description": "Caisse billeterie CLORIAN", "column_index": 1}
-# ]
+# Les comptes des méthodes de paiement et les écritures complémentaires Clorian sont
+# définis dans rules/clorian.csv et rules/clorian_complements.csv
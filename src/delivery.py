@@ -0,0 +1,118 @@
+import os
+import logging
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+# Sources pouvant figurer dans un plan de livraison
+SOURCES = ['clorian', 'stripe', 'shopify', 'skidata']
+
+
+def parse_delivery_plan(value):
+    """
+    Analyse un plan de livraison: groupes de sources séparés par ';', sources
+    d'un groupe séparées par ','. Ex: 'clorian,skidata;stripe'.
+
+    Args:
+        value: Plan de livraison (vide: pas de livraison anticipée)
+
+    Returns:
+        Liste des groupes (listes de sources), dans l'ordre de livraison
+
+    Raises:
+        ValueError: Source inconnue ou présente dans plusieurs groupes
+    """
+    groups = []
+    seen = set()
+    for part in (value or '').split(';'):
+        group = [source.strip().lower() for source in part.split(',') if source.strip()]
+        for source in group:
+            if source not in SOURCES:
+                raise ValueError(f"Source inconnue dans le plan de livraison: {source} "
+                                 f"(attendu: {', '.join(SOURCES)})")
+            if source in seen:
+                raise ValueError(f"Source présente dans plusieurs livraisons: {source}")
+            seen.add(source)
+        if group:
+            groups.append(group)
+    return groups
+
+
+def delivery_path(output_path, number):
+    """
+    Chemin du fichier d'une livraison anticipée.
+
+    Args:
+        output_path: Chemin du fichier CSV de sortie
+        number: Numéro de la livraison (à partir de 1)
+
+    Returns:
+        Chemin '<sortie>_livraison_<numéro>.csv'
+    """
+    root, ext = os.path.splitext(output_path)
+    return f"{root}_livraison_{number}{ext or '.csv'}"
+
+
+class DeliveryPlan:
+    """
+    Suivi des livraisons anticipées d'une exécution: les fichiers sont traités
+    groupe par groupe, et chaque groupe est livré dès que tous ses fichiers sont
+    traités, sans attendre les sources plus lentes.
+    """
+
+    def __init__(self, groups, files):
+        """
+        Args:
+            groups: Groupes de sources (parse_delivery_plan)
+            files: Fichiers de l'exécution, tuples (type, chemin, date)
+        """
+        self.groups = groups
+        self.group_index = {source: index for index, group in enumerate(groups) for source in group}
+        self.pending = [0] * len(groups)
+        self.remaining = len(files)
+        for file_type, _, _ in files:
+            if file_type in self.group_index:
+                self.pending[self.group_index[file_type]] += 1
+        self.streams = [[] for _ in groups]
+
+    def order(self, files):
+        """
+        Ordonne les fichiers par groupe de livraison (tri stable; les sources hors
+        plan sont traitées en dernier).
+
+        Args:
+            files: Liste de tuples (type, chemin, date)
+
+        Returns:
+            Nouvelle liste ordonnée
+        """
+        return sorted(files, key=lambda file: self.group_index.get(file[0], len(self.groups)))
+
+    def add(self, file_type, lines):
+        """Ajoute les lignes triées d'un fichier à la livraison de sa source."""
+        if file_type in self.group_index and lines:
+            self.streams[self.group_index[file_type]].append(lines)
+
+    def done(self, file_type, count=1):
+        """
+        Signale des fichiers traités (avec ou sans succès).
+
+        Args:
+            file_type: Type des fichiers
+            count: Nombre de fichiers
+
+        Returns:
+            Numéro (à partir de 1) de la livraison devenue complète, ou None. Une
+            livraison complétée par le dernier fichier de l'exécution n'est pas
+            anticipée: le rapport consolidé suit immédiatement.
+        """
+        self.remaining = max(0, self.remaining - count)
+        if file_type not in self.group_index:
+            return None
+        index = self.group_index[file_type]
+        if self.pending[index] <= 0:
+            return None
+        self.pending[index] = max(0, self.pending[index] - count)
+        if self.pending[index] > 0 or self.remaining == 0:
+            return None
+        return index + 1
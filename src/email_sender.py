@@ -6,7 +6,7 @@ from email.mime.base import MIMEBase
 from email import encoders
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Any, Dict, Optional
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -15,13 +15,18 @@ load_dotenv()
 class EmailSender:
     """Classe pour envoyer des rapports comptables par email."""
     
-    def __init__(self):
-        """Initialise les paramètres SMTP depuis les variables d'environnement."""
+    def __init__(self, email_to: Optional[str] = None):
+        """
+        Initialise les paramètres SMTP depuis les variables d'environnement.
+        
+        Args:
+            email_to: Destinataire (prioritaire sur EMAIL_TO, ex: configuration d'un site)
+        """
         self.smtp_server = os.getenv('SMTP_SERVER', 'smtp.gmail.com')
         self.smtp_port = int(os.getenv('SMTP_PORT', 587))
         self.email_from = os.getenv('EMAIL_FROM')
         self.email_password = os.getenv('EMAIL_PASSWORD')
-        self.email_to = os.getenv('EMAIL_TO')
+        self.email_to = email_to or os.getenv('EMAIL_TO')
         
         # Validation des paramètres requis
         self._validate_config()
@@ -40,12 +45,14 @@ class EmailSender:
                 f"Paramètres manquants dans .env : {', '.join(missing)}"
             )
     
-    def _create_email_body(self, stats: Dict[str, int]) -> str:
+    def _create_email_body(self, stats: Dict[str, Any], note: Optional[str] = None) -> str:
         """
         Génère le corps du message email.
         
         Args:
-            stats: Dictionnaire avec les statistiques du rapport
+            stats: Dictionnaire avec les statistiques du rapport (seules les sources
+                présentes sont détaillées)
+            note: Précision ajoutée après les statistiques (ex: livraison partielle)
             
         Returns:
             Corps du message formaté
@@ -54,17 +61,26 @@ class EmailSender:
         date_str = now.strftime('%d/%m/%Y')
         datetime_str = now.strftime('%d/%m/%Y à %H:%M')
         
+        alerts = stats.get('alerts') or []
+        alerts_section = ""
+        if alerts:
+            alerts_section = "\n⚠️ Alertes de performance :\n" + "\n".join(f"- {alert}" for alert in alerts) + "\n"
+        
+        sources_section = "".join(
+            f"- {name} : {stats[source]} lignes\n"
+            for source, name in [('shopify', 'Shopify'), ('stripe', 'Stripe'),
+                                 ('clorian', 'Clorian'), ('skidata', 'Skidata')]
+            if source in stats
+        )
+        note_section = f"\n{note}\n" if note else ""
+        
         return f"""Bonjour,
 
 Voici le rapport comptable automatisé du {datetime_str}.
 
 📈 Statistiques :
 - Nombre total d'écritures : {stats.get('total_lines', 0)}
-- Shopify : {stats.get('shopify', 0)} lignes
-- Stripe : {stats.get('stripe', 0)} lignes
-- Clorian : {stats.get('clorian', 0)} lignes
-- Skidata : {stats.get('skidata', 0)} lignes
-
+{sources_section}{alerts_section}{note_section}
 Le fichier CSV est en pièce jointe.
 
 Cordialement,
@@ -99,13 +115,16 @@ Système d'automatisation comptable Luma Arles
             )
             msg.attach(part)
     
-    def send_report(self, csv_file_path: str, stats: Dict[str, int]) -> bool:
+    def send_report(self, csv_file_path: str, stats: Dict[str, Any], title: str = "Rapport Comptable",
+                    note: Optional[str] = None) -> bool:
         """
         Envoie le rapport CSV par email.
         
         Args:
             csv_file_path: Chemin vers le fichier CSV généré
             stats: Dictionnaire avec statistiques (total_lines, shopify, stripe, etc.)
+            title: Titre du rapport (objet du message)
+            note: Précision ajoutée au corps du message
             
         Returns:
             True si l'envoi a réussi, False sinon
@@ -115,10 +134,10 @@ Système d'automatisation comptable Luma Arles
             msg = MIMEMultipart()
             msg['From'] = self.email_from
             msg['To'] = self.email_to
-            msg['Subject'] = f"📊 Rapport Comptable - {datetime.now().strftime('%d/%m/%Y')}"
+            msg['Subject'] = f"📊 {title} - {datetime.now().strftime('%d/%m/%Y')}"
             
             # Ajouter le corps du message
-            body = self._create_email_body(stats)
+            body = self._create_email_body(stats, note)
             msg.attach(MIMEText(body, 'plain', 'utf-8'))
             
             # Attacher le fichier CSV
@@ -0,0 +1,377 @@
+import os
+import io
+import hashlib
+import logging
+import threading
+import contextlib
+import contextvars
+import importlib.util
+import pandas as pd
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+# Moteurs de lecture Excel supportés
+# - openpyxl: moteur historique, toujours disponible
+# - calamine: lecteur Rust (paquet optionnel python-calamine), beaucoup plus rapide
+# - auto: calamine si disponible et fichier au-delà du seuil, sinon openpyxl
+ENGINES = ['auto', 'openpyxl', 'calamine']
+
+# Version du format des tables en cache: à incrémenter dès que la lecture change
+CACHE_VERSION = 1
+
+# Taille des blocs lus pour l'empreinte d'un fichier sur disque
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Signature d'un classeur Excel 97-2003 (.xls, conteneur OLE2), non lisible par openpyxl
+XLS_SIGNATURE = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+
+# Configuration par défaut du processus (surchargée par configure())
+_config = {
+    'engine': os.getenv('EXCEL_ENGINE', 'auto'),
+    'auto_threshold': int(os.getenv('EXCEL_AUTO_THRESHOLD', 256 * 1024)),
+    'cache_dir': os.getenv('PARSE_CACHE_DIR') or None,
+}
+
+# Réglages de l'appel en cours (using()): propres à chaque thread, ex: un site en mode multi-sites
+_current = contextvars.ContextVar('excel_settings', default=None)
+
+
+def make_settings(engine=None, auto_threshold=None, cache_dir=None):
+    """
+    Réglages de lecture Excel, complétés par la configuration par défaut du processus.
+
+    Args:
+        engine: 'auto', 'openpyxl' ou 'calamine'
+        auto_threshold: Taille (octets) à partir de laquelle le mode auto choisit calamine
+        cache_dir: Répertoire du cache des tables lues ('' pour le désactiver)
+
+    Returns:
+        Dictionnaire de réglages (pour using() ou un processus de traitement)
+
+    Raises:
+        ValueError: Moteur inconnu
+    """
+    result = dict(_config)
+    if engine is not None:
+        if engine not in ENGINES:
+            raise ValueError(f"Moteur Excel inconnu: {engine} (attendu: {', '.join(ENGINES)})")
+        result['engine'] = engine
+    if auto_threshold is not None:
+        result['auto_threshold'] = auto_threshold
+    if cache_dir is not None:
+        result['cache_dir'] = cache_dir or None
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+    return result
+
+
+def configure(engine=None, auto_threshold=None, cache_dir=None):
+    """
+    Configure les réglages par défaut du processus (service d'ingestion, processus
+    de traitement). Mêmes arguments que make_settings().
+    """
+    _config.update(make_settings(engine, auto_threshold, cache_dir))
+
+
+@contextlib.contextmanager
+def using(settings):
+    """
+    Applique des réglages (make_settings) aux lectures effectuées pendant le bloc,
+    sans modifier ceux des autres threads.
+    """
+    token = _current.set(settings)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def _settings():
+    """Réglages de l'appel en cours, sinon configuration par défaut du processus."""
+    return _current.get() or _config
+
+
+def settings(current=None):
+    """
+    Réglages sous la forme des arguments de configure() (ex: pour un autre processus).
+
+    Args:
+        current: Réglages (make_settings), None pour ceux de l'appel en cours
+    """
+    current = current or _settings()
+    return {
+        'engine': current['engine'],
+        'auto_threshold': current['auto_threshold'],
+        'cache_dir': current['cache_dir'] or '',
+    }
+
+
+def calamine_available():
+    """Indique si le moteur calamine (python-calamine) est installé."""
+    return importlib.util.find_spec('python_calamine') is not None
+
+
+def feather_available():
+    """Indique si le format Feather (pyarrow) est disponible pour le cache."""
+    return importlib.util.find_spec('pyarrow') is not None
+
+
+def _source_size(src):
+    """Retourne la taille de la source (chemin ou objet file-like) sans copier son contenu."""
+    if isinstance(src, (str, os.PathLike)):
+        return os.path.getsize(src)
+    if isinstance(src, io.BytesIO):
+        return src.getbuffer().nbytes
+    position = src.tell()
+    size = src.seek(0, io.SEEK_END)
+    src.seek(position)
+    return size
+
+
+def is_legacy_xls(src):
+    """
+    Indique si la source est un classeur Excel 97-2003 (.xls), d'après sa signature.
+
+    Args:
+        src: Chemin du fichier ou objet file-like (curseur conservé)
+
+    Returns:
+        True pour un fichier .xls
+    """
+    if isinstance(src, (str, os.PathLike)):
+        with open(src, 'rb') as source:
+            header = source.read(len(XLS_SIGNATURE))
+    elif hasattr(src, 'getbuffer'):
+        with src.getbuffer() as view:
+            header = bytes(view[:len(XLS_SIGNATURE)])
+    else:
+        position = src.tell()
+        src.seek(0)
+        header = src.read(len(XLS_SIGNATURE))
+        src.seek(position)
+    return header == XLS_SIGNATURE
+
+
+def select_engine(src, engine=None):
+    """
+    Détermine le moteur à utiliser pour une source donnée.
+
+    Args:
+        src: Chemin du fichier ou objet file-like
+        engine: Moteur demandé (None = réglages de l'appel en cours)
+
+    Returns:
+        Nom du moteur pandas à utiliser
+    """
+    current = _settings()
+    engine = engine or current['engine']
+
+    if engine == 'calamine' and not calamine_available():
+        logger.warning("Moteur calamine demandé mais python-calamine n'est pas installé, utilisation d'openpyxl")
+        return 'openpyxl'
+
+    if engine == 'auto':
+        if calamine_available() and _source_size(src) >= current['auto_threshold']:
+            return 'calamine'
+        return 'openpyxl'
+
+    return engine
+
+
+def cache_key(src, engine, kwargs):
+    """
+    Clé de cache d'une lecture: empreinte du contenu, version du lecteur et paramètres.
+
+    Args:
+        src: Chemin du fichier ou objet file-like (curseur conservé)
+        engine: Moteur de lecture retenu
+        kwargs: Arguments transmis à pd.read_excel
+
+    Returns:
+        Empreinte hexadécimale
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    if isinstance(src, (str, os.PathLike)):
+        with open(src, 'rb') as source:
+            for chunk in iter(lambda: source.read(HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+    elif hasattr(src, 'getbuffer'):
+        # BytesIO ou fichier projeté en mémoire: empreinte sans copie
+        with src.getbuffer() as view:
+            digest.update(view)
+    else:
+        position = src.tell()
+        src.seek(0)
+        for chunk in iter(lambda: src.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+        src.seek(position)
+
+    parameters = sorted((name, repr(value)) for name, value in kwargs.items())
+    digest.update(repr((CACHE_VERSION, pd.__version__, engine, parameters)).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _cache_load(cache_dir, key):
+    """Charge une table du cache (None si absente ou illisible)."""
+    base = os.path.join(cache_dir, key)
+    try:
+        if os.path.exists(f"{base}.feather"):
+            return pd.read_feather(f"{base}.feather")
+        if os.path.exists(f"{base}.pkl"):
+            # Fichiers écrits uniquement par ce module dans un répertoire local
+            return pd.read_pickle(f"{base}.pkl")
+    except Exception as e:
+        logger.warning(f"Entrée de cache illisible {base}, nouvelle lecture du fichier: {e}")
+    return None
+
+
+def _cache_store(cache_dir, key, data):
+    """
+    Enregistre une table lue: Feather si pyarrow est disponible et la table s'y prête
+    (noms de colonnes textuels, index par défaut), pickle sinon. Écriture atomique.
+    """
+    base = os.path.join(cache_dir, key)
+    # Fichier temporaire propre à chaque écriture (lectures simultanées du même classeur)
+    tmp = f"{os.getpid()}-{threading.get_ident()}.tmp"
+    use_feather = (
+        feather_available() and isinstance(data, pd.DataFrame)
+        and all(isinstance(column, str) for column in data.columns)
+        and data.index.equals(pd.RangeIndex(len(data)))
+    )
+    try:
+        if use_feather:
+            try:
+                data.to_feather(f"{base}.feather.{tmp}")
+                os.replace(f"{base}.feather.{tmp}", f"{base}.feather")
+                return
+            except Exception as e:
+                # Colonne de types mixtes non représentable en Arrow
+                logger.debug(f"Format Feather impossible pour {key}, repli sur pickle: {e}")
+                if os.path.exists(f"{base}.feather.{tmp}"):
+                    os.remove(f"{base}.feather.{tmp}")
+        pd.to_pickle(data, f"{base}.pkl.{tmp}")
+        os.replace(f"{base}.pkl.{tmp}", f"{base}.pkl")
+    except Exception as e:
+        logger.warning(f"Impossible d'enregistrer la table en cache ({base}): {e}")
+
+
+def read_excel(src, engine=None, fallback='openpyxl', **kwargs):
+    """
+    Lit un fichier Excel avec le moteur sélectionné, avec repli automatique.
+
+    Si un répertoire de cache est configuré, la table lue est conservée sous une
+    clé (contenu, version du lecteur, paramètres): un même classeur n'est lu
+    qu'une fois, quelles que soient les règles appliquées ensuite.
+
+    Args:
+        src: Chemin du fichier ou objet file-like
+        engine: Moteur demandé (None = réglages de l'appel en cours); un fichier .xls
+            est toujours lu avec calamine ou xlrd
+        fallback: Moteur de repli si le moteur rapide échoue
+            (None = détection automatique par pandas)
+        **kwargs: Arguments transmis à pd.read_excel
+
+    Returns:
+        DataFrame lu
+    """
+    if is_legacy_xls(src):
+        # Format .xls: calamine (repli xlrd) ou xlrd, sans passer par openpyxl
+        chosen = 'calamine' if calamine_available() else 'xlrd'
+        fallback = 'xlrd'
+    else:
+        chosen = select_engine(src, engine)
+
+    cache_dir = _settings()['cache_dir']
+    if cache_dir is None:
+        return _parse(src, chosen, fallback, **kwargs)
+
+    # Une sélection de colonnes par fonction n'a pas de clé stable:
+    # la table complète est mise en cache et la sélection appliquée ensuite
+    usecols = kwargs.get('usecols')
+    if callable(usecols):
+        kwargs.pop('usecols')
+
+    key = cache_key(src, chosen, kwargs)
+    data = _cache_load(cache_dir, key)
+    if data is not None:
+        logger.info(f"♻️  Table lue depuis le cache ({key[:12]})")
+    else:
+        data = _parse(src, chosen, fallback, **kwargs)
+        _cache_store(cache_dir, key, data)
+
+    if callable(usecols):
+        data = data[[column for column in data.columns if usecols(column)]]
+    return data
+
+
+def _parse(src, chosen, fallback, **kwargs):
+    """Lecture effective avec le moteur choisi puis, en cas d'échec, le moteur de repli."""
+    if chosen != fallback:
+        try:
+            df = pd.read_excel(src, engine=chosen, **kwargs)
+            logger.debug(f"Fichier Excel lu avec le moteur {chosen}")
+            return df
+        except Exception as e:
+            logger.warning(f"Échec de lecture avec le moteur {chosen}, repli sur {fallback or 'auto'}: {e}")
+            if hasattr(src, 'seek'):
+                src.seek(0)
+
+    return pd.read_excel(src, engine=fallback, **kwargs)
+
+
+def compare_engines(src, **kwargs):
+    """
+    Vérifie que calamine et openpyxl produisent des valeurs identiques pour une source.
+
+    Args:
+        src: Chemin du fichier ou objet file-like
+        **kwargs: Arguments transmis à pd.read_excel (sheet_name, dtype, header...)
+
+    Returns:
+        True si les deux DataFrames sont identiques, False sinon
+    """
+    frames = {}
+    for engine in ['openpyxl', 'calamine']:
+        if hasattr(src, 'seek'):
+            src.seek(0)
+        frames[engine] = pd.read_excel(src, engine=engine, **kwargs)
+
+    try:
+        pd.testing.assert_frame_equal(frames['openpyxl'], frames['calamine'])
+    except AssertionError as e:
+        logger.warning(f"Différences entre openpyxl et calamine: {e}")
+        return False
+    return True
+
+
+def sheet_name(value):
+    """Feuille passée en argument: index si la valeur est numérique ('0'), nom sinon (argparse)."""
+    return int(value) if value.isdigit() else value
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Contrôle de parité des valeurs lues par openpyxl et calamine"
+    )
+    parser.add_argument("files", nargs='+', help="Fichiers Excel à comparer")
+    parser.add_argument("--sheet", type=sheet_name, default=0, help="Nom ou index de la feuille")
+    parser.add_argument("--no-header", action='store_true', help="Fichier sans ligne d'en-têtes (Skidata)")
+    parser.add_argument("--as-str", action='store_true', help="Lecture en texte (dtype=str, comme Shopify/Skidata)")
+    cli_args = parser.parse_args()
+
+    read_kwargs = {'sheet_name': cli_args.sheet}
+    if cli_args.no_header:
+        read_kwargs['header'] = None
+    if cli_args.as_str:
+        read_kwargs['dtype'] = str
+
+    all_identical = True
+    for path in cli_args.files:
+        identical = compare_engines(path, **read_kwargs)
+        all_identical = all_identical and identical
+        print(f"{'✓' if identical else '✗'} {path}")
+
+    raise SystemExit(0 if all_identical else 1)
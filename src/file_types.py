@@ -0,0 +1,25 @@
+import re
+
+# Nom de fichier attendu pour chaque source (la date éventuelle est capturée)
+FILE_PATTERNS = {
+    'clorian': re.compile(r'^clorian_(\d{2})-(\d{2})-(\d{4})\.xlsx$', re.IGNORECASE),
+    'stripe': re.compile(r'^stripe(\d{2})(\d{2})(\d{4})\.(csv|json|jsonl)$', re.IGNORECASE),
+    'shopify': re.compile(r'^export_caisses(_[\w-]+)?\.xlsx$', re.IGNORECASE),
+    'skidata': re.compile(r'^rapport_jour_(\d{8})\.(xlsx|xls|csv)$', re.IGNORECASE),
+}
+
+
+def detect_file_type(filename):
+    """
+    Type de source d'un fichier d'après son nom.
+
+    Args:
+        filename: Nom du fichier (sans répertoire)
+
+    Returns:
+        'clorian', 'stripe', 'shopify', 'skidata', ou None si le nom n'est pas reconnu
+    """
+    for file_type, pattern in FILE_PATTERNS.items():
+        if pattern.match(filename):
+            return file_type
+    return None
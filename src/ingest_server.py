@@ -0,0 +1,216 @@
+import io
+import csv
+import json
+import time
+import logging
+import threading
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from clorian import clorian
+from stripe import st
+from shopify import shopify
+from skidata import treat_skidata_file
+from rules import shopify_rules, skidata_rules, clorian_payment_methods, clorian_complements
+from aggregation import GRANULARITIES, aggregate_lines
+from file_types import FILE_PATTERNS, detect_file_type
+from journal import OUTPUT_HEADER
+import excel_reader
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+# Attente maximale d'un emplacement de traitement avant de répondre 503 (secondes)
+QUEUE_TIMEOUT = 5
+
+# Inactivité maximale d'une connexion (secondes): un envoi bloqué ne conserve pas son emplacement
+SOCKET_TIMEOUT = 60
+
+# Parseur de chaque source: (fichier, nom du fichier) -> lignes comptables
+PARSERS = {
+    'clorian': lambda file_in_memory, filename: clorian(file_in_memory, filename),
+    'stripe': lambda file_in_memory, filename: st(file_in_memory),
+    'shopify': lambda file_in_memory, filename: shopify(file_in_memory),
+    'skidata': lambda file_in_memory, filename: treat_skidata_file(file_in_memory, filename),
+}
+
+
+class IngestHandler(BaseHTTPRequestHandler):
+    """
+    Requêtes du service d'ingestion:
+
+    - GET /sante: état du service
+    - POST /ecritures?filename=<nom>[&type=<source>][&format=csv|json][&granularity=<niveau>]:
+      le corps de la requête est le fichier brut, la réponse ses écritures comptables
+    """
+
+    server_version = "ComptaIngest/1.0"
+    timeout = SOCKET_TIMEOUT
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} - {format % args}")
+
+    def _reply(self, status, body, content_type='application/json; charset=utf-8', headers=None):
+        payload = body.encode('utf-8') if isinstance(body, str) else body
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _error(self, status, message, headers=None):
+        self._reply(status, json.dumps({'erreur': message}, ensure_ascii=False), headers=headers)
+
+    def do_GET(self):
+        if urlparse(self.path).path != '/sante':
+            self._error(HTTPStatus.NOT_FOUND, "ressource inconnue")
+            return
+        self._reply(HTTPStatus.OK, json.dumps({
+            'statut': 'ok',
+            'sources': list(FILE_PATTERNS),
+            'traitements_en_cours': self.server.active,
+            'traitements_max': self.server.workers,
+        }))
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != '/ecritures':
+            self._error(HTTPStatus.NOT_FOUND, "ressource inconnue")
+            return
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+
+        filename = query.get('filename') or self.headers.get('X-Filename')
+        if not filename:
+            self._error(HTTPStatus.BAD_REQUEST, "nom du fichier requis (paramètre filename ou en-tête X-Filename)")
+            return
+        file_type = query.get('type') or detect_file_type(filename)
+        if file_type not in PARSERS:
+            self._error(HTTPStatus.BAD_REQUEST, f"type de fichier non reconnu pour {filename} "
+                                                f"(attendu: {', '.join(PARSERS)})")
+            return
+        output_format = query.get('format', 'csv')
+        if output_format not in ('csv', 'json'):
+            self._error(HTTPStatus.BAD_REQUEST, "format attendu: csv ou json")
+            return
+        granularity = query.get('granularity', 'transaction')
+        if granularity not in GRANULARITIES:
+            self._error(HTTPStatus.BAD_REQUEST, f"granularité attendue: {', '.join(GRANULARITIES)}")
+            return
+
+        try:
+            length = int(self.headers.get('Content-Length', ''))
+        except ValueError:
+            self._error(HTTPStatus.LENGTH_REQUIRED, "en-tête Content-Length requis")
+            return
+        if length < 0:
+            self._error(HTTPStatus.BAD_REQUEST, f"en-tête Content-Length invalide ({length})")
+            return
+        if length > self.server.max_upload_size:
+            self._error(HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                        f"fichier trop volumineux ({length} octets, maximum {self.server.max_upload_size})")
+            return
+
+        # Nombre de traitements simultanés borné: au-delà, la requête attend puis est refusée.
+        # Le corps n'est lu qu'une fois l'emplacement obtenu: au plus `workers` fichiers en mémoire
+        if not self.server.slots.acquire(timeout=QUEUE_TIMEOUT):
+            # Corps non lu: la connexion ne peut pas être réutilisée
+            self.close_connection = True
+            self._error(HTTPStatus.SERVICE_UNAVAILABLE, "service saturé, réessayer plus tard",
+                        headers={'Retry-After': str(QUEUE_TIMEOUT), 'Connection': 'close'})
+            return
+        try:
+            with self.server.active_lock:
+                self.server.active += 1
+            try:
+                data = self.rfile.read(length)
+            except OSError as e:
+                self.close_connection = True
+                logger.warning(f"⚠️  Réception de {filename} interrompue: {e}")
+                return
+            if len(data) != length:
+                self.close_connection = True
+                self._error(HTTPStatus.BAD_REQUEST, f"corps incomplet ({len(data)} octets sur {length})")
+                return
+            start = time.perf_counter()
+            lines = PARSERS[file_type](io.BytesIO(data), filename)
+            if lines and granularity != 'transaction':
+                lines = aggregate_lines(lines, file_type, granularity)
+            parse_ms = (time.perf_counter() - start) * 1000
+        except Exception as e:
+            logger.exception(f"❌ Erreur lors du traitement de {filename}")
+            self._error(HTTPStatus.UNPROCESSABLE_ENTITY, f"traitement impossible: {e}")
+            return
+        finally:
+            with self.server.active_lock:
+                self.server.active -= 1
+            self.server.slots.release()
+
+        if not lines:
+            # Comme pour un traitement planifié: un fichier sans écriture est en erreur
+            self._error(HTTPStatus.UNPROCESSABLE_ENTITY, f"aucune ligne comptable générée pour {filename}")
+            return
+        logger.info(f"✅ {filename} ({file_type.upper()}): {len(lines)} ligne(s) en {parse_ms:.1f} ms")
+        headers = {'X-Parse-Ms': f"{parse_ms:.1f}", 'X-Line-Count': str(len(lines))}
+        if output_format == 'json':
+            self._reply(HTTPStatus.OK, json.dumps({
+                'fichier': filename, 'type': file_type, 'duree_ms': round(parse_ms, 1),
+                'entetes': OUTPUT_HEADER, 'lignes': lines,
+            }, ensure_ascii=False, default=str), headers=headers)
+        else:
+            text = io.StringIO()
+            writer = csv.writer(text)
+            writer.writerow(OUTPUT_HEADER)
+            writer.writerows(lines)
+            self._reply(HTTPStatus.OK, text.getvalue(), 'text/csv; charset=utf-8', headers=headers)
+
+
+class IngestServer(ThreadingHTTPServer):
+    """Serveur HTTP multi-thread avec un nombre borné de traitements simultanés."""
+
+    daemon_threads = True
+
+    def __init__(self, address, workers, max_upload_size):
+        """
+        Args:
+            address: Tuple (hôte, port)
+            workers: Nombre maximal de fichiers traités simultanément
+            max_upload_size: Taille maximale d'un fichier reçu (octets)
+        """
+        super().__init__(address, IngestHandler)
+        self.workers = workers
+        self.max_upload_size = max_upload_size
+        self.slots = threading.BoundedSemaphore(workers)
+        self.active = 0
+        self.active_lock = threading.Lock()
+
+
+def warm_up():
+    """Charge les règles comptables avant la première requête (processus chaud)."""
+    shopify_rules()
+    skidata_rules()
+    clorian_payment_methods()
+    clorian_complements()
+
+
+def serve(args):
+    """
+    Démarre le service d'ingestion HTTP local (commande 'serve') jusqu'à interruption.
+
+    Args:
+        args: Arguments de la ligne de commande (serve_host, serve_port, serve_workers, max_upload_size)
+    """
+    excel_reader.configure(args.excel_engine, args.excel_auto_threshold, args.cache_dir)
+    warm_up()
+
+    server = IngestServer((args.serve_host, args.serve_port), max(1, args.serve_workers), args.max_upload_size)
+    host, port = server.server_address[:2]
+    logger.info("="*80)
+    logger.info(f"🌐 SERVICE D'INGESTION: http://{host}:{port}/ecritures?filename=<nom du fichier>")
+    logger.info(f"Traitements simultanés: {server.workers}, taille maximale: {server.max_upload_size} octets")
+    logger.info("="*80)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
@@ -0,0 +1,94 @@
+import heapq
+import logging
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+# Codes journaux générés par les parseurs, dans l'ordre de tri (alphabétique)
+JOURNAL_CODES = sorted(['B5', 'CA', 'CAIS', 'VE', 'VES'])
+JOURNAL_RANKS = {code: rank for rank, code in enumerate(JOURNAL_CODES)}
+
+# Nombre de rangs réservés par jour; un journal inconnu est placé après les journaux connus
+JOURNAL_SLOTS = 100
+
+# Date de tri d'une ligne sans date valide (en fin de journal)
+UNKNOWN_DATE = 99991231
+
+# Index des colonnes d'une ligne comptable
+COL_JOURNAL, COL_DATE = 0, 1
+
+# En-têtes du fichier CSV de sortie (format d'import Capilog)
+OUTPUT_HEADER = [
+    "# Explications Code journal", "Date avec ou sans les /", "Informations", 
+    "Numéro de compte", "Code section analytique", "Libellé de la ligne", 
+    "Date d'échéance", "Montant débit", "Montant crédit",
+    "      ", "      ", "     ", "     ", "    ", "    ", 
+    "Référence", "Informations", "    ", "    ", "    ", "    ", "lien"
+]
+
+
+def day_of(date_str):
+    """
+    Date d'une écriture en entier aaaammjj.
+
+    Args:
+        date_str: Date au format jj/mm/aaaa
+
+    Returns:
+        Entier aaaammjj, UNKNOWN_DATE si la date est invalide
+    """
+    try:
+        return int(date_str[6:10]) * 10000 + int(date_str[3:5]) * 100 + int(date_str[0:2])
+    except (TypeError, ValueError):
+        return UNKNOWN_DATE
+
+
+def sort_key(date_str, journal):
+    """
+    Clé de tri entière (date, code journal) d'une écriture.
+
+    Args:
+        date_str: Date au format jj/mm/aaaa
+        journal: Code journal (B5, CA, CAIS, VE, VES...)
+
+    Returns:
+        Entier aaaammjj * JOURNAL_SLOTS + rang du journal
+    """
+    return day_of(date_str) * JOURNAL_SLOTS + JOURNAL_RANKS.get(journal, JOURNAL_SLOTS - 1)
+
+
+def line_key(line):
+    """Clé de tri d'une ligne comptable."""
+    return sort_key(line[COL_DATE], line[COL_JOURNAL])
+
+
+def sort_lines(lines):
+    """
+    Trie sur place les lignes d'un fichier par (date, journal).
+
+    Le tri est stable: l'ordre de génération est conservé à clé égale.
+
+    Args:
+        lines: Lignes comptables d'un fichier
+
+    Returns:
+        La même liste, triée
+    """
+    lines.sort(key=line_key)
+    return lines
+
+
+def merge_streams(streams):
+    """
+    Fusionne des flux de lignes déjà triés en un journal global trié (fusion k-voies).
+
+    À clé égale, les lignes du flux de plus petit indice sortent en premier: le
+    résultat ne dépend que de l'ordre des flux, pas de l'ordre de traitement.
+
+    Args:
+        streams: Listes (ou itérables) de lignes triées par line_key, dans l'ordre des fichiers
+
+    Returns:
+        Itérateur sur les lignes fusionnées
+    """
+    return heapq.merge(*streams, key=line_key)
@@ -0,0 +1,143 @@
+import os
+import json
+import hashlib
+import logging
+from collections import Counter
+from journal import COL_JOURNAL, COL_DATE, sort_lines
+from ledger import COL_ACCOUNT, COL_ANALYTIC, COL_LABEL, COL_DEBIT, COL_CREDIT, COL_REFERENCE, to_cents
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+# Colonnes identifiant une écriture (les montants sont comparés en centimes)
+HASHED_COLUMNS = [COL_JOURNAL, COL_DATE, COL_ACCOUNT, COL_ANALYTIC, COL_LABEL, COL_REFERENCE]
+
+
+def _text(line, index):
+    value = line[index] if index < len(line) else None
+    return '' if value is None else str(value).strip()
+
+
+def line_hash(line):
+    """
+    Empreinte stable d'une ligne comptable: journal, date, compte, section
+    analytique, libellé, référence et montants (en centimes, '12.5' = 12.50).
+
+    Args:
+        line: Ligne comptable (format de sortie)
+
+    Returns:
+        Empreinte hexadécimale (32 caractères)
+    """
+    fields = [_text(line, index) for index in HASHED_COLUMNS]
+    fields += [str(to_cents(line[COL_DEBIT])), str(to_cents(line[COL_CREDIT]))]
+    return hashlib.blake2b('\x1f'.join(fields).encode('utf-8'), digest_size=16).hexdigest()
+
+
+def reversal(line):
+    """Contre-passation d'une ligne: même écriture, débit et crédit inversés."""
+    reversed_line = list(line)
+    reversed_line[COL_DEBIT], reversed_line[COL_CREDIT] = line[COL_CREDIT], line[COL_DEBIT]
+    return reversed_line
+
+
+class JournalIndex:
+    """
+    Index persistant des lignes déjà émises pour chaque fichier source.
+
+    Associe à chaque fichier (chemin source) les empreintes de ses lignes (avec
+    leur nombre d'occurrences et une ligne d'origine, pour la contre-passation).
+    Lorsqu'un fichier corrigé est retraité, seules les différences sont émises.
+    Stocké au format JSON, ou conservé en mémoire seulement (mode veille, sur une
+    journée). Un index antérieur, indexé par le seul nom du fichier, est repris
+    au premier retraitement de chaque fichier.
+    """
+
+    def __init__(self, path):
+        """
+        Charge l'index depuis le disque (index vide si le fichier n'existe pas).
+
+        Args:
+            path: Chemin du fichier JSON de l'index (None: index en mémoire, non enregistré)
+        """
+        self.path = path
+        self.files = {}
+        self.pending = {}
+        self.migrated = set()  # Entrées par nom de fichier (index antérieur) reprises
+
+        if path is None:
+            return
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.files = json.load(f)
+                logger.info(f"✓ Index des lignes émises chargé: {len(self.files)} fichier(s) ({path})")
+            except (OSError, ValueError) as e:
+                logger.error(f"❌ Index des lignes émises illisible ({path}), émission complète: {e}")
+                self.files = {}
+        else:
+            logger.info(f"Index des lignes émises absent, création au prochain enregistrement: {path}")
+
+    def diff(self, source_file, lines):
+        """
+        Lignes à émettre pour un fichier: ajouts et contre-passations des lignes
+        émises précédemment qui ont disparu. Comparaison par ensembles
+        d'empreintes (multiensembles: une ligne répétée compte autant de fois).
+
+        Le nouvel état du fichier n'est enregistré qu'à l'appel de save().
+
+        Args:
+            source_file: Chemin du fichier source
+            lines: Lignes comptables générées par le retraitement complet du fichier
+
+        Returns:
+            Tuple (lignes à émettre triées par (date, journal), nombre d'ajouts,
+            nombre de contre-passations)
+        """
+        previous = self.files.get(source_file)
+        legacy = os.path.basename(source_file)
+        if previous is None and legacy in self.files and legacy not in self.migrated:
+            # Index antérieur: l'entrée du nom de fichier n'est reprise qu'une fois
+            previous = self.files[legacy]
+            self.migrated.add(legacy)
+        previous = previous or {}
+        state = {}
+        seen = Counter()
+        emitted = []
+        for line in lines:
+            key = line_hash(line)
+            seen[key] += 1
+            if key not in state:
+                state[key] = [0, list(line)]
+            state[key][0] += 1
+            if seen[key] > previous.get(key, (0, None))[0]:
+                emitted.append(line)
+        additions = len(emitted)
+
+        for key, (count, line) in previous.items():
+            missing = count - seen.get(key, 0)
+            if missing > 0:
+                emitted.extend(reversal(line) for _ in range(missing))
+        reversals = len(emitted) - additions
+
+        if previous:
+            logger.info(f"🔁 {source_file}: {additions} ajout(s), {reversals} contre-passation(s), "
+                        f"{len(lines) - additions} ligne(s) déjà émise(s)")
+        self.pending[source_file] = state
+        sort_lines(emitted)
+        return emitted, additions, reversals
+
+    def save(self):
+        """Enregistre les fichiers retraités et écrit l'index de manière atomique (fichier temporaire + rename)."""
+        for legacy in self.migrated:
+            self.files.pop(legacy, None)
+        self.files.update(self.pending)
+        self.pending = {}
+        self.migrated = set()
+        if self.path is None:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.files, f, ensure_ascii=False, default=str)
+        os.replace(tmp_path, self.path)
+        logger.info(f"✓ Index des lignes émises enregistré: {len(self.files)} fichier(s)")
@@ -0,0 +1,311 @@
+import os
+import sys
+import csv
+import json
+import sqlite3
+import logging
+import argparse
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from journal import OUTPUT_HEADER, COL_JOURNAL, COL_DATE, day_of
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+# Index des colonnes d'une ligne comptable (format Capilog)
+COL_ACCOUNT, COL_ANALYTIC, COL_LABEL = 3, 4, 5
+COL_DEBIT, COL_CREDIT, COL_REFERENCE = 7, 8, 15
+
+# Borne supérieure d'une recherche par préfixe de compte (ex: 707 -> 707000 à 707ZZZ)
+PREFIX_END = '\uffff'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    output TEXT NOT NULL DEFAULT '',
+    source_file TEXT NOT NULL,
+    source TEXT NOT NULL,
+    journal TEXT NOT NULL,
+    day INTEGER NOT NULL,
+    account TEXT NOT NULL,
+    analytic TEXT NOT NULL,
+    label TEXT NOT NULL,
+    reference TEXT NOT NULL,
+    debit_cents INTEGER NOT NULL,
+    credit_cents INTEGER NOT NULL,
+    line TEXT NOT NULL,
+    recorded_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_by_account ON entries (account, day);
+CREATE INDEX IF NOT EXISTS entries_by_day ON entries (day, journal);
+CREATE INDEX IF NOT EXISTS entries_by_reference ON entries (reference);
+"""
+
+# Index créés après la migration des bases antérieures à la colonne output
+INDEXES = """
+DROP INDEX IF EXISTS entries_by_file;
+CREATE INDEX IF NOT EXISTS entries_by_source ON entries (output, source_file);
+"""
+
+INSERT = (
+    "INSERT INTO entries (output, source_file, source, journal, day, account, analytic, label, "
+    "reference, debit_cents, credit_cents, line, recorded_at) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+
+def to_cents(value):
+    """
+    Montant d'une ligne en centimes (entier, sans erreur d'arrondi flottant).
+
+    Args:
+        value: Montant (nombre, chaîne '12.5' ou '12,5', vide)
+
+    Returns:
+        Nombre de centimes, 0 si vide ou illisible
+    """
+    if value is None or value == '':
+        return 0
+    try:
+        return int((Decimal(str(value).replace(',', '.').strip()) * 100).quantize(Decimal(1)))
+    except (InvalidOperation, ValueError):
+        logger.debug(f"Montant illisible ignoré: {value!r}")
+        return 0
+
+
+def _cell(line, index):
+    value = line[index] if index < len(line) else ''
+    return '' if value is None else str(value)
+
+
+def _rows(output, source_file, source, lines):
+    """Enregistrements de la table entries pour des lignes comptables."""
+    recorded_at = datetime.now().isoformat(timespec='seconds')
+    return [
+        (output, source_file, source, _cell(line, COL_JOURNAL), day_of(_cell(line, COL_DATE)),
+         _cell(line, COL_ACCOUNT), _cell(line, COL_ANALYTIC), _cell(line, COL_LABEL),
+         _cell(line, COL_REFERENCE), to_cents(line[COL_DEBIT]), to_cents(line[COL_CREDIT]),
+         json.dumps(list(line), ensure_ascii=False, default=str), recorded_at)
+        for line in lines
+    ]
+
+
+class Ledger:
+    """
+    Grand livre local (base SQLite): toutes les écritures générées, indexées par
+    compte, date, code journal et référence, pour interroger l'historique sans
+    relire les fichiers CSV quotidiens.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path: Chemin de la base SQLite (créée si absente)
+        """
+        self.path = path
+        self.connection = sqlite3.connect(path, timeout=30)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(entries)")]
+        if 'output' not in columns:
+            # Base antérieure: écritures rattachées au seul nom du fichier source
+            self.connection.execute("ALTER TABLE entries ADD COLUMN output TEXT NOT NULL DEFAULT ''")
+        self.connection.executescript(INDEXES)
+
+    def close(self):
+        self.connection.close()
+
+    def replace_file(self, output, source_file, source, lines):
+        """
+        Enregistre les écritures d'un fichier source, en remplaçant celles d'un
+        traitement précédent du même fichier pour la même sortie (rejeu, fichier
+        redéposé). Les écritures d'une base antérieure, rattachées au seul nom du
+        fichier, sont également remplacées.
+
+        Args:
+            output: Fichier de sortie (site) ayant produit les écritures
+            source_file: Chemin du fichier source
+            source: Type de fichier (clorian, stripe, shopify, skidata)
+            lines: Lignes comptables du fichier
+
+        Returns:
+            Nombre d'écritures enregistrées
+        """
+        rows = _rows(output, source_file, source, lines)
+        with self.connection:
+            self.connection.execute(
+                "DELETE FROM entries WHERE (output = ? AND source_file = ?) OR (output = '' AND source_file = ?)",
+                (output, source_file, os.path.basename(source_file))
+            )
+            self.connection.executemany(INSERT, rows)
+        return len(rows)
+
+    def replace_orders(self, output, source_file, source, lines, references):
+        """
+        Enregistre les écritures de commandes, en remplaçant celles déjà
+        enregistrées pour les mêmes références (traitement incrémental: un export
+        ne contient que les commandes nouvelles ou modifiées, les écritures des
+        autres commandes sont conservées).
+
+        Args:
+            output: Fichier de sortie (site) ayant produit les écritures
+            source_file: Chemin du fichier source
+            source: Type de fichier (shopify)
+            lines: Écritures actuelles des commandes (hors contre-passations)
+            references: Références des commandes traitées
+
+        Returns:
+            Nombre d'écritures enregistrées
+        """
+        rows = _rows(output, source_file, source, lines)
+        with self.connection:
+            self.connection.executemany(
+                "DELETE FROM entries WHERE output = ? AND source = ? AND reference = ?",
+                [(output, source, reference) for reference in references]
+            )
+            self.connection.executemany(INSERT, rows)
+        return len(rows)
+
+    def _where(self, date_from=None, date_to=None, account=None, journal=None, reference=None):
+        """Clause WHERE (sur colonnes indexées) et paramètres d'une requête."""
+        clauses, params = [], []
+        if account:
+            # Préfixe de compte: plage sur l'index (account, day)
+            clauses.append("account >= ? AND account < ?")
+            params += [account, account + PREFIX_END]
+        if date_from:
+            clauses.append("day >= ?")
+            params.append(int(date_from.strftime('%Y%m%d')))
+        if date_to:
+            clauses.append("day <= ?")
+            params.append(int(date_to.strftime('%Y%m%d')))
+        if journal:
+            clauses.append("journal = ?")
+            params.append(journal)
+        if reference:
+            clauses.append("reference = ?")
+            params.append(reference)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def account_totals(self, account, date_from=None, date_to=None, journal=None, by_month=False):
+        """
+        Totaux débit / crédit des comptes commençant par un préfixe.
+
+        Args:
+            account: Numéro ou préfixe de compte (ex: 707 pour toutes les ventes)
+            date_from: Début de période (date, incluse)
+            date_to: Fin de période (date, incluse)
+            journal: Code journal (optionnel)
+            by_month: Détail par mois
+
+        Returns:
+            Liste de tuples (compte, mois ou None, débit en centimes, crédit en centimes, nombre d'écritures)
+        """
+        where, params = self._where(date_from, date_to, account, journal)
+        period = "day / 100" if by_month else "NULL"
+        return self.connection.execute(
+            f"SELECT account, {period} AS period, SUM(debit_cents), SUM(credit_cents), COUNT(*) "
+            f"FROM entries{where} GROUP BY account, period ORDER BY account, period",
+            params
+        ).fetchall()
+
+    def trial_balance(self, date_from=None, date_to=None, journal=None):
+        """
+        Balance générale de la période: totaux et solde de chaque compte.
+
+        Returns:
+            Liste de tuples (compte, débit en centimes, crédit en centimes)
+        """
+        where, params = self._where(date_from, date_to, journal=journal)
+        return self.connection.execute(
+            f"SELECT account, SUM(debit_cents), SUM(credit_cents) FROM entries{where} "
+            "GROUP BY account ORDER BY account",
+            params
+        ).fetchall()
+
+    def extract(self, date_from=None, date_to=None, account=None, journal=None, reference=None):
+        """
+        Écritures de la période, dans l'ordre du journal (date, code journal, insertion).
+
+        Returns:
+            Itérateur sur les lignes comptables d'origine
+        """
+        where, params = self._where(date_from, date_to, account, journal, reference)
+        cursor = self.connection.execute(
+            f"SELECT line FROM entries{where} ORDER BY day, journal, id", params
+        )
+        return (json.loads(line) for (line,) in cursor)
+
+
+def _euros(cents):
+    return f"{(cents or 0) / 100:.2f}"
+
+
+def _cli_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Date invalide '{value}' (format attendu: AAAA-MM-JJ)")
+
+
+def main():
+    """Interrogation du grand livre en ligne de commande."""
+    parser = argparse.ArgumentParser(description="Interrogation du grand livre local")
+    parser.add_argument("query", choices=['totals', 'balance', 'extract'],
+                        help="'totals': totaux d'un compte; 'balance': balance générale; "
+                             "'extract': écritures de la période au format de sortie")
+    parser.add_argument("--ledger-db", default=os.getenv('LEDGER_DB', 'grand_livre.sqlite'),
+                        help="Base SQLite du grand livre")
+    parser.add_argument("--account", default=None, help="Numéro ou préfixe de compte")
+    parser.add_argument("--journal", default=None, help="Code journal (VE, VES, CAIS...)")
+    parser.add_argument("--reference", default=None, help="Référence de pièce (extract)")
+    parser.add_argument("--from-date", type=_cli_date, default=None, help="Début de période (AAAA-MM-JJ)")
+    parser.add_argument("--to-date", type=_cli_date, default=None, help="Fin de période (AAAA-MM-JJ)")
+    parser.add_argument("--by-month", action='store_true', help="Totaux détaillés par mois (totals)")
+    parser.add_argument("-o", "--output", default=None, help="Fichier CSV de l'extraction (défaut: sortie standard)")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.ledger_db):
+        parser.error(f"grand livre introuvable: {args.ledger_db}")
+
+    ledger = Ledger(args.ledger_db)
+    try:
+        if args.query == 'totals':
+            if not args.account:
+                parser.error("--account est requis pour 'totals'")
+            rows = ledger.account_totals(args.account, args.from_date, args.to_date, args.journal, args.by_month)
+            print(f"{'Compte':<12} {'Mois':<8} {'Débit':>14} {'Crédit':>14} {'Solde':>14} {'Écritures':>9}")
+            for account, period, debit, credit, count in rows:
+                month = f"{period % 100:02d}/{period // 100}" if period else ''
+                print(f"{account:<12} {month:<8} {_euros(debit):>14} {_euros(credit):>14} "
+                      f"{_euros(debit - credit):>14} {count:>9}")
+
+        elif args.query == 'balance':
+            rows = ledger.trial_balance(args.from_date, args.to_date, args.journal)
+            print(f"{'Compte':<12} {'Débit':>14} {'Crédit':>14} {'Solde débiteur':>14} {'Solde créditeur':>15}")
+            for account, debit, credit in rows:
+                balance = debit - credit
+                print(f"{account:<12} {_euros(debit):>14} {_euros(credit):>14} "
+                      f"{_euros(max(balance, 0)):>14} {_euros(max(-balance, 0)):>15}")
+            total_debit = sum(row[1] for row in rows)
+            total_credit = sum(row[2] for row in rows)
+            print(f"{'TOTAL':<12} {_euros(total_debit):>14} {_euros(total_credit):>14}")
+            if total_debit != total_credit:
+                print(f"⚠️  Balance déséquilibrée: écart de {_euros(total_debit - total_credit)}")
+
+        else:
+            lines = ledger.extract(args.from_date, args.to_date, args.account, args.journal, args.reference)
+            csvfile = open(args.output, 'w', newline='', encoding='utf-8') if args.output else sys.stdout
+            try:
+                writer = csv.writer(csvfile)
+                writer.writerow(OUTPUT_HEADER)
+                writer.writerows(lines)
+            finally:
+                if args.output:
+                    csvfile.close()
+    finally:
+        ledger.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,373 @@
+import os
+import csv
+import time
+import socket
+import random
+import logging
+import argparse
+import tempfile
+import threading
+from datetime import datetime, timedelta
+import pandas as pd
+import paramiko
+from paramiko import (
+    SFTPServerInterface, SFTPServer, SFTPAttributes, SFTPHandle, ServerInterface,
+    AUTH_SUCCESSFUL, AUTH_FAILED, OPEN_SUCCEEDED,
+    OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+)
+from main import build_arg_parser, UsrRequest, run_once
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+# Identifiants acceptés par le serveur de test
+LOADTEST_USER = 'charge'
+LOADTEST_PASSWORD = 'charge'
+
+# Un répertoire distant par source, comme sur le serveur de production
+SOURCE_DIRS = ['clorian', 'shopify', 'stripe', 'skidata']
+
+REPORT_HEADER = [
+    "Jours", "Lignes/fichier", "Fichiers", "Octets", "Écritures", "Erreurs",
+    "Durée (s)", "Débit (Mo/s)", "Écritures/s", "Connexion (s)", "Téléchargement (s)", "Traitement (s)"
+]
+
+
+class Throttle:
+    """
+    Simulation d'un lien lent: latence par requête et débit maximal partagé
+    par toutes les connexions du serveur.
+    """
+
+    def __init__(self, latency=0.0, bandwidth=None):
+        """
+        Args:
+            latency: Latence ajoutée à chaque requête (secondes)
+            bandwidth: Débit maximal en octets/seconde (None: illimité)
+        """
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self._lock = threading.Lock()
+        self._available_at = 0.0
+
+    def wait(self, size=0, latency=True):
+        """
+        Bloque le temps d'une requête puis du transfert de size octets.
+
+        Args:
+            size: Octets transférés par la requête
+            latency: Appliquer la latence de requête
+        """
+        delay = self.latency if latency else 0.0
+        if self.bandwidth and size:
+            with self._lock:
+                now = time.monotonic()
+                start = max(now, self._available_at)
+                self._available_at = start + size / self.bandwidth
+                delay += self._available_at - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+class ThrottledHandle(SFTPHandle):
+    """Fichier servi en lecture seule, avec limitation de débit."""
+
+    def __init__(self, path, flags, throttle):
+        super().__init__(flags)
+        self.readfile = open(path, 'rb')
+        self.filename = path
+        self.throttle = throttle
+        self._first_read = True
+
+    def read(self, offset, length):
+        data = super().read(offset, length)
+        if isinstance(data, bytes):
+            # Les lectures anticipées (prefetch) sont pipelinées: seule la première paie la latence
+            self.throttle.wait(len(data), latency=self._first_read)
+            self._first_read = False
+        return data
+
+    def stat(self):
+        return SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+
+
+class LoadTestSFTPInterface(SFTPServerInterface):
+    """Arborescence locale exposée en lecture seule par le serveur de test."""
+
+    def __init__(self, server, root, throttle, *args, **kwargs):
+        super().__init__(server, *args, **kwargs)
+        self.root = root
+        self.throttle = throttle
+
+    def _local_path(self, path):
+        return os.path.join(self.root, os.path.normpath('/' + path).lstrip('/'))
+
+    def list_folder(self, path):
+        self.throttle.wait()
+        local = self._local_path(path)
+        try:
+            return [SFTPAttributes.from_stat(entry.stat(), entry.name) for entry in os.scandir(local)]
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+    def stat(self, path):
+        self.throttle.wait()
+        try:
+            return SFTPAttributes.from_stat(os.stat(self._local_path(path)))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+    lstat = stat
+
+    def open(self, path, flags, attr):
+        self.throttle.wait()
+        if flags & (os.O_WRONLY | os.O_RDWR):
+            return SFTPServer.convert_errno(13)
+        try:
+            return ThrottledHandle(self._local_path(path), flags, self.throttle)
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+
+class LoadTestAuth(ServerInterface):
+    """Authentification par mot de passe des identifiants de test."""
+
+    def check_auth_password(self, username, password):
+        if (username, password) == (LOADTEST_USER, LOADTEST_PASSWORD):
+            return AUTH_SUCCESSFUL
+        return AUTH_FAILED
+
+    def get_allowed_auths(self, username):
+        return 'password'
+
+    def check_channel_request(self, kind, chanid):
+        if kind == 'session':
+            return OPEN_SUCCEEDED
+        return OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+
+class LoadTestServer:
+    """
+    Serveur SFTP paramiko exécuté dans le processus (127.0.0.1, port libre),
+    servant une arborescence locale avec latence et débit configurables.
+    """
+
+    def __init__(self, root, latency=0.0, bandwidth=None):
+        """
+        Args:
+            root: Répertoire local servi comme racine SFTP
+            latency: Latence par requête (secondes)
+            bandwidth: Débit maximal en octets/seconde (None: illimité)
+        """
+        self.root = root
+        self.throttle = Throttle(latency, bandwidth)
+        self.host_key = paramiko.RSAKey.generate(2048)
+        self.port = None
+        self._socket = None
+        self._transports = []
+
+    def start(self):
+        """
+        Démarre l'écoute dans un thread.
+
+        Returns:
+            Port d'écoute
+        """
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind(('127.0.0.1', 0))
+        self._socket.listen(16)
+        self.port = self._socket.getsockname()[1]
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        logger.info(f"Serveur SFTP de test sur 127.0.0.1:{self.port} ({self.root})")
+        return self.port
+
+    def _accept_loop(self):
+        while True:
+            try:
+                client, _ = self._socket.accept()
+            except OSError:
+                return
+            transport = paramiko.Transport(client)
+            transport.add_server_key(self.host_key)
+            transport.set_subsystem_handler('sftp', SFTPServer, LoadTestSFTPInterface, self.root, self.throttle)
+            transport.start_server(server=LoadTestAuth())
+            self._transports.append(transport)
+
+    def stop(self):
+        if self._socket is not None:
+            self._socket.close()
+        for transport in self._transports:
+            transport.close()
+
+
+def generate_tree(root, days, rows, end_date=None, seed=0):
+    """
+    Génère une arborescence d'entrée réaliste: pour chaque jour un fichier
+    Clorian, Stripe et Skidata, plus un export Shopify de la période.
+
+    Args:
+        root: Répertoire de destination
+        days: Nombre de jours de la période
+        rows: Nombre de lignes par fichier Stripe / Skidata et de commandes Shopify par jour
+        end_date: Dernier jour de la période (défaut: aujourd'hui)
+        seed: Graine du générateur aléatoire
+
+    Returns:
+        Tuple (date de début, date de fin)
+    """
+    rng = random.Random(seed)
+    end_date = end_date or datetime.now().date()
+    start_date = end_date - timedelta(days=days - 1)
+    for name in SOURCE_DIRS:
+        os.makedirs(os.path.join(root, name), exist_ok=True)
+
+    countries = ['France', 'Germany', 'United States', 'Italy', 'Spain', 'Japan']
+    orders = []
+    for offset in range(days):
+        day = start_date + timedelta(days=offset)
+
+        # Clorian: une ligne par méthode de paiement et un total
+        amounts = [round(rng.uniform(50, 2000), 2) for _ in range(5)]
+        clorian_df = pd.DataFrame({
+            'Méthode de paiement': ['Carte bancaire', 'Carte Bancaire (TPE Virtuel)', 'Espèces', 'Voucher',
+                                    'Amex', 'Total'],
+            'Montant (€)': amounts + [round(sum(amounts), 2)],
+            'Montant (HT)': [round(a / 1.1, 2) for a in amounts] + [round(sum(amounts) / 1.1, 2)],
+            'TVA (€)': [round(a - a / 1.1, 2) for a in amounts] + [round(sum(amounts) - sum(amounts) / 1.1, 2)],
+        })
+        clorian_path = os.path.join(root, 'clorian', f"clorian_{day.strftime('%d-%m-%Y')}.xlsx")
+        with pd.ExcelWriter(clorian_path) as writer:
+            clorian_df.to_excel(writer, sheet_name='Resultado consulta', index=False)
+
+        # Stripe: un paiement par ligne
+        with open(os.path.join(root, 'stripe', f"stripe{day.strftime('%d%m%Y')}.csv"), 'w',
+                  newline='', encoding='utf-8') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(['id', 'created_date', 'customer_email', 'amount_decimal'])
+            for index in range(rows):
+                writer.writerow([f"ch_{offset}_{index}", f"{day.isoformat()} {index % 24:02d}:{index % 60:02d}:00",
+                                 f"client{index}@example.org", f"{rng.uniform(5, 150):.2f}"])
+
+        # Skidata: rapport de la veille, sans en-têtes
+        report_day = day - timedelta(days=1)
+        with open(os.path.join(root, 'skidata', f"rapport_jour_{report_day.strftime('%Y%m%d')}.csv"), 'w',
+                  encoding='utf-8') as report:
+            for index in range(rows):
+                code, payment = rng.choice([('11', '3'), ('12', '3'), ('41', '3'), ('43', '3'), ('20', '1')])
+                amount = rng.uniform(2, 40)
+                report.write(f"{code};{payment};{amount:.2f};{amount - amount / 1.2:.2f}\n".replace('.', ','))
+
+        for index in range(rows):
+            total = round(rng.uniform(5, 300), 2)
+            orders.append({
+                'Date': f"{day.isoformat()} 12:00:00", 'Order Name': f"#{offset}-{index}",
+                'Total Sales': str(total), 'Shipping Country': countries[index % len(countries)],
+                'Net Sales': str(round(total / 1.2, 2)), 'Shipping': '4.9',
+                'Tax': str(round(total - total / 1.2, 2)), 'Note': None,
+            })
+
+    # Shopify: export unique, dernière ligne de total
+    orders.append({'Date': '', 'Order Name': '', 'Total Sales': '0', 'Shipping Country': '',
+                   'Net Sales': '', 'Shipping': '', 'Tax': '', 'Note': None})
+    pd.DataFrame(orders).to_excel(os.path.join(root, 'shopify', 'export_caisses.xlsx'), index=False)
+    return start_date, end_date
+
+
+def run_scenario(days, rows, latency, bandwidth, extra_args, workdir):
+    """
+    Exécute le traitement complet (connect_sftp → process_files → sauvegarde)
+    contre le serveur de test pour une taille d'arborescence.
+
+    Args:
+        days: Nombre de jours (fichiers par source)
+        rows: Lignes par fichier
+        latency: Latence par requête (secondes)
+        bandwidth: Débit maximal en octets/seconde
+        extra_args: Options supplémentaires transmises à main.py
+        workdir: Répertoire de travail du scénario
+
+    Returns:
+        Ligne du rapport (voir REPORT_HEADER)
+    """
+    root = os.path.join(workdir, 'sftp')
+    start_date, end_date = generate_tree(root, days, rows)
+
+    server = LoadTestServer(root, latency, bandwidth)
+    port = server.start()
+    output = os.path.join(workdir, 'sortie.csv')
+    args = build_arg_parser().parse_args([
+        '--sftp-host', '127.0.0.1', '--sftp-port', str(port),
+        '--sftp-user', LOADTEST_USER, '--sftp-pass', LOADTEST_PASSWORD,
+        '--sftp-dir', *[f"/{name}" for name in SOURCE_DIRS],
+        '-o', output, '--no-email', '--history-db', '', '--ledger-db', '',
+        '--from-date', start_date.isoformat(), '--to-date', end_date.isoformat(),
+    ] + extra_args)
+
+    request = UsrRequest(args)
+    start = time.perf_counter()
+    try:
+        run_once(request)
+    finally:
+        elapsed = time.perf_counter() - start
+        request.close()
+        server.stop()
+
+    stats = request.stats
+    size = sum(stats[source]['bytes'] for source in ['clorian', 'stripe', 'shopify', 'skidata'])
+    timings = request.timings
+    return [
+        days, rows, stats['total_files'], size, stats['total_lines'], stats['total_errors'],
+        f"{elapsed:.2f}", f"{size / 1024 / 1024 / elapsed:.2f}", f"{stats['total_lines'] / elapsed:.0f}",
+        f"{timings.get('connexion', 0.0):.2f}", f"{timings.get('telechargement', 0.0):.2f}",
+        f"{timings.get('traitement', 0.0):.2f}",
+    ]
+
+
+def _int_list(value):
+    return [int(part) for part in value.split(',') if part.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Banc de charge: traitement complet contre un serveur SFTP local simulé",
+        epilog="Les options non reconnues sont transmises à main.py (ex: --clorian-batch, --excel-engine calamine)"
+    )
+    parser.add_argument("--days", type=_int_list, default=[1, 7],
+                        help="Nombres de jours à tester, séparés par des virgules (fichiers par source)")
+    parser.add_argument("--rows", type=_int_list, default=[100, 1000],
+                        help="Lignes par fichier à tester, séparées par des virgules")
+    parser.add_argument("--latency-ms", type=float, default=0.0,
+                        help="Latence ajoutée à chaque requête SFTP (millisecondes)")
+    parser.add_argument("--bandwidth-kbps", type=float, default=0.0,
+                        help="Débit maximal du serveur en Ko/s (0: illimité)")
+    parser.add_argument("--report", default=None,
+                        help="Fichier CSV où enregistrer les résultats")
+    parser.add_argument("--verbose", action='store_true',
+                        help="Conserver les logs détaillés du traitement")
+    args, extra_args = parser.parse_known_args()
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    latency = args.latency_ms / 1000
+    bandwidth = args.bandwidth_kbps * 1024 if args.bandwidth_kbps > 0 else None
+
+    results = []
+    for days in args.days:
+        for rows in args.rows:
+            with tempfile.TemporaryDirectory(prefix='loadtest_') as workdir:
+                result = run_scenario(days, rows, latency, bandwidth, extra_args, workdir)
+            results.append(result)
+            print(' | '.join(f"{name}: {value}" for name, value in zip(REPORT_HEADER, result)))
+
+    if args.report:
+        with open(args.report, 'w', newline='', encoding='utf-8') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(REPORT_HEADER)
+            writer.writerows(results)
+        print(f"Résultats enregistrés dans {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,18 +2,41 @@ import argparse
 import os
 import io
 import paramiko
-import re
 import csv
 import logging
+import time
+import socket
+import sqlite3
+import contextlib
 from datetime import datetime, timedelta
 import warnings
 import pandas as pd
 from stat import S_ISREG
-from clorian import clorian
+from clorian import clorian, clorian_batch
 from stripe import st
-from shopify import shopify
+from shopify import (shopify, read_export, journal_rows, combine_ranges, lines_by_reference,
+                     log_summary as shopify_summary)
 from skidata import treat_skidata_file
 from email_sender import EmailSender  # Import de la classe EmailSender
+from order_index import OrderIndex
+from journal_diff import JournalIndex
+import excel_reader
+import spool
+from aggregation import GRANULARITIES, aggregate_lines, detail_path
+from journal import OUTPUT_HEADER, merge_streams
+import reconciliation
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from sites import load_sites
+from run_history import RunHistory, count_rows, print_history
+from ledger import Ledger, COL_REFERENCE
+from file_types import FILE_PATTERNS
+from ingest_server import serve
+from parse_worker import ParseWorker, ParsePool, ParseTimeout, portable
+from delivery import DeliveryPlan, delivery_path, parse_delivery_plan
+from profiling import Profiler
+from sftp_profiles import load_profiles, probe
+from sources import SOURCE_BACKENDS, LocalSource, SftpSource
 from dotenv import load_dotenv
 
 
@@ -36,52 +59,336 @@ logger = logging.getLogger(__name__)
 # Supprimer les avertissements openpyxl
 warnings.filterwarnings("ignore", category=UserWarning, module="openpyxl")
 
+# Taille des blocs lus lors d'un téléchargement (identique à SFTPClient.getfo)
+DOWNLOAD_CHUNK_SIZE = 32768
+
+# Attente maximale entre deux tentatives de téléchargement (secondes)
+MAX_RETRY_DELAY = 60
+
+# Mode veille: tentatives de traitement d'un fichier en échec avant de l'ignorer jusqu'à sa modification
+DAEMON_MAX_ATTEMPTS = 3
+
+def build_arg_parser():
+    """
+    Construit le parseur des arguments de ligne de commande.
+    
+    Returns:
+        argparse.ArgumentParser configuré (valeurs par défaut issues du .env)
+    """
+    parser = argparse.ArgumentParser(
+        description="Automatisation comptable - Récupération et traitement de fichiers via SFTP"
+    )
+
+    parser.add_argument("command", nargs='?', choices=['run', 'history', 'serve'], default='run',
+                      help="'run' (défaut): traitement des fichiers; 'history': tendances des exécutions passées; "
+                           "'serve': service HTTP local de traitement de fichiers à la demande")
+
+    parser.add_argument("--sftp-host", default=os.getenv('SFTP_HOST'), 
+                      help="Adresse du serveur SFTP")
+    parser.add_argument("--sftp-port", type=int, default=int(os.getenv('SFTP_PORT', 22)),
+                      help="Port du serveur SFTP")
+    parser.add_argument("--sftp-profile", default=os.getenv('SFTP_PROFILE', 'defaut'),
+                      help="Profil de transport SFTP (port, chiffrement, compression, fenêtre): "
+                           "defaut, wan_compresse, wan_large, lan_rapide ou profil du fichier --sftp-profiles-file")
+    parser.add_argument("--sftp-profiles-file", default=os.getenv('SFTP_PROFILES_FILE', ''),
+                      help="Fichier INI de profils de transport SFTP supplémentaires")
+    parser.add_argument("--probe-sftp", nargs='?', const='', default=None, metavar='CHEMIN',
+                      help="Mesurer un transfert de test avec chaque profil SFTP et recommander le plus rapide "
+                           "(fichier distant CHEMIN, sinon le plus gros fichier des répertoires SFTP)")
+    parser.add_argument("--probe-rounds", type=int, default=int(os.getenv('PROBE_ROUNDS', 1)),
+                      help="Nombre de transferts de test par profil (le meilleur est retenu)")
+    parser.add_argument("--sftp-user", default=os.getenv('SFTP_USER'), 
+                      help="Nom d'utilisateur SFTP")
+    parser.add_argument("--sftp-pass", default=os.getenv('SFTP_PASS'), 
+                      help="Mot de passe SFTP")
+    parser.add_argument("--sftp-dir", default=os.getenv('SFTP_DIRS', '').split(','), 
+                      nargs='*', help="Répertoires distants SFTP à traiter")
+    parser.add_argument("-o", "--output", default=os.getenv('OUTPUT_FILE', 'output.csv'), 
+                      help="Fichier de sortie CSV")
+    parser.add_argument("--send-email", action='store_true', default=True,
+                      help="Envoyer le rapport par email à la fin du traitement")
+    parser.add_argument("--no-email", action='store_false', dest='send_email',
+                      help="Désactiver l'envoi du rapport par email")
+    parser.add_argument("--daemon", action='store_true',
+                      help="Mode veille: surveille les répertoires SFTP et traite chaque fichier dès son dépôt")
+    parser.add_argument("--poll-interval", type=int, default=int(os.getenv('POLL_INTERVAL', 30)),
+                      help="Intervalle en secondes entre deux scans SFTP en mode veille")
+    parser.add_argument("--keepalive", type=int, default=int(os.getenv('SFTP_KEEPALIVE', 30)),
+                      help="Intervalle keepalive SSH en secondes (0 pour désactiver)")
+    parser.add_argument("--shopify-incremental", action='store_true',
+                      default=os.getenv('SHOPIFY_INCREMENTAL', '').lower() in ('1', 'true', 'oui'),
+                      help="Ne journaliser que les commandes Shopify nouvelles ou modifiées")
+    parser.add_argument("--shopify-index", default=os.getenv('SHOPIFY_INDEX_FILE', 'shopify_commandes.json'),
+                      help="Index persistant des commandes Shopify déjà journalisées")
+    parser.add_argument("--journal-diff", action='store_true',
+                      default=os.getenv('JOURNAL_DIFF', '').lower() in ('1', 'true', 'oui'),
+                      help="Fichier retraité: n'écrire que les lignes ajoutées et les contre-passations "
+                           "des lignes disparues depuis sa dernière émission")
+    parser.add_argument("--journal-index", default=os.getenv('JOURNAL_INDEX_FILE', 'lignes_emises.json'),
+                      help="Index persistant des lignes déjà émises par fichier source")
+    parser.add_argument("--shopify-workers", type=int, default=int(os.getenv('SHOPIFY_WORKERS', 1)),
+                      help="Processus de traitement des exports Shopify: parties et plages de lignes "
+                           "traitées en parallèle (1: traitement séquentiel)")
+    parser.add_argument("--shopify-chunk-rows", type=int, default=int(os.getenv('SHOPIFY_CHUNK_ROWS', 50000)),
+                      help="Nombre de lignes par plage d'un export Shopify traité en parallèle (0: pas de découpage)")
+    parser.add_argument("--excel-engine", choices=excel_reader.ENGINES,
+                      default=os.getenv('EXCEL_ENGINE', 'auto'),
+                      help="Moteur de lecture Excel (auto: calamine pour les gros fichiers si installé)")
+    parser.add_argument("--excel-auto-threshold", type=int,
+                      default=int(os.getenv('EXCEL_AUTO_THRESHOLD', 256 * 1024)),
+                      help="Taille en octets à partir de laquelle le mode auto utilise calamine")
+    parser.add_argument("--cache-dir", default=os.getenv('PARSE_CACHE_DIR', ''),
+                      help="Répertoire du cache des classeurs Excel déjà lus (vide: pas de cache)")
+    parser.add_argument("--from-date", type=parse_cli_date, default=None,
+                      help="Début de la période à traiter (AAAA-MM-JJ, rejeu), défaut: aujourd'hui")
+    parser.add_argument("--to-date", type=parse_cli_date, default=None,
+                      help="Fin de la période à traiter (AAAA-MM-JJ, rejeu), défaut: aujourd'hui")
+    parser.add_argument("--clorian-batch", action='store_true',
+                      help="Traiter tous les fichiers Clorian de la période en un seul lot vectorisé")
+    parser.add_argument("--stripe-granularity", choices=GRANULARITIES,
+                      default=os.getenv('STRIPE_GRANULARITY', 'transaction'),
+                      help="Niveau de détail des écritures Stripe (détail complet dans le fichier annexe)")
+    parser.add_argument("--shopify-granularity", choices=GRANULARITIES,
+                      default=os.getenv('SHOPIFY_GRANULARITY', 'transaction'),
+                      help="Niveau de détail des écritures Shopify (détail complet dans le fichier annexe)")
+    parser.add_argument("--delivery-plan", default=os.getenv('DELIVERY_PLAN', ''),
+                      help="Livraisons anticipées: groupes de sources livrés dès leur traitement terminé, "
+                           "ex: 'clorian,skidata;stripe' (le rapport consolidé suit)")
+    parser.add_argument("--reconcile", action='store_true',
+                      help="Rapprocher Stripe / Clorian TPE Virtuel et Shopify / Stripe (rapport CSV annexe)")
+    parser.add_argument("--reconcile-days", type=int, default=int(os.getenv('RECONCILE_DAYS', 1)),
+                      help="Écart de dates accepté (jours) pour le rapprochement des transactions")
+    parser.add_argument("--reconcile-tolerance-cents", type=int,
+                      default=int(os.getenv('RECONCILE_TOLERANCE_CENTS', 0)),
+                      help="Écart de montant (centimes) signalé comme écart plutôt que non rapproché")
+    parser.add_argument("--reconcile-daily-tolerance-cents", type=int,
+                      default=int(os.getenv('RECONCILE_DAILY_TOLERANCE_CENTS', 1)),
+                      help="Écart (centimes) accepté entre les totaux journaliers Stripe et Clorian TPE Virtuel")
+    parser.add_argument("--email-to", default=None,
+                      help="Destinataire du rapport (défaut: EMAIL_TO du .env)")
+    parser.add_argument("--sites-config", default=os.getenv('SITES_CONFIG'),
+                      help="Fichier INI décrivant plusieurs sites (une section par site) à traiter en parallèle")
+    parser.add_argument("--max-sites", type=int, default=int(os.getenv('MAX_SITES', 4)),
+                      help="Nombre maximal de sites traités simultanément")
+    parser.add_argument("--max-connections-per-host", type=int,
+                      default=int(os.getenv('MAX_CONNECTIONS_PER_HOST', 1)),
+                      help="Nombre maximal de connexions SFTP simultanées vers un même hôte")
+    parser.add_argument("--history-db", default=os.getenv('RUN_HISTORY_DB', 'historique_executions.sqlite'),
+                      help="Base SQLite de l'historique des exécutions (vide pour désactiver)")
+    parser.add_argument("--history-window", type=int, default=int(os.getenv('HISTORY_WINDOW', 10)),
+                      help="Nombre d'exécutions précédentes formant la référence des durées")
+    parser.add_argument("--regression-factor", type=float, default=float(os.getenv('REGRESSION_FACTOR', 2.0)),
+                      help="Rapport durée / référence au-delà duquel une étape est signalée")
+    parser.add_argument("--ledger-db", default=os.getenv('LEDGER_DB', 'grand_livre.sqlite'),
+                      help="Grand livre SQLite alimenté à chaque exécution (vide pour désactiver)")
+    parser.add_argument("--history-limit", type=int, default=20,
+                      help="Nombre d'exécutions affichées par la commande history")
+    parser.add_argument("--profile", action='store_true',
+                      help="Profiler chaque appel de parseur (CPU et mémoire), rapports dans <sortie>_profil/")
+    parser.add_argument("--download-retries", type=int, default=int(os.getenv('DOWNLOAD_RETRIES', 3)),
+                      help="Nombre de reprises d'un téléchargement interrompu")
+    parser.add_argument("--retry-backoff", type=float, default=float(os.getenv('RETRY_BACKOFF', 2.0)),
+                      help="Attente initiale (secondes) avant reprise, doublée à chaque tentative")
+    parser.add_argument("--serve-host", default=os.getenv('INGEST_HOST', '127.0.0.1'),
+                      help="Adresse d'écoute du service d'ingestion (commande serve)")
+    parser.add_argument("--serve-port", type=int, default=int(os.getenv('INGEST_PORT', 8765)),
+                      help="Port du service d'ingestion (commande serve)")
+    parser.add_argument("--serve-workers", type=int, default=int(os.getenv('INGEST_WORKERS', 4)),
+                      help="Nombre maximal de fichiers traités simultanément par le service d'ingestion")
+    parser.add_argument("--max-upload-size", type=int, default=int(os.getenv('INGEST_MAX_UPLOAD', 64 * 1024 * 1024)),
+                      help="Taille maximale (octets) d'un fichier envoyé au service d'ingestion")
+    parser.add_argument("--download-timeout", type=float, default=float(os.getenv('DOWNLOAD_TIMEOUT', 0)),
+                      help="Délai maximal (secondes) de téléchargement d'un fichier, reprises comprises (0: aucun)")
+    parser.add_argument("--parse-timeout", type=float, default=float(os.getenv('PARSE_TIMEOUT', 0)),
+                      help="Délai maximal (secondes) de traitement d'un fichier, dans un processus interrompu "
+                           "au-delà (0: aucun)")
+    parser.add_argument("--run-timeout", type=float, default=float(os.getenv('RUN_TIMEOUT', 0)),
+                      help="Délai maximal (secondes) de téléchargement et traitement de l'ensemble des fichiers "
+                           "(0: aucun)")
+    parser.add_argument("--source", choices=SOURCE_BACKENDS, default=os.getenv('SOURCE_BACKEND', 'sftp'),
+                      help="Source des fichiers: serveur SFTP, ou répertoires locaux --sftp-dir "
+                           "(partage monté, lus par projection mémoire)")
+    parser.add_argument("--input-dir", default=None,
+                      help="Répertoire local de fichiers capturés à traiter à la place du serveur SFTP "
+                           "(implique --source local)")
+    
+    return parser
+
 
 class UsrRequest:
-    def __init__(self):
-        """Initialisation de la classe avec parsing des arguments et configuration."""
-        parser = argparse.ArgumentParser(
-            description="Automatisation comptable - Récupération et traitement de fichiers via SFTP"
+    def __init__(self, args=None):
+        """
+        Initialisation de la classe avec parsing des arguments et configuration.
+        
+        Args:
+            args: Arguments déjà analysés (ex: configuration d'un site), sinon ligne de commande
+        """
+        self.args = args if args is not None else build_arg_parser().parse_args()
+        # Réglages Excel propres à la requête (les sites d'une exécution multi-sites diffèrent)
+        self.excel_settings = excel_reader.make_settings(
+            self.args.excel_engine, self.args.excel_auto_threshold, self.args.cache_dir
         )
-
-        parser.add_argument("--sftp-host", default=os.getenv('SFTP_HOST'), 
-                          help="Adresse du serveur SFTP")
-        parser.add_argument("--sftp-user", default=os.getenv('SFTP_USER'), 
-                          help="Nom d'utilisateur SFTP")
-        parser.add_argument("--sftp-pass", default=os.getenv('SFTP_PASS'), 
-                          help="Mot de passe SFTP")
-        parser.add_argument("--sftp-dir", default=os.getenv('SFTP_DIRS', '').split(','), 
-                          nargs='*', help="Répertoires distants SFTP à traiter")
-        parser.add_argument("-o", "--output", default=os.getenv('OUTPUT_FILE', 'output.csv'), 
-                          help="Fichier de sortie CSV")
-        parser.add_argument("--send-email", action='store_true', default=True,
-                          help="Envoyer le rapport par email à la fin du traitement")
-        parser.add_argument("--no-email", action='store_false', dest='send_email',
-                          help="Désactiver l'envoi du rapport par email")
-
-        self.args = parser.parse_args()
         self._setup_regex()
-        self.transport = None
-        self.sftp = None
+        self.source = None
         self.matched_files = []
-        
-        # Statistiques globales
+        self.file_attrs = {}
+        if self.args.journal_diff and self.args.shopify_incremental:
+            # Un export incrémental ne contient pas l'état complet du fichier: le différentiel
+            # contre-passerait les commandes journalisées lors des exécutions précédentes
+            raise ValueError("--journal-diff et --shopify-incremental sont incompatibles: "
+                             "choisir l'un ou l'autre")
+        self.shopify_index = OrderIndex(self.args.shopify_index) if self.args.shopify_incremental else None
+        self.journal_index = JournalIndex(self.args.journal_index) if self.args.journal_diff else None
+        self.granularity = {
+            'stripe': self.args.stripe_granularity,
+            'shopify': self.args.shopify_granularity,
+        }
+        self.profiler = Profiler(self.args.output) if self.args.profile else None
+        self.delivery_groups = parse_delivery_plan(self.args.delivery_plan)
+        profiles = load_profiles(self.args.sftp_profiles_file)
+        if self.args.sftp_profile not in profiles:
+            raise ValueError(f"Profil SFTP inconnu: {self.args.sftp_profile} (disponibles: {', '.join(profiles)})")
+        self.sftp_profile = profiles[self.args.sftp_profile]
+        self.parse_worker = ParseWorker(preload=['clorian', 'stripe', 'shopify', 'skidata'],
+                                        settings=self.excel_settings)
+        self.shopify_pool = None
+        if self.args.shopify_workers > 1:
+            if self.profiler is not None:
+                logger.info("🔬 Profilage actif: exports Shopify traités séquentiellement")
+            else:
+                self.shopify_pool = ParsePool(self.args.shopify_workers, preload=['shopify'],
+                                              settings=self.excel_settings)
+        self.run_deadline = None
+        self.download_timed_out = False
+        if self.profiler is not None and (self.args.parse_timeout > 0 or self.args.run_timeout > 0):
+            logger.info("🔬 Profilage actif: traitements exécutés dans le processus principal, sans délai")
+        self._reset_stats()
+
+    def _reset_stats(self):
+        """Réinitialise les statistiques globales (appelé avant chaque lot de fichiers)."""
         self.stats = {
-            'clorian': {'files': 0, 'lines': 0, 'errors': 0},
-            'stripe': {'files': 0, 'lines': 0, 'errors': 0},
-            'shopify': {'files': 0, 'lines': 0, 'errors': 0},
-            'skidata': {'files': 0, 'lines': 0, 'errors': 0},
+            'clorian': {'files': 0, 'rows': 0, 'lines': 0, 'bytes': 0, 'errors': 0},
+            'stripe': {'files': 0, 'rows': 0, 'lines': 0, 'bytes': 0, 'errors': 0},
+            'shopify': {'files': 0, 'rows': 0, 'lines': 0, 'bytes': 0, 'errors': 0},
+            'skidata': {'files': 0, 'rows': 0, 'lines': 0, 'bytes': 0, 'errors': 0},
             'total_files': 0,
+            'total_timeouts': 0,
+            'total_unchanged': 0,  # fichiers retraités sans nouvelle ligne (--journal-diff)
             'total_lines': 0,
             'total_errors': 0
         }
+        self.succeeded = set()  # chemins des fichiers traités sans erreur
+        self.timings = {}  # étape -> durée cumulée (secondes)
+        self.alerts = []   # régressions de performance détectées
+
+    @contextlib.contextmanager
+    def _timed(self, stage, source=None):
+        """
+        Mesure la durée d'une étape (cumulée si l'étape se répète).
+        
+        Args:
+            stage: Nom de l'étape (connexion, telechargement, traitement...)
+            source: Type de fichier; la durée est aussi cumulée sous '<étape>.<source>'
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            for key in [stage] + ([f"{stage}.{source}"] if source else []):
+                self.timings[key] = self.timings.get(key, 0.0) + elapsed
+
+    def start_run_clock(self):
+        """Démarre le délai global de l'exécution (--run-timeout)."""
+        timeout = self.args.run_timeout
+        self.run_deadline = time.monotonic() + timeout if timeout > 0 else None
+
+    def _deadline(self, timeout):
+        """
+        Échéance (horloge monotone) d'une étape limitée à timeout secondes,
+        sans dépasser l'échéance globale de l'exécution.
+        
+        Args:
+            timeout: Délai de l'étape en secondes (0: aucun)
+            
+        Returns:
+            Échéance, ou None si l'étape n'est pas limitée
+        """
+        deadlines = [self.run_deadline] if self.run_deadline is not None else []
+        if timeout > 0:
+            deadlines.append(time.monotonic() + timeout)
+        return min(deadlines) if deadlines else None
+
+    def _parse(self, function, *args, files=1):
+        """
+        Appelle un parseur. Si un délai est configuré, l'appel est exécuté dans un
+        processus séparé, arrêté (kill) à l'échéance.
+        
+        Args:
+            function: Parseur (fonction de module)
+            *args: Arguments du parseur (les fichiers sont copiés pour le processus)
+            files: Nombre de fichiers traités par l'appel (le délai est par fichier)
+            
+        Returns:
+            Lignes comptables générées
+            
+        Raises:
+            ParseTimeout: Délai dépassé
+        """
+        deadline = self._deadline(self.args.parse_timeout * files)
+        if deadline is None or self.profiler is not None:
+            with excel_reader.using(self.excel_settings):
+                return function(*args)
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise ParseTimeout("délai de l'exécution dépassé avant le traitement")
+        
+        def transferable(arg):
+            if isinstance(arg, io.IOBase):
+                return portable(arg)
+            if isinstance(arg, (list, tuple)):
+                return type(arg)(transferable(item) for item in arg)
+            return arg
+        
+        result, args_after = self.parse_worker.call(remaining, function, *[transferable(arg) for arg in args])
+        # Index Shopify et compteurs mis à jour par le parseur dans l'autre processus
+        for before, after in zip(args, args_after):
+            if isinstance(before, OrderIndex):
+                before.orders = after.orders
+                before.lines = after.lines
+            elif isinstance(before, dict):
+                before.update(after)
+        return result
+
+    def _count_timeout(self, file_type, count=1):
+        """Compte des fichiers interrompus par un délai comme fichiers en erreur."""
+        self.stats[file_type]['errors'] += count
+        self.stats['total_errors'] += count
+        self.stats['total_timeouts'] += count
+
+    def _profiled(self, label, function_name):
+        """Profilage de l'appel d'un parseur si --profile est actif."""
+        if self.profiler is None:
+            return contextlib.nullcontext()
+        return self.profiler.profile(label, function_name)
+
+    def _record_input(self, file_type, file_in_memory, remote_path):
+        """
+        Cumule la taille et le nombre de lignes d'un fichier téléchargé (nombre de lignes retourné).
+        Seuls les classeurs xlsx sont comptés ici; les lignes CSV / JSONL sont reportées par le parseur.
+        """
+        file_in_memory.seek(0, io.SEEK_END)
+        self.stats[file_type]['bytes'] += file_in_memory.tell()
+        rows = count_rows(file_in_memory, remote_path)
+        self.stats[file_type]['rows'] += rows
+        return rows
 
     def _setup_regex(self):
         """Configuration des expressions régulières pour détecter les types de fichiers."""
-        self.regex_clorian = re.compile(r'^clorian_(\d{2})-(\d{2})-(\d{4})\.xlsx$', re.IGNORECASE)
-        self.regex_stripe = re.compile(r'^stripe(\d{2})(\d{2})(\d{4})\.csv$', re.IGNORECASE)
-        self.regex_shopify = re.compile(r'^export_caisses\.xlsx$', re.IGNORECASE)
-        self.regex_skidata = re.compile(r'^rapport_jour_(\d{8})\.(xlsx|xls|csv)$', re.IGNORECASE)
+        self.regex_clorian = FILE_PATTERNS['clorian']
+        self.regex_stripe = FILE_PATTERNS['stripe']
+        self.regex_shopify = FILE_PATTERNS['shopify']
+        self.regex_skidata = FILE_PATTERNS['skidata']
         
         logger.debug("Expressions régulières configurées pour la détection des fichiers")
 
@@ -90,25 +397,24 @@ class UsrRequest:
         logger.info("="*80)
         logger.info("CONNEXION AU SERVEUR SFTP")
         logger.info("="*80)
-        logger.info(f"Hôte: {self.args.sftp_host}")
-        logger.info(f"Utilisateur: {self.args.sftp_user}")
-        logger.info(f"Répertoires à scanner: {self.args.sftp_dir}")
+        if self.args.input_dir:
+            logger.info(f"Répertoire local (rejeu hors ligne): {self.args.input_dir}")
+        elif self.args.source == 'local':
+            logger.info(f"Source locale, répertoires à scanner: {self.args.sftp_dir}")
+        else:
+            logger.info(f"Hôte: {self.args.sftp_host}:{self.sftp_profile.get('port') or self.args.sftp_port}")
+            logger.info(f"Profil de transport: {self.args.sftp_profile}")
+            logger.info(f"Utilisateur: {self.args.sftp_user}")
+            logger.info(f"Répertoires à scanner: {self.args.sftp_dir}")
         
         try:
-            self.transport = paramiko.Transport((self.args.sftp_host, 22))
-            self.transport.connect(username=self.args.sftp_user, password=self.args.sftp_pass)
-            self.sftp = paramiko.SFTPClient.from_transport(self.transport)
+            self._open_connection()
             
             logger.info("✓ Connexion SFTP établie avec succès")
             logger.info("="*80)
 
             # Récupération des fichiers de tous les répertoires
-            all_files = []
-            for dir_path in self.args.sftp_dir:
-                files = self._fetch_sftp_files(dir_path)
-                all_files.extend(files)
-            
-            self.matched_files = all_files
+            self.matched_files = self._scan_directories()
             
             # Logs de synthèse
             logger.info("\n" + "="*80)
@@ -135,9 +441,62 @@ class UsrRequest:
             logger.exception(f"❌ Erreur de connexion SFTP: {str(e)}")
             raise
 
+    def _open_connection(self):
+        """
+        Ouvre la source des fichiers: transport SSH (avec keepalive et profil de
+        transport) et client SFTP, ou répertoires locaux (--source local, --input-dir).
+        """
+        if self.args.input_dir or self.args.source == 'local':
+            # Partage monté ou rejeu hors ligne: même traitement, fichiers lus depuis le disque local
+            self.source = LocalSource()
+        else:
+            self.source = SftpSource(
+                self.args.sftp_host, self.args.sftp_port, self.args.sftp_user, self.args.sftp_pass,
+                self.sftp_profile, self.args.keepalive
+            )
+        self.source.connect()
+
+    def _ensure_connection(self):
+        """Rouvre la connexion SFTP si le transport a été perdu (mode veille)."""
+        if self.source is not None and self.source.is_active():
+            return
+        if self.source is not None:
+            logger.warning("⚠️  Transport SFTP inactif, reconnexion...")
+            self.close_sftp()
+        self._open_connection()
+        logger.info("✓ Connexion SFTP (ré)établie")
+
+    def _scan_directories(self):
+        """
+        Parcourt tous les répertoires SFTP configurés.
+        
+        Returns:
+            Liste de tuples (type, chemin, date) des fichiers du jour
+        """
+        self.file_attrs = {}
+        all_files = []
+        directories = [self.args.input_dir] if self.args.input_dir else self.args.sftp_dir
+        for dir_path in directories:
+            files = self._fetch_sftp_files(dir_path)
+            all_files.extend(files)
+        return all_files
+
+    def _date_window(self):
+        """
+        Période de traitement: la date du jour, ou la période --from-date/--to-date.
+        
+        Returns:
+            Tuple (date de début, date de fin) inclusives
+        """
+        today = datetime.now().date()
+        start = self.args.from_date or self.args.to_date or today
+        end = self.args.to_date or (today if self.args.from_date else start)
+        return start, end
+
     def _fetch_sftp_files(self, dir_path):
         """
-        Récupère et filtre les fichiers d'un répertoire SFTP pour la date du jour uniquement.
+        Récupère et filtre les fichiers d'un répertoire SFTP pour la date du jour
+        (ou la période demandée par --from-date/--to-date).
         
         Args:
             dir_path: Chemin du répertoire distant
@@ -147,11 +506,13 @@ class UsrRequest:
         """
         logger.info(f"\n📂 Analyse du répertoire: {dir_path}")
         files_with_dates = []
-        today = datetime.now().date()  # Date du jour
-        yesterday = today - timedelta(days=1)  # Date de la veille (pour Skidata)
+        start, end = self._date_window()  # Date du jour par défaut
+        # Le fichier Skidata d'un jour contient la date de la veille
+        skidata_start = start - timedelta(days=1)
+        skidata_end = end - timedelta(days=1)
         
         try:
-            file_list = self.sftp.listdir_attr(dir_path)
+            file_list = self.source.listdir_attr(dir_path)
             logger.debug(f"  {len(file_list)} fichier(s) trouvé(s)")
             
             for file_attr in file_list:
@@ -160,6 +521,7 @@ class UsrRequest:
                 
                 filename = file_attr.filename
                 full_path = f"{dir_path}/{filename}"
+                self.file_attrs[full_path] = file_attr
                 
                 # Détection Clorian - Format: clorian_DD-MM-YYYY.xlsx
                 match_clorian = self.regex_clorian.match(filename)
@@ -167,21 +529,21 @@ class UsrRequest:
                     file_date_str = f"{match_clorian.group(1)}-{match_clorian.group(2)}-{match_clorian.group(3)}"
                     file_date = datetime.strptime(file_date_str, '%d-%m-%Y')
                     
-                    if file_date.date() == today:
+                    if start <= file_date.date() <= end:
                         files_with_dates.append(('clorian', full_path, file_date))
                         logger.info(f"  ✓ CLORIAN détecté: {filename} (Date: {file_date.strftime('%d/%m/%Y')})")
                     else:
                         logger.debug(f"  - Ignoré (date: {file_date.date()}): {filename}")
                     continue
                 
-                # Détection Stripe - Format: stripeDDMMYYYY.csv
+                # Détection Stripe - Format: stripeDDMMYYYY.csv (ou .json / .jsonl)
                 match_stripe = self.regex_stripe.match(filename)
                 if match_stripe:
                     # Extraction: DD=group(1), MM=group(2), YYYY=group(3)
                     file_date_str = f"{match_stripe.group(1)}{match_stripe.group(2)}{match_stripe.group(3)}"
                     file_date = datetime.strptime(file_date_str, '%d%m%Y')
                     
-                    if file_date.date() == today:
+                    if start <= file_date.date() <= end:
                         files_with_dates.append(('stripe', full_path, file_date))
                         logger.info(f"  ✓ STRIPE détecté: {filename} (Date: {file_date.strftime('%d/%m/%Y')})")
                     else:
@@ -197,20 +559,20 @@ class UsrRequest:
                     file_date = datetime.strptime(date_str, '%Y%m%d')
                     
                     # Pour Skidata: on cherche le fichier avec la date d'HIER
-                    if file_date.date() == yesterday:
+                    if skidata_start <= file_date.date() <= skidata_end:
                         files_with_dates.append(('skidata', full_path, file_date))
                         logger.info(f"  ✓ SKIDATA détecté: {filename} (Date fichier: {file_date.strftime('%d/%m/%Y')}, traité aujourd'hui)")
                     else:
-                        logger.debug(f"  - Ignoré (date: {file_date.date()}, attendu: {yesterday}): {filename}")
+                        logger.debug(f"  - Ignoré (date: {file_date.date()}, attendu: {skidata_start} → {skidata_end}): {filename}")
                     continue
                 
-                # Détection Shopify - Format: export_caisses.xlsx
+                # Détection Shopify - Format: export_caisses.xlsx ou export_caisses_<partie>.xlsx
                 # Utiliser la date de modification du fichier
                 match_shopify = self.regex_shopify.match(filename)
                 if match_shopify:
                     file_mtime = datetime.fromtimestamp(file_attr.st_mtime).date()
                     
-                    if file_mtime == today:
+                    if start <= file_mtime <= end:
                         files_with_dates.append(('shopify', full_path, None))
                         logger.info(f"  ✓ SHOPIFY détecté: {filename} (Modifié le: {file_mtime.strftime('%d/%m/%Y')})")
                     else:
@@ -222,7 +584,11 @@ class UsrRequest:
             # Tri par date (plus récent en premier)
             files_with_dates.sort(key=lambda x: x[2] if x[2] else datetime.min, reverse=True)
             
-            logger.info(f"\n📋 {len(files_with_dates)} fichier(s) du jour ({today.strftime('%d/%m/%Y')})")
+            if start == end:
+                logger.info(f"\n📋 {len(files_with_dates)} fichier(s) du jour ({start.strftime('%d/%m/%Y')})")
+            else:
+                logger.info(f"\n📋 {len(files_with_dates)} fichier(s) du {start.strftime('%d/%m/%Y')} "
+                            f"au {end.strftime('%d/%m/%Y')}")
             
             return files_with_dates
             
@@ -235,29 +601,174 @@ class UsrRequest:
 
     def _download_file(self, remote_path):
         """
-        Télécharge un fichier distant en mémoire.
+        Télécharge un fichier distant dans un tampon adapté à sa taille:
+        en mémoire pour les petits fichiers, dans un fichier temporaire
+        projeté en mémoire (mmap) au-delà de SPOOL_MAX_SIZE.
+        
+        En cas de coupure, la connexion est rouverte et le transfert reprend à
+        l'octet déjà reçu (lecture à partir d'un décalage), avec une attente
+        exponentielle entre les tentatives.
         
         Args:
             remote_path: Chemin du fichier distant
             
         Returns:
-            Objet BytesIO contenant le fichier ou None en cas d'erreur
+            Objet fichier binaire (BytesIO ou MappedFile) ou None en cas d'erreur
         """
+        self.download_timed_out = False
+        if self.source.local:
+            return self._read_local(remote_path)
         try:
-            byte_io = io.BytesIO()
-            self.sftp.getfo(remote_path, byte_io)
-            byte_io.seek(0)
-            
-            file_size = len(byte_io.getvalue())
-            logger.debug(f"  Téléchargé: {file_size} octets ({file_size/1024:.2f} KB)")
-            
-            return byte_io
+            # Taille issue des attributs SFTP (listing ou stat), sans relire le contenu
+            file_attr = self.file_attrs.get(remote_path) or self.source.stat(remote_path)
+            buffer = spool.open_buffer(file_attr.st_size)
         except FileNotFoundError:
             logger.error(f"  ❌ Fichier introuvable: {remote_path}")
             return None
         except Exception as e:
             logger.error(f"  ❌ Erreur de téléchargement {remote_path}: {str(e)}")
             return None
+        
+        deadline = self._deadline(self.args.download_timeout)
+        if deadline is not None and time.monotonic() >= deadline:
+            logger.error(f"  ⏱️  Délai de l'exécution dépassé, {remote_path} non téléchargé")
+            self.download_timed_out = True
+            buffer.close()
+            return None
+        
+        attempts = max(0, self.args.download_retries) + 1
+        for attempt in range(1, attempts + 1):
+            try:
+                file_size = self._transfer(remote_path, buffer, deadline)
+                logger.debug(f"  Téléchargé: {file_size} octets ({file_size/1024:.2f} KB)")
+                return spool.finalize(buffer)
+            except (FileNotFoundError, PermissionError) as e:
+                logger.error(f"  ❌ Fichier inaccessible: {remote_path} ({e})")
+                break
+            except (TimeoutError, socket.timeout) as e:
+                # Canal potentiellement bloqué: fermé, la connexion est rouverte pour les fichiers suivants
+                logger.error(f"  ⏱️  Délai de téléchargement dépassé pour {remote_path} "
+                             f"({buffer.tell()} octets reçus): {e or 'lecture bloquée'}")
+                self.download_timed_out = True
+                self._reconnect()
+                break
+            except (paramiko.SSHException, EOFError, OSError) as e:
+                if attempt == attempts:
+                    logger.error(f"  ❌ Erreur de téléchargement {remote_path} après {attempts} tentative(s): {e}")
+                    break
+                delay = min(self.args.retry_backoff * 2 ** (attempt - 1), MAX_RETRY_DELAY)
+                if deadline is not None and time.monotonic() + delay >= deadline:
+                    logger.error(f"  ⏱️  Téléchargement interrompu ({e}), délai insuffisant pour une reprise")
+                    self.download_timed_out = True
+                    break
+                logger.warning(f"  ⚠️  Téléchargement interrompu à l'octet {buffer.tell()} ({e}), "
+                               f"reprise dans {delay:.1f} s (tentative {attempt + 1}/{attempts})")
+                time.sleep(delay)
+                self._reconnect()
+            except Exception as e:
+                logger.error(f"  ❌ Erreur de téléchargement {remote_path}: {str(e)}")
+                break
+        
+        buffer.close()
+        return None
+
+    def _transfer(self, remote_path, buffer, deadline=None):
+        """
+        Reçoit la suite d'un fichier distant à partir de la position courante du tampon.
+        
+        Args:
+            remote_path: Chemin du fichier distant
+            buffer: Tampon de réception (sa position = octets déjà reçus)
+            deadline: Échéance (horloge monotone) du téléchargement, None si aucune
+            
+        Returns:
+            Taille du fichier reçu, vérifiée par rapport à la taille distante
+            
+        Raises:
+            TimeoutError: Échéance atteinte (une lecture bloquée échoue au plus tard à l'échéance)
+        """
+        with self.source.open(remote_path) as remote:
+            file_size = remote.stat().st_size
+            offset = buffer.tell()
+            if offset > file_size:
+                # Fichier remplacé par une version plus courte: reprise depuis le début
+                logger.warning(f"  ⚠️  {remote_path} a changé de taille ({file_size} octets), reprise complète")
+                offset = 0
+            elif offset:
+                logger.info(f"  ↪️  Reprise du téléchargement à l'octet {offset}/{file_size}")
+            
+            buffer.seek(offset)
+            buffer.truncate()
+            remote.seek(offset)
+            remote.prefetch(file_size)
+            
+            while offset < file_size:
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError(f"échéance atteinte à l'octet {offset}/{file_size}")
+                    remote.settimeout(remaining)
+                data = remote.read(DOWNLOAD_CHUNK_SIZE)
+                if not data:
+                    raise EOFError(f"fin de fichier prématurée à l'octet {offset}/{file_size}")
+                buffer.write(data)
+                offset += len(data)
+            
+            if deadline is not None:
+                # Le délai du canal s'applique à tout le client SFTP: rétabli pour les opérations suivantes
+                remote.settimeout(None)
+        
+        if buffer.tell() != file_size:
+            raise EOFError(f"taille reçue {buffer.tell()} différente de la taille distante {file_size}")
+        return file_size
+
+    def _read_local(self, local_path):
+        """
+        Ouvre un fichier d'une source locale, copié ou projeté en mémoire selon sa
+        taille: ni tampon de réception ni reprise, le fichier est lu directement
+        sur le disque.
+        
+        Args:
+            local_path: Chemin du fichier local
+            
+        Returns:
+            Objet fichier binaire (MappedFile ou BytesIO) ou None en cas d'erreur
+        """
+        try:
+            data = self.source.read(local_path)
+        except FileNotFoundError:
+            logger.error(f"  ❌ Fichier introuvable: {local_path}")
+            return None
+        except (OSError, ValueError) as e:
+            logger.error(f"  ❌ Fichier inaccessible: {local_path} ({e})")
+            return None
+        size = data.seek(0, io.SEEK_END)
+        data.seek(0)
+        logger.debug(f"  {'Projeté' if isinstance(data, spool.MappedFile) else 'Copié'} en mémoire: "
+                     f"{size} octets ({size/1024:.2f} KB)")
+        return data
+
+    def _check_unchanged(self, file_in_memory, remote_path):
+        """
+        Vérifie qu'un fichier projeté en mémoire n'a pas été modifié pendant son
+        traitement (dépôt en cours d'écriture sur un partage): ses écritures
+        seraient incohérentes.
+        
+        Raises:
+            OSError: Fichier modifié depuis sa projection
+        """
+        if isinstance(file_in_memory, spool.MappedFile) and file_in_memory.modified():
+            raise OSError(f"{remote_path} modifié pendant son traitement, à retraiter une fois le dépôt terminé")
+
+    def _reconnect(self):
+        """Ferme puis rouvre la connexion SFTP (canal perdu pendant un transfert)."""
+        self.close_sftp()
+        self.source = None
+        try:
+            self._open_connection()
+            logger.info("✓ Connexion SFTP rétablie")
+        except Exception as e:
+            logger.warning(f"⚠️  Reconnexion SFTP impossible: {e}")
 
     def process_files(self):
         """Traite tous les fichiers détectés et génère les lignes comptables."""
@@ -265,91 +776,450 @@ class UsrRequest:
         logger.info("DÉBUT DU TRAITEMENT DES FICHIERS")
         logger.info("="*80 + "\n")
         
-        all_output = []
+        # Un flux trié par (date, journal) par fichier, avec la position du fichier: l'ordre
+        # de fusion ne dépend pas de l'ordre de traitement imposé par les livraisons
+        output_streams = []
+        detail_streams = []  # Lignes détaillées des sources agrégées (fichier annexe)
+        ledger_batches = []  # (chemin du fichier source, type, lignes) pour le grand livre
+        lines_by_source = {file_type: [] for file_type in ['clorian', 'stripe', 'shopify', 'skidata']}
+        positions = {entry: position for position, entry in enumerate(self.matched_files)}
+        files_to_process = self.matched_files
+        
+        # Livraisons anticipées: les sources prioritaires sont traitées en premier
+        plan = None
+        if self.delivery_groups:
+            plan = DeliveryPlan(self.delivery_groups, self.matched_files)
+            files_to_process = plan.order(files_to_process)
         
-        for index, (file_type, remote_path, file_date) in enumerate(self.matched_files, 1):
+        # Mode lot: tous les fichiers Clorian de la période en un seul pivot
+        if self.args.clorian_batch:
+            clorian_files = []
+            batched_dates = {}
+            for entry in self.matched_files:
+                if entry[0] != 'clorian':
+                    continue
+                # Écritures rattachées au fichier par leur date: un second fichier
+                # de même date (réexport, second site) est traité à part
+                if entry[2] and entry[2] in batched_dates:
+                    logger.warning(f"⚠️  {os.path.basename(entry[1])}: date déjà présente dans le lot "
+                                   f"({os.path.basename(batched_dates[entry[2]])}), fichier traité séparément")
+                    continue
+                if entry[2]:
+                    batched_dates[entry[2]] = entry[1]
+                clorian_files.append(entry)
+            if len(clorian_files) > 1:
+                batch_lines = self._process_clorian_batch(clorian_files)
+                batch_files = self._split_clorian_batch(clorian_files, batch_lines)
+                ledger_batches.extend(batch_files)
+                lines_by_source['clorian'].extend(batch_lines)
+                streams = []
+                for path, _, lines in batch_files:
+                    generated = len(lines)
+                    if self.journal_index is not None:
+                        lines = self.journal_index.diff(path, lines)[0]
+                    if self._count_emitted('clorian', path, generated, lines):
+                        streams.append(lines)
+                    self.succeeded.add(path)
+                batch_lines = list(merge_streams(streams))
+                output_streams.append((-1, batch_lines))
+                files_to_process = [f for f in files_to_process if f not in clorian_files]
+                if plan is not None:
+                    plan.add('clorian', batch_lines)
+                    self._deliver(plan, plan.done('clorian', len(clorian_files)))
+        
+        # Exports Shopify déjà téléchargés et traités en parallèle: {entrée: lignes ou exception}
+        prepared = {}
+        
+        for index, entry in enumerate(files_to_process, 1):
+            file_type, remote_path, file_date = entry
             filename = os.path.basename(remote_path)
             
+            # Délai global dépassé: les fichiers restants sont comptés en erreur
+            if self.run_deadline is not None and time.monotonic() >= self.run_deadline:
+                remaining_files = files_to_process[index - 1:]
+                logger.error(f"⏱️  Délai de l'exécution dépassé: {len(remaining_files)} fichier(s) non traité(s)")
+                for skipped_type, skipped_path, _ in remaining_files:
+                    logger.error(f"  - {os.path.basename(skipped_path)}")
+                    self._count_timeout(skipped_type)
+                break
+            
             logger.info(f"\n{'='*80}")
-            logger.info(f"FICHIER {index}/{len(self.matched_files)}: {filename}")
+            logger.info(f"FICHIER {index}/{len(files_to_process)}: {filename}")
             logger.info(f"Type: {file_type.upper()}")
             if file_date:
                 logger.info(f"Date: {file_date.strftime('%d/%m/%Y')}")
             logger.info("="*80)
             
+            # Premier export Shopify: toutes les parties restantes sont traitées ensemble
+            if file_type == 'shopify' and self.shopify_pool is not None and entry not in prepared:
+                prepared = self._process_shopify_parts(
+                    [f for f in files_to_process[index - 1:] if f[0] == 'shopify']
+                )
+            
+            file_in_memory = None
             try:
-                # Téléchargement du fichier
-                logger.info("⬇️  Téléchargement en cours...")
-                file_in_memory = self._download_file(remote_path)
-                
-                if not file_in_memory:
-                    logger.error(f"❌ Échec du téléchargement, fichier ignoré")
-                    self.stats[file_type]['errors'] += 1
-                    self.stats['total_errors'] += 1
-                    continue
-                
-                logger.info("✓ Téléchargement réussi")
-                
-                # Traitement selon le type
-                logger.info(f"🔄 Traitement {file_type.upper()} en cours...\n")
-                
-                output_lines = []
-                
-                if file_type == 'clorian':
-                    output_lines = clorian(file_in_memory, remote_path)
-                elif file_type == 'stripe':
-                    output_lines = st(file_in_memory)
-                elif file_type == 'shopify':
-                    output_lines = shopify(file_in_memory)
-                elif file_type == 'skidata':
-                    output_lines = treat_skidata_file(file_in_memory, remote_path)
+                if entry in prepared:
+                    output_lines = prepared.pop(entry)
+                    if output_lines is None:
+                        # Échec du téléchargement, déjà compté
+                        continue
+                    if isinstance(output_lines, Exception):
+                        raise output_lines
                 else:
-                    logger.warning(f"⚠️  Type de fichier non reconnu: {file_type}")
+                    # Téléchargement du fichier
+                    logger.info("⬇️  Téléchargement en cours...")
+                    with self._timed('telechargement', file_type):
+                        file_in_memory = self._download_file(remote_path)
+                    
+                    if file_in_memory is None:
+                        logger.error(f"❌ Échec du téléchargement, fichier ignoré")
+                        if self.download_timed_out:
+                            self._count_timeout(file_type)
+                        else:
+                            self.stats[file_type]['errors'] += 1
+                            self.stats['total_errors'] += 1
+                        continue
+                    
+                    logger.info("✓ Téléchargement réussi")
+                    self._record_input(file_type, file_in_memory, remote_path)
+                    
+                    # Traitement selon le type
+                    logger.info(f"🔄 Traitement {file_type.upper()} en cours...\n")
+                    
                     output_lines = []
+                    # Lignes lues, reportées par les parseurs CSV / JSONL
+                    counts = {}
+                    
+                    with self._timed('traitement', file_type):
+                        if file_type == 'clorian':
+                            with self._profiled(filename, 'clorian'):
+                                output_lines = self._parse(clorian, file_in_memory, remote_path)
+                        elif file_type == 'stripe':
+                            with self._profiled(filename, 'st'):
+                                output_lines = self._parse(st, file_in_memory, counts)
+                        elif file_type == 'shopify':
+                            with self._profiled(filename, 'shopify'):
+                                output_lines = self._parse(shopify, file_in_memory, self.shopify_index)
+                        elif file_type == 'skidata':
+                            with self._profiled(filename, 'treat_skidata_file'):
+                                output_lines = self._parse(treat_skidata_file, file_in_memory, remote_path, counts)
+                        else:
+                            logger.warning(f"⚠️  Type de fichier non reconnu: {file_type}")
+                            output_lines = []
+                    self.stats[file_type]['rows'] += counts.get('rows', 0)
+                    if counts.get('bad_lines'):
+                        # Lignes écartées: écritures générées, mais fichier signalé en erreur
+                        logger.error(f"❌ {filename}: {counts['bad_lines']} ligne(s) mal formée(s) ignorée(s)")
+                        self.stats[file_type]['errors'] += 1
+                        self.stats['total_errors'] += 1
+                    self._check_unchanged(file_in_memory, remote_path)
+                
+                if output_lines and file_type in lines_by_source:
+                    lines_by_source[file_type].extend(output_lines)
+                
+                # Agrégation éventuelle (le détail est conservé dans le fichier annexe)
+                granularity = self.granularity.get(file_type, 'transaction')
+                if output_lines and granularity != 'transaction':
+                    detail_streams.append((positions[entry], output_lines))
+                    output_lines = aggregate_lines(output_lines, file_type, granularity)
                 
-                # Mise à jour des statistiques
                 if output_lines:
-                    all_output.extend(output_lines)
-                    self.stats[file_type]['files'] += 1
-                    self.stats[file_type]['lines'] += len(output_lines)
-                    self.stats['total_files'] += 1
-                    self.stats['total_lines'] += len(output_lines)
-                    logger.info(f"✅ {len(output_lines)} ligne(s) comptable(s) générée(s)")
+                    # Grand livre: état complet du fichier, ou des commandes traitées en mode incrémental
+                    ledger_batches.append((remote_path, file_type, output_lines))
+                    generated = len(output_lines)
+                    if self._diff_applies(file_type):
+                        # Fichier retraité: seules les différences avec les lignes déjà émises sont écrites
+                        output_lines, _, _ = self.journal_index.diff(remote_path, output_lines)
+                    # Statistiques sur les lignes effectivement écrites
+                    if self._count_emitted(file_type, remote_path, generated, output_lines):
+                        output_streams.append((positions[entry], output_lines))
+                        if plan is not None:
+                            plan.add(file_type, output_lines)
+                    self.succeeded.add(remote_path)
                 else:
                     logger.warning(f"⚠️  Aucune ligne générée pour ce fichier")
                     self.stats[file_type]['errors'] += 1
                     self.stats['total_errors'] += 1
                 
+            except ParseTimeout as e:
+                logger.error(f"⏱️  {filename}: {e}, fichier ignoré")
+                self._count_timeout(file_type)
             except Exception as e:
                 logger.exception(f"❌ Erreur lors du traitement de {remote_path}")
                 self.stats[file_type]['errors'] += 1
                 self.stats['total_errors'] += 1
+            finally:
+                # Libération du tampon (mémoire ou fichier temporaire)
+                if file_in_memory is not None:
+                    file_in_memory.close()
+                if plan is not None:
+                    self._deliver(plan, plan.done(file_type))
         
         # Sauvegarde des résultats
-        if all_output:
+        if output_streams:
             logger.info("\n" + "="*80)
             logger.info("💾 SAUVEGARDE DES DONNÉES")
             logger.info("="*80)
-            self._save_output(all_output)
+            with self._timed('sauvegarde'):
+                self._save_output([lines for _, lines in sorted(output_streams, key=lambda stream: stream[0])])
+                if detail_streams:
+                    self._save_detail([lines for _, lines in sorted(detail_streams, key=lambda stream: stream[0])])
+                if self.args.ledger_db:
+                    self._save_ledger(ledger_batches)
+                
+                # L'index n'est mis à jour qu'une fois les écritures sauvegardées
+                if self.shopify_index is not None:
+                    self.shopify_index.save()
+                if self.journal_index is not None:
+                    self.journal_index.save()
         else:
             logger.warning("\n⚠️  Aucune donnée à sauvegarder")
         
+        # Rapprochement inter-sources sur les lignes détaillées
+        if self.args.reconcile:
+            with self._timed('rapprochement'):
+                self._reconcile(lines_by_source)
+        
         # Affichage des statistiques finales
         self._display_final_stats()
 
-    def _save_output(self, output_lines):
+    def _count_emitted(self, file_type, remote_path, generated, emitted):
+        """
+        Statistiques d'un fichier traité, sur les lignes écrites dans le CSV (après
+        différentiel). Un fichier retraité sans nouvelle ligne n'est ni compté comme
+        traité ni en erreur.
+        
+        Args:
+            file_type: Type de fichier
+            remote_path: Chemin du fichier source
+            generated: Nombre de lignes générées par le parseur
+            emitted: Lignes à écrire
+            
+        Returns:
+            True si le fichier a des lignes à écrire
+        """
+        if not emitted:
+            logger.info(f"✓ {os.path.basename(remote_path)}: {generated} ligne(s) générée(s), "
+                        f"toutes déjà émises, aucune ligne écrite")
+            self.stats['total_unchanged'] += 1
+            return False
+        self.stats[file_type]['files'] += 1
+        self.stats[file_type]['lines'] += len(emitted)
+        self.stats['total_files'] += 1
+        self.stats['total_lines'] += len(emitted)
+        if len(emitted) == generated:
+            logger.info(f"✅ {generated} ligne(s) comptable(s) générée(s)")
+        else:
+            logger.info(f"✅ {len(emitted)} ligne(s) comptable(s) émise(s) sur {generated} générée(s)")
+        return True
+
+    def _diff_applies(self, file_type):
+        """
+        Indique si les lignes d'un type de fichier passent par l'index des lignes émises.
+        
+        Un export Shopify incrémental n'y passe pas (index du mode veille; --journal-diff
+        est refusé avec --shopify-incremental): seules ses nouvelles commandes sont
+        générées, l'état complet du fichier n'est pas connu.
+        """
+        return self.journal_index is not None and not (file_type == 'shopify' and self.shopify_index is not None)
+
+    def _process_clorian_batch(self, clorian_files):
+        """
+        Télécharge et traite en un seul lot tous les fichiers Clorian.
+        
+        Args:
+            clorian_files: Liste de tuples (type, chemin, date) de type clorian
+            
+        Returns:
+            Liste des lignes comptables générées
+        """
+        logger.info(f"\n{'='*80}")
+        logger.info(f"LOT CLORIAN: {len(clorian_files)} fichier(s)")
+        logger.info("="*80)
+        
+        downloaded = []
+        for file_type, remote_path, file_date in clorian_files:
+            with self._timed('telechargement', 'clorian'):
+                file_in_memory = self._download_file(remote_path)
+            if file_in_memory is None:
+                logger.error(f"❌ Échec du téléchargement de {remote_path}, fichier ignoré")
+                if self.download_timed_out:
+                    self._count_timeout('clorian')
+                else:
+                    self.stats['clorian']['errors'] += 1
+                    self.stats['total_errors'] += 1
+                continue
+            self._record_input('clorian', file_in_memory, remote_path)
+            downloaded.append((file_in_memory, remote_path))
+        
+        try:
+            with self._timed('traitement', 'clorian'), self._profiled('lot_clorian', 'clorian_batch'):
+                output_lines = self._parse(clorian_batch, downloaded, files=len(downloaded)) if downloaded else []
+            for file_in_memory, remote_path in downloaded:
+                self._check_unchanged(file_in_memory, remote_path)
+        except ParseTimeout as e:
+            logger.error(f"⏱️  Lot Clorian: {e}, lot ignoré")
+            self._count_timeout('clorian', len(downloaded))
+            return []
+        except Exception:
+            logger.exception("❌ Erreur lors du traitement du lot Clorian")
+            output_lines = []
+        finally:
+            for file_in_memory, remote_path in downloaded:
+                file_in_memory.close()
+        
+        if output_lines:
+            # Statistiques comptées par fichier du lot, après différentiel (process_files)
+            logger.info(f"✅ {len(output_lines)} ligne(s) comptable(s) générée(s) pour le lot")
+        elif downloaded:
+            logger.warning("⚠️  Aucune ligne générée pour le lot Clorian")
+            self.stats['clorian']['errors'] += len(downloaded)
+            self.stats['total_errors'] += len(downloaded)
+        
+        return output_lines
+
+    def _process_shopify_parts(self, shopify_files):
+        """
+        Télécharge les exports Shopify (parties d'un export découpé, exports par
+        boutique) puis les traite en parallèle dans le groupe de processus. Un export
+        de plus de --shopify-chunk-rows lignes est lu une fois, puis ses plages de
+        lignes sont traitées en parallèle.
+        
+        Args:
+            shopify_files: Liste de tuples (type, chemin, date) de type shopify
+            
+        Returns:
+            Dictionnaire {entrée: lignes comptables}; la valeur est None si le
+            téléchargement a échoué (déjà compté), ou l'exception du traitement
+        """
+        logger.info(f"\n{'='*80}")
+        logger.info(f"EXPORTS SHOPIFY: {len(shopify_files)} fichier(s), {self.shopify_pool.size} processus")
+        logger.info("="*80)
+        
+        prepared = {}
+        downloaded = []
+        for entry in shopify_files:
+            remote_path = entry[1]
+            with self._timed('telechargement', 'shopify'):
+                file_in_memory = self._download_file(remote_path)
+            if file_in_memory is None:
+                logger.error(f"❌ Échec du téléchargement de {remote_path}, fichier ignoré")
+                if self.download_timed_out:
+                    self._count_timeout('shopify')
+                else:
+                    self.stats['shopify']['errors'] += 1
+                    self.stats['total_errors'] += 1
+                prepared[entry] = None
+                continue
+            try:
+                rows = self._record_input('shopify', file_in_memory, remote_path)
+                copy = portable(file_in_memory)
+                self._check_unchanged(file_in_memory, remote_path)
+                downloaded.append((entry, copy, rows))
+            except OSError as e:
+                logger.error(f"❌ {e}")
+                self.stats['shopify']['errors'] += 1
+                self.stats['total_errors'] += 1
+                prepared[entry] = None
+            finally:
+                file_in_memory.close()
+        
+        # Délai par fichier, décompté à partir du début de son traitement
+        deadlines = {}
+        
+        def started(entry):
+            deadlines[entry] = self._deadline(self.args.parse_timeout)
+            return remaining(entry)
+        
+        def remaining(entry):
+            deadline = deadlines[entry]
+            return None if deadline is None else max(0.0, deadline - time.monotonic())
+        
+        chunk_rows = self.args.shopify_chunk_rows
+        split = {entry for entry, _, rows in downloaded if chunk_rows > 0 and rows > chunk_rows}
+        
+        with self._timed('traitement', 'shopify'):
+            # Exports entiers en parallèle (les plus volumineux sont seulement lus)
+            results = self.shopify_pool.map([
+                (lambda entry=entry: started(entry), read_export if entry in split else shopify,
+                 (file_in_memory, self.shopify_index))
+                for entry, file_in_memory, _ in downloaded
+            ])
+            
+            # Plages de lignes des exports volumineux en parallèle
+            ranges = []
+            for (entry, _, _), outcome in zip(downloaded, results):
+                if entry in split and not isinstance(outcome, Exception) and outcome[0][0] is not None:
+                    rows = outcome[0][0]
+                    starts = range(0, len(rows), chunk_rows)
+                    logger.info(f"📑 {os.path.basename(entry[1])}: {len(rows)} ligne(s) en {len(starts)} plage(s)")
+                    ranges += [(entry, rows.iloc[start:start + chunk_rows]) for start in starts]
+            range_results = self.shopify_pool.map([
+                (lambda entry=entry: remaining(entry), journal_rows, (rows,)) for entry, rows in ranges
+            ])
+        
+        # Assemblage dans l'ordre des fichiers et des plages: mêmes lignes qu'un traitement séquentiel
+        index_updates = []  # (empreintes, écritures par commande) de chaque fichier
+        for (entry, _, _), outcome in zip(downloaded, results):
+            if isinstance(outcome, Exception):
+                prepared[entry] = outcome
+                continue
+            
+            if entry not in split:
+                output_lines, args_after = outcome
+                if self.shopify_index is not None:
+                    # Contre-passations déjà ajoutées par le parseur
+                    after = args_after[1]
+                    changed = {reference: value for reference, value in after.orders.items()
+                               if self.shopify_index.get(reference) != value}
+                    index_updates.append(
+                        (changed, {reference: after.lines.get(reference, []) for reference in changed})
+                    )
+                prepared[entry] = output_lines
+                continue
+            
+            rows, fingerprints, total_rows = outcome[0]
+            if rows is None:
+                # Export vide
+                prepared[entry] = []
+                continue
+            parts = [result for (range_entry, _), result in zip(ranges, range_results) if range_entry == entry]
+            failure = next((result for result in parts if isinstance(result, Exception)), None)
+            if failure is not None:
+                prepared[entry] = failure
+                continue
+            output_lines, stats = combine_ranges([result for result, _ in parts])
+            stats['total_rows'] = total_rows
+            if self.shopify_index is not None:
+                reversals = self.shopify_index.reversals(self.shopify_index.modified(fingerprints))
+                index_updates.append((fingerprints, lines_by_reference(output_lines)))
+                if reversals:
+                    output_lines = list(merge_streams([output_lines, reversals]))
+            shopify_summary(stats, output_lines)
+            prepared[entry] = output_lines
+        
+        # Index des commandes mis à jour dans l'ordre des fichiers
+        for fingerprints, lines in index_updates:
+            self.shopify_index.update(fingerprints, lines)
+        
+        return prepared
+
+    def _save_output(self, output_streams):
         """
-        Sauvegarde les lignes comptables dans le fichier CSV de sortie.
+        Sauvegarde les lignes comptables dans le fichier CSV de sortie, en un
+        journal global trié par (date, journal) fusionné à partir des flux triés
+        de chaque fichier.
         
         Args:
-            output_lines: Liste des lignes à sauvegarder
+            output_streams: Listes de lignes triées, une par fichier, dans l'ordre des fichiers
         """
         try:
             with open(self.args.output, 'a', newline='', encoding='utf-8') as csvfile:
                 writer = csv.writer(csvfile)
-                writer.writerows(output_lines)
+                writer.writerows(merge_streams(output_streams))
             
-            logger.info(f"✅ {len(output_lines)} ligne(s) ajoutée(s) au fichier: {self.args.output}")
+            line_count = sum(len(lines) for lines in output_streams)
+            logger.info(f"✅ {line_count} ligne(s) ajoutée(s) au fichier: {self.args.output}")
             logger.info(f"📄 Chemin complet: {os.path.abspath(self.args.output)}")
             
         except PermissionError:
@@ -359,6 +1229,151 @@ class UsrRequest:
             logger.error(f"❌ Erreur lors de la sauvegarde: {str(e)}")
             raise
 
+    def _deliver(self, plan, number):
+        """
+        Livraison anticipée d'un groupe de sources: fichier CSV de ses écritures
+        et envoi par email avec ses propres statistiques.
+        
+        Args:
+            plan: DeliveryPlan de l'exécution
+            number: Numéro de la livraison devenue complète (None: rien à livrer)
+        """
+        if number is None:
+            return
+        sources = plan.groups[number - 1]
+        streams = plan.streams[number - 1]
+        line_count = sum(len(lines) for lines in streams)
+        names = ', '.join(source.capitalize() for source in sources)
+        
+        logger.info("\n" + "="*80)
+        logger.info(f"📦 LIVRAISON ANTICIPÉE {number}: {names}")
+        logger.info("="*80)
+        if not line_count:
+            logger.warning("⚠️  Aucune écriture à livrer pour ces sources")
+            return
+        
+        path = delivery_path(self.args.output, number)
+        try:
+            with open(path, 'w', newline='', encoding='utf-8') as csvfile:
+                writer = csv.writer(csvfile)
+                writer.writerow(OUTPUT_HEADER)
+                writer.writerows(merge_streams(streams))
+        except OSError as e:
+            logger.error(f"❌ Livraison {number} impossible ({path}): {e}")
+            return
+        logger.info(f"✅ {line_count} ligne(s) livrée(s): {path}")
+        
+        stats = {'total_lines': line_count}
+        stats.update({source: self.stats[source]['lines'] for source in sources})
+        send_email_report(
+            self, path, stats, title=f"Rapport Comptable partiel ({names})",
+            note="Les écritures des autres sources suivront, puis le rapport consolidé."
+        )
+
+    def _split_clorian_batch(self, clorian_files, batch_lines):
+        """
+        Rattache les écritures d'un lot Clorian à leur fichier d'origine
+        (un fichier par jour), pour le remplacement par fichier du grand livre.
+        
+        Args:
+            clorian_files: Liste de tuples (type, chemin, date) du lot
+            batch_lines: Lignes comptables générées pour le lot
+            
+        Returns:
+            Liste de tuples (chemin du fichier source, 'clorian', lignes)
+        """
+        files_by_date = {
+            file_date.strftime('%d/%m/%Y'): remote_path
+            for _, remote_path, file_date in clorian_files if file_date
+        }
+        fallback = clorian_files[0][1]
+        by_file = {}
+        for line in batch_lines:
+            by_file.setdefault(files_by_date.get(line[1], fallback), []).append(line)
+        return [(filename, 'clorian', lines) for filename, lines in by_file.items()]
+
+    def _save_ledger(self, ledger_batches):
+        """
+        Enregistre les écritures dans le grand livre SQLite, rattachées au fichier
+        de sortie (site) et au chemin du fichier source. Les écritures d'un fichier
+        déjà enregistré (rejeu, fichier redéposé) sont remplacées; en mode Shopify
+        incrémental, seules celles des commandes traitées le sont, avec leurs
+        écritures actuelles (sans les contre-passations émises dans le CSV).
+        Un échec n'interrompt pas le traitement: le fichier CSV fait foi.
+        
+        Args:
+            ledger_batches: Liste de tuples (chemin du fichier source, type, lignes)
+        """
+        output = os.path.abspath(self.args.output)
+        try:
+            ledger = Ledger(self.args.ledger_db)
+            try:
+                count = 0
+                for source_file, file_type, lines in ledger_batches:
+                    if file_type == 'shopify' and self.shopify_index is not None:
+                        references = list(dict.fromkeys(line[COL_REFERENCE] for line in lines))
+                        orders = [line for reference in references
+                                  for line in self.shopify_index.lines.get(reference, [])]
+                        count += ledger.replace_orders(output, source_file, file_type, orders, references)
+                    else:
+                        count += ledger.replace_file(output, source_file, file_type, lines)
+            finally:
+                ledger.close()
+            logger.info(f"📚 {count} écriture(s) enregistrée(s) dans le grand livre: {self.args.ledger_db}")
+        except sqlite3.Error as e:
+            logger.error(f"❌ Grand livre indisponible ({self.args.ledger_db}): {e}")
+
+    def _reconcile(self, lines_by_source):
+        """
+        Rapproche les sources entre elles et écrit le rapport CSV annexe.
+        
+        Args:
+            lines_by_source: Dictionnaire {type de fichier: lignes comptables détaillées}
+        """
+        logger.info("\n" + "="*80)
+        logger.info("🔗 RAPPROCHEMENT INTER-SOURCES")
+        logger.info("="*80)
+        
+        try:
+            reports = reconciliation.reconcile(
+                lines_by_source,
+                date_window_days=self.args.reconcile_days,
+                amount_tolerance_cents=self.args.reconcile_tolerance_cents,
+                daily_tolerance_cents=self.args.reconcile_daily_tolerance_cents
+            )
+            if not reports:
+                logger.info("Aucune donnée à rapprocher")
+                return
+            
+            path = reconciliation.reconciliation_path(self.args.output)
+            reconciliation.write_report(reports, path)
+            logger.info(f"✅ Rapport de rapprochement: {path}")
+        except Exception as e:
+            logger.exception(f"❌ Erreur lors du rapprochement: {e}")
+
+    def _save_detail(self, detail_streams):
+        """
+        Ajoute les lignes détaillées des sources agrégées au fichier annexe (audit),
+        fusionnées par (date, journal) comme le fichier de sortie.
+        
+        Args:
+            detail_streams: Listes de lignes par transaction triées, une par fichier
+        """
+        path = detail_path(self.args.output)
+        try:
+            write_header = not os.path.exists(path) or os.path.getsize(path) == 0
+            with open(path, 'a', newline='', encoding='utf-8') as csvfile:
+                writer = csv.writer(csvfile)
+                if write_header:
+                    writer.writerow(OUTPUT_HEADER)
+                writer.writerows(merge_streams(detail_streams))
+            
+            line_count = sum(len(lines) for lines in detail_streams)
+            logger.info(f"✅ {line_count} ligne(s) détaillée(s) ajoutée(s) au fichier annexe: {path}")
+        except Exception as e:
+            logger.error(f"❌ Erreur lors de la sauvegarde du fichier annexe: {str(e)}")
+            raise
+
     def _display_final_stats(self):
         """Affiche les statistiques finales du traitement."""
         logger.info("\n" + "="*80)
@@ -370,17 +1385,21 @@ class UsrRequest:
             if stats['files'] > 0 or stats['errors'] > 0:
                 logger.info(f"\n{file_type.upper()}:")
                 logger.info(f"  Fichiers traités: {stats['files']}")
-                logger.info(f"  Lignes générées: {stats['lines']}")
+                logger.info(f"  Lignes écrites: {stats['lines']}")
                 if stats['errors'] > 0:
                     logger.info(f"  Erreurs: {stats['errors']}")
         
         logger.info(f"\n{'─'*80}")
         logger.info(f"TOTAL:")
         logger.info(f"  Fichiers traités: {self.stats['total_files']}/{len(self.matched_files)}")
-        logger.info(f"  Lignes comptables générées: {self.stats['total_lines']}")
+        logger.info(f"  Lignes comptables écrites: {self.stats['total_lines']}")
         
         if self.stats['total_errors'] > 0:
             logger.warning(f"  ⚠️  Erreurs totales: {self.stats['total_errors']}")
+        if self.stats['total_timeouts'] > 0:
+            logger.warning(f"  ⏱️  Dont fichiers interrompus par un délai: {self.stats['total_timeouts']}")
+        if self.stats['total_unchanged'] > 0:
+            logger.info(f"  Fichiers retraités sans nouvelle ligne: {self.stats['total_unchanged']}")
         
         logger.info("="*80 + "\n")
 
@@ -396,22 +1415,356 @@ class UsrRequest:
             'shopify': self.stats['shopify']['lines'],
             'stripe': self.stats['stripe']['lines'],
             'clorian': self.stats['clorian']['lines'],
-            'skidata': self.stats['skidata']['lines']
+            'skidata': self.stats['skidata']['lines'],
+            'alerts': self.alerts
         }
 
+    def close(self):
+        """Libère les ressources de la requête: connexion SFTP et processus de traitement."""
+        self.close_sftp()
+        self.parse_worker.close()
+        if self.shopify_pool is not None:
+            self.shopify_pool.close()
+
     def close_sftp(self):
         """Ferme la connexion SFTP proprement."""
         try:
-            if self.sftp:
-                self.sftp.close()
-                logger.debug("Client SFTP fermé")
-            if self.transport:
-                self.transport.close()
-                logger.debug("Transport SFTP fermé")
+            if self.source:
+                self.source.close()
             logger.info("✓ Connexion SFTP fermée proprement")
         except Exception as e:
             logger.warning(f"Erreur lors de la fermeture SFTP: {e}")
 
+    def run_daemon(self):
+        """
+        Mode veille: garde un processus et une connexion SFTP chauds, scanne
+        périodiquement les répertoires et traite chaque fichier dès qu'il est
+        complètement déposé.
+        
+        La détection de changement repose uniquement sur les attributs
+        (taille, date de modification) renvoyés par listdir_attr: un fichier
+        est traité lorsque sa signature est stable entre deux scans et
+        différente de celle déjà traitée. Un fichier en échec (délai, coupure,
+        erreur du parseur) est retraité aux scans suivants, jusqu'à
+        DAEMON_MAX_ATTEMPTS tentatives pour une même signature.
+        
+        Un fichier redéposé ou modifié dans la journée n'ajoute au fichier du
+        jour que ses différences (ajouts et contre-passations), via l'index des
+        lignes émises: celui de --journal-diff, sinon un index en mémoire
+        remis à zéro avec le fichier de sortie.
+        """
+        logger.info("="*80)
+        logger.info("🔁 MODE VEILLE ACTIVÉ")
+        logger.info("="*80)
+        logger.info(f"Répertoires surveillés: {self.args.sftp_dir}")
+        logger.info(f"Intervalle de scan: {self.args.poll_interval} s")
+        logger.info("="*80 + "\n")
+        
+        processed = {}  # chemin -> signature déjà traitée
+        pending = {}    # chemin -> signature observée au scan précédent
+        failures = {}   # chemin -> nombre d'échecs pour la signature en attente
+        output_day = None
+        day_index = self.journal_index is None
+        
+        while True:
+            try:
+                self._ensure_connection()
+                
+                # Nouveau fichier de sortie à chaque changement de jour
+                today = datetime.now().date()
+                if today != output_day:
+                    init_output_file(self.args.output)
+                    output_day = today
+                    processed.clear()
+                    failures.clear()
+                    if day_index:
+                        self.journal_index = JournalIndex(None)
+                
+                scanned = self._scan_directories()
+                
+                # Fichiers disparus avant d'être complètement déposés: oubliés
+                present = {entry[1] for entry in scanned}
+                for remote_path in [path for path in pending if path not in present]:
+                    del pending[remote_path]
+                
+                ready = []
+                for entry in scanned:
+                    remote_path = entry[1]
+                    file_attr = self.file_attrs[remote_path]
+                    signature = (file_attr.st_size, file_attr.st_mtime)
+                    
+                    if processed.get(remote_path) == signature:
+                        continue
+                    if pending.get(remote_path) == signature:
+                        ready.append(entry)
+                    else:
+                        # Fichier nouveau ou encore en cours de dépôt
+                        pending[remote_path] = signature
+                        failures.pop(remote_path, None)
+                
+                if ready:
+                    logger.info(f"📥 {len(ready)} nouveau(x) fichier(s) prêt(s) à traiter")
+                    self.matched_files = ready
+                    self._reset_stats()
+                    started_at = datetime.now()
+                    self.start_run_clock()
+                    with self._timed('total'):
+                        self.process_files()
+                    record_history(self, started_at, mode='veille')
+                    send_email_report(self)
+                    
+                    # Seuls les fichiers traités sans erreur sont marqués; les autres restent en attente
+                    for entry in ready:
+                        remote_path = entry[1]
+                        if remote_path not in self.succeeded:
+                            failures[remote_path] = failures.get(remote_path, 0) + 1
+                            if failures[remote_path] < DAEMON_MAX_ATTEMPTS:
+                                logger.warning(f"⚠️  {os.path.basename(remote_path)}: échec, nouvelle tentative "
+                                               f"au prochain scan ({failures[remote_path]}/{DAEMON_MAX_ATTEMPTS})")
+                                continue
+                            logger.error(f"❌ {os.path.basename(remote_path)}: échec après {DAEMON_MAX_ATTEMPTS} "
+                                         f"tentative(s), ignoré jusqu'à sa prochaine modification")
+                        failures.pop(remote_path, None)
+                        processed[remote_path] = pending.pop(remote_path)
+                
+            except (paramiko.SSHException, EOFError, OSError) as e:
+                logger.warning(f"⚠️  Connexion SFTP perdue ({e}), nouvelle tentative au prochain scan")
+                self.close_sftp()
+                self.source = None
+            except Exception:
+                # Le mode veille ne s'arrête pas sur une erreur de traitement
+                logger.exception("❌ Erreur pendant le cycle de veille, nouvelle tentative au prochain scan")
+            
+            time.sleep(self.args.poll_interval)
+
+
+def init_output_file(output_path):
+    """
+    Crée (ou écrase) le fichier de sortie avec la ligne d'en-têtes Capilog.
+    
+    Args:
+        output_path: Chemin du fichier CSV de sortie
+    """
+    logger.info("📝 Initialisation du fichier de sortie...")
+    with open(output_path, 'w', newline='', encoding='utf-8') as w:
+        csvwriter = csv.writer(w)
+        csvwriter.writerow(OUTPUT_HEADER)
+    
+    # Le fichier annexe détaillé repart de zéro avec le fichier de sortie
+    if os.path.exists(detail_path(output_path)):
+        os.remove(detail_path(output_path))
+    logger.info(f"✓ En-têtes CSV ajoutés à: {output_path}\n")
+
+
+def send_email_report(request, csv_path=None, stats=None, title=None, note=None):
+    """
+    Envoie le rapport par email si demandé et si des données ont été traitées.
+    
+    Args:
+        request: Instance UsrRequest ayant terminé son traitement
+        csv_path: Fichier joint (défaut: fichier de sortie)
+        stats: Statistiques du rapport (défaut: celles de l'exécution)
+        title: Titre du rapport (défaut: rapport complet, ou consolidé après des livraisons anticipées)
+        note: Précision ajoutée au corps du message
+        
+    Returns:
+        True si l'email a été envoyé, False sinon
+    """
+    if not request.args.send_email:
+        return False
+    
+    stats = stats if stats is not None else request.get_email_stats()
+    if title is None:
+        title = "Rapport Comptable consolidé" if request.delivery_groups else "Rapport Comptable"
+    
+    if stats['total_lines'] == 0:
+        logger.info("\n⚠️  Aucune donnée à envoyer par email")
+        return False
+    
+    logger.info("\n" + "="*80)
+    logger.info("📧 ENVOI DU RAPPORT PAR EMAIL")
+    logger.info("="*80)
+    
+    email_sent = False
+    try:
+        email_sender = EmailSender(request.args.email_to)
+        
+        if email_sender.send_report(csv_path or request.args.output, stats, title, note):
+            email_sent = True
+            logger.info("✅ Rapport envoyé par email avec succès")
+        else:
+            logger.warning("⚠️  L'email n'a pas pu être envoyé")
+            
+    except ValueError as e:
+        logger.error(f"❌ Configuration email invalide: {e}")
+    except Exception as e:
+        logger.error(f"❌ Erreur lors de l'envoi de l'email: {e}")
+    
+    logger.info("="*80 + "\n")
+    return email_sent
+
+
+def parse_cli_date(value):
+    """Convertit une date AAAA-MM-JJ passée en argument (argparse)."""
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Date invalide '{value}' (format attendu: AAAA-MM-JJ)")
+
+
+def run_once(request):
+    """
+    Exécute un traitement complet: fichier de sortie, connexion SFTP,
+    traitement des fichiers du jour et envoi du rapport.
+    
+    Args:
+        request: Instance UsrRequest configurée
+        
+    Returns:
+        True si le rapport a été envoyé par email, False sinon
+    """
+    started_at = datetime.now()
+    
+    # Création du fichier de sortie avec en-têtes
+    init_output_file(request.args.output)
+    
+    # Types de fichiers à traiter
+    file_types = ['clorian', 'stripe', 'shopify', 'skidata']
+    
+    request.start_run_clock()
+    with request._timed('total'):
+        # Connexion SFTP et récupération des fichiers (déjà filtrés par date du jour)
+        with request._timed('connexion'):
+            request.connect_sftp()
+        
+        # Filtrage des fichiers par type
+        request.matched_files = [
+            file for file in request.matched_files 
+            if file[0] in file_types
+        ]
+        
+        # Traitement des fichiers
+        request.process_files()
+    
+    # Historique et détection des régressions (incluses dans l'email)
+    record_history(request, started_at)
+    
+    # Envoi de l'email si demandé et si des données ont été traitées
+    return send_email_report(request)
+
+
+def record_history(request, started_at, mode='run'):
+    """
+    Enregistre l'exécution dans l'historique SQLite et signale les étapes
+    nettement plus lentes que leur référence glissante.
+    
+    Args:
+        request: Instance UsrRequest ayant terminé son traitement
+        started_at: Date de début de l'exécution
+        mode: 'run' ou 'veille'
+        
+    Returns:
+        Liste des alertes de performance (également dans request.alerts)
+    """
+    if not request.args.history_db:
+        return []
+    
+    try:
+        history = RunHistory(request.args.history_db)
+        try:
+            # La référence est calculée avant d'enregistrer l'exécution courante
+            request.alerts = history.check_regressions(
+                request.args.output, request.timings,
+                request.args.history_window, request.args.regression_factor, mode
+            )
+            history.record(request.args.output, request.stats, request.timings,
+                           ['clorian', 'stripe', 'shopify', 'skidata'], mode, started_at)
+        finally:
+            history.close()
+    except sqlite3.Error as e:
+        logger.error(f"❌ Historique des exécutions indisponible ({request.args.history_db}): {e}")
+        return []
+    
+    for alert in request.alerts:
+        logger.warning(f"🐢 Régression de performance - {alert}")
+    return request.alerts
+
+
+def run_sites(args):
+    """
+    Traite en parallèle tous les sites décrits dans --sites-config.
+    
+    Chaque site dispose de sa propre connexion, de son fichier de sortie et de
+    son email; l'échec d'un site n'interrompt pas les autres. Le nombre de
+    connexions simultanées vers un même hôte est limité.
+    
+    Args:
+        args: Arguments de ligne de commande (valeurs par défaut des sites)
+        
+    Returns:
+        Liste des synthèses par site
+    """
+    sites = load_sites(args.sites_config, args)
+    logger.info(f"🌐 {len(sites)} site(s) à traiter: {', '.join(name for name, _ in sites)}")
+    
+    host_limits = {}
+    host_limits_lock = threading.Lock()
+    
+    def run_site(name, site_args):
+        if site_args.input_dir or site_args.source == 'local':
+            # Source locale: aucune connexion au serveur, pas de limite par hôte
+            host_limit = contextlib.nullcontext()
+        else:
+            with host_limits_lock:
+                host_limit = host_limits.setdefault(
+                    site_args.sftp_host, threading.BoundedSemaphore(args.max_connections_per_host)
+                )
+        
+        summary = {'site': name, 'host': site_args.sftp_host, 'files': 0, 'lines': 0,
+                   'errors': 0, 'email': False, 'status': 'ok', 'duration': 0.0}
+        start = time.monotonic()
+        request = None
+        try:
+            with host_limit:
+                logger.info(f"▶️  [{name}] Début du traitement ({site_args.sftp_host})")
+                request = UsrRequest(site_args)
+                summary['email'] = run_once(request)
+        except Exception as e:
+            logger.exception(f"❌ [{name}] Échec du traitement du site")
+            summary['status'] = f"échec: {e}"
+        finally:
+            if request:
+                request.close()
+                summary['files'] = request.stats['total_files']
+                summary['lines'] = request.stats['total_lines']
+                summary['errors'] = request.stats['total_errors']
+            summary['duration'] = time.monotonic() - start
+        return summary
+    
+    # Les profileurs CPU/mémoire sont globaux au processus: sites traités un par un
+    max_workers = max(1, args.max_sites)
+    if args.profile and max_workers > 1:
+        logger.info("🔬 Profilage actif: sites traités un par un")
+        max_workers = 1
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(run_site, name, site_args) for name, site_args in sites]
+        summaries = [future.result() for future in futures]
+    
+    # Synthèse combinée
+    logger.info("\n" + "="*80)
+    logger.info("🌐 SYNTHÈSE MULTI-SITES")
+    logger.info("="*80)
+    for summary in summaries:
+        logger.info(f"[{summary['site']}] {summary['status']} - {summary['files']} fichier(s), "
+                    f"{summary['lines']} ligne(s), {summary['errors']} erreur(s), "
+                    f"email: {'oui' if summary['email'] else 'non'}, {summary['duration']:.2f} s")
+    logger.info(f"TOTAL: {sum(s['lines'] for s in summaries)} ligne(s), "
+                f"{sum(1 for s in summaries if s['status'] != 'ok')} site(s) en échec")
+    logger.info("="*80 + "\n")
+    
+    return summaries
+
 
 def main():
     """Fonction principale d'exécution du script."""
@@ -428,60 +1781,36 @@ def main():
     email_sent = False
     
     try:
-        request = UsrRequest()
-        
-        # Création du fichier de sortie avec en-têtes
-        logger.info("📝 Initialisation du fichier de sortie...")
-        with open(request.args.output, 'w', newline='', encoding='utf-8') as w:
-            csvwriter = csv.writer(w)
-            csvwriter.writerow([
-                "# Explications Code journal", "Date avec ou sans les /", "Informations", 
-                "Numéro de compte", "Code section analytique", "Libellé de la ligne", 
-                "Date d'échéance", "Montant débit", "Montant crédit",
-                "      ", "      ", "     ", "     ", "    ", "    ", 
-                "Référence", "Informations", "    ", "    ", "    ", "    ", "lien"
-            ])
-        logger.info(f"✓ En-têtes CSV ajoutés à: {request.args.output}\n")
+        args = build_arg_parser().parse_args()
         
-        # Types de fichiers à traiter
-        file_types = ['clorian', 'stripe', 'shopify', 'skidata']
+        # Consultation de l'historique: aucune connexion SFTP
+        if args.command == 'history':
+            print_history(args.history_db, args.history_limit)
+            return
         
-        # Connexion SFTP et récupération des fichiers (déjà filtrés par date du jour)
-        request.connect_sftp()
+        # Service d'ingestion HTTP: processus chaud, aucune connexion SFTP
+        if args.command == 'serve':
+            serve(args)
+            return
         
-        # Filtrage des fichiers par type
-        request.matched_files = [
-            file for file in request.matched_files 
-            if file[0] in file_types
-        ]
+        # Mesure des profils de transport SFTP: aucun traitement
+        if args.probe_sftp is not None:
+            probe(args, load_profiles(args.sftp_profiles_file), args.probe_sftp, args.probe_rounds)
+            return
         
-        # Traitement des fichiers
-        request.process_files()
+        # Mode multi-sites: un seul processus pour tous les sites configurés
+        if args.sites_config:
+            run_sites(args)
+            return
         
-        # Envoi de l'email si demandé et si des données ont été traitées
-        if request.args.send_email and request.stats['total_lines'] > 0:
-            logger.info("\n" + "="*80)
-            logger.info("📧 ENVOI DU RAPPORT PAR EMAIL")
-            logger.info("="*80)
-            
-            try:
-                email_sender = EmailSender()
-                stats_for_email = request.get_email_stats()
-                
-                if email_sender.send_report(request.args.output, stats_for_email):
-                    email_sent = True
-                    logger.info("✅ Rapport envoyé par email avec succès")
-                else:
-                    logger.warning("⚠️  L'email n'a pas pu être envoyé")
-                    
-            except ValueError as e:
-                logger.error(f"❌ Configuration email invalide: {e}")
-            except Exception as e:
-                logger.error(f"❌ Erreur lors de l'envoi de l'email: {e}")
-            
-            logger.info("="*80 + "\n")
-        elif request.args.send_email and request.stats['total_lines'] == 0:
-            logger.info("\n⚠️  Aucune donnée à envoyer par email")
+        request = UsrRequest(args)
+        
+        # Mode veille: processus permanent, pas de sortie après traitement
+        if request.args.daemon:
+            request.run_daemon()
+            return
+        
+        email_sent = run_once(request)
         
         # Calcul du temps d'exécution
         end_time = datetime.now()
@@ -504,10 +1833,10 @@ def main():
     finally:
         if request:
             try:
-                request.close_sftp()
+                request.close()
             except Exception as e:
                 logger.error(f"Erreur lors de la fermeture: {e}")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,111 @@
+import json
+import logging
+import os
+from journal import sort_lines
+from journal_diff import reversal
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+# Version du format de fichier (la version 1, {référence: empreinte}, ne conserve pas les écritures)
+INDEX_VERSION = 2
+
+
+class OrderIndex:
+    """
+    Index persistant des commandes déjà journalisées.
+
+    Associe chaque référence de commande (ex: 'Order Name' Shopify) à l'empreinte
+    de ses données au moment de la journalisation, ainsi qu'aux écritures alors
+    générées (pour la contre-passation d'une commande modifiée). Stocké au format JSON.
+    """
+
+    def __init__(self, path):
+        """
+        Charge l'index depuis le disque (index vide si le fichier n'existe pas).
+
+        Args:
+            path: Chemin du fichier JSON de l'index
+        """
+        self.path = path
+        self.orders = {}
+        self.lines = {}
+
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('version') == INDEX_VERSION:
+                    self.orders = data['orders']
+                    self.lines = data['lines']
+                else:
+                    # Ancien format: empreintes seules, écritures des commandes inconnues
+                    self.orders = data
+                logger.info(f"✓ Index des commandes chargé: {len(self.orders)} commande(s) ({path})")
+            except (OSError, ValueError, KeyError, AttributeError) as e:
+                logger.error(f"❌ Index des commandes illisible ({path}), reconstruction complète: {e}")
+                self.orders = {}
+                self.lines = {}
+        else:
+            logger.info(f"Index des commandes absent, création au prochain enregistrement: {path}")
+
+    def get(self, reference):
+        """Retourne l'empreinte enregistrée pour une commande, ou None."""
+        return self.orders.get(reference)
+
+    def modified(self, fingerprints):
+        """
+        Commandes déjà journalisées dont l'empreinte a changé.
+
+        Args:
+            fingerprints: Dictionnaire {référence: empreinte} des commandes évaluées
+
+        Returns:
+            Liste des références modifiées
+        """
+        return [reference for reference, value in fingerprints.items()
+                if self.orders.get(reference) not in (None, value)]
+
+    def reversals(self, references):
+        """
+        Contre-passations des écritures journalisées pour des commandes modifiées.
+
+        Args:
+            references: Références des commandes modifiées
+
+        Returns:
+            Lignes de contre-passation triées par (date, journal)
+        """
+        out_data = []
+        for reference in references:
+            if reference not in self.lines:
+                logger.error(f"❌ Commande {reference} modifiée: écritures précédentes inconnues (index "
+                             f"ancien format), contre-passation manuelle nécessaire")
+                continue
+            out_data.extend(reversal(line) for line in self.lines[reference])
+        if out_data:
+            logger.info(f"🔁 {len(out_data)} écriture(s) contre-passée(s) pour {len(references)} commande(s) modifiée(s)")
+        sort_lines(out_data)
+        return out_data
+
+    def update(self, fingerprints, lines=None):
+        """
+        Enregistre les empreintes des commandes traitées.
+
+        Args:
+            fingerprints: Dictionnaire {référence: empreinte}
+            lines: Dictionnaire {référence: écritures générées} (None: écritures non conservées)
+        """
+        self.orders.update(fingerprints)
+        if lines is not None:
+            for reference in fingerprints:
+                self.lines[reference] = lines.get(reference, [])
+
+    def save(self):
+        """Écrit l'index sur disque de manière atomique (fichier temporaire + rename)."""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': INDEX_VERSION, 'orders': self.orders, 'lines': self.lines},
+                      f, ensure_ascii=False, default=str)
+        os.replace(tmp_path, self.path)
+        logger.info(f"✓ Index des commandes enregistré: {len(self.orders)} commande(s)")
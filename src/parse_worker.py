@@ -0,0 +1,219 @@
+import io
+import time
+import queue
+import importlib
+import logging
+import traceback
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+import excel_reader
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+# Attente maximale de l'arrêt d'un processus de traitement (secondes)
+STOP_TIMEOUT = 5
+
+# Attente maximale du démarrage d'un processus de traitement (imports compris)
+START_TIMEOUT = 120
+
+
+class ParseTimeout(TimeoutError):
+    """Traitement d'un fichier interrompu: délai dépassé."""
+
+
+def portable(file_in_memory):
+    """
+    Copie transmissible à un autre processus d'un fichier téléchargé.
+
+    Args:
+        file_in_memory: Objet fichier binaire (BytesIO ou MappedFile)
+
+    Returns:
+        BytesIO de même contenu, positionné au début
+    """
+    with file_in_memory.getbuffer() as view:
+        return io.BytesIO(view)
+
+
+def _serve(connection, settings, preload):
+    """Boucle du processus de traitement: exécute les appels reçus un par un."""
+    excel_reader.configure(**settings)
+    for module in preload:
+        importlib.import_module(module)
+    connection.send('pret')
+    while True:
+        try:
+            message = connection.recv()
+        except EOFError:
+            return
+        if message is None:
+            return
+        function, args = message
+        try:
+            result = function(*args)
+        except Exception:
+            connection.send(('error', traceback.format_exc(), None))
+            continue
+        # Les arguments sont renvoyés (sans les fichiers): un parseur peut les
+        # mettre à jour, ex: l'index des commandes Shopify déjà journalisées
+        connection.send(('ok', result, [None if isinstance(arg, io.IOBase) else arg for arg in args]))
+
+
+class ParseWorker:
+    """
+    Processus de traitement réutilisable, interrompu (kill) si un appel dépasse
+    son délai, puis relancé au prochain appel.
+
+    Les fonctions appelées et leurs arguments doivent être transmissibles
+    (fonctions de module, BytesIO, objets simples).
+    """
+
+    def __init__(self, preload=(), settings=None):
+        """
+        Args:
+            preload: Modules importés au démarrage du processus, avant le premier
+                délai (ex: parseurs et pandas)
+            settings: Réglages de lecture Excel du processus (excel_reader.make_settings),
+                None pour ceux en vigueur à son démarrage
+        """
+        self.preload = tuple(preload)
+        self.settings = settings
+        self._context = multiprocessing.get_context('spawn')
+        self._process = None
+        self._connection = None
+
+    def _start(self):
+        parent, child = self._context.Pipe()
+        self._process = self._context.Process(
+            target=_serve, args=(child, excel_reader.settings(self.settings), self.preload), name='traitement', daemon=True
+        )
+        self._process.start()
+        child.close()
+        self._connection = parent
+        # Le démarrage (imports) n'est pas décompté du délai des traitements
+        if not parent.poll(START_TIMEOUT):
+            self.kill()
+            raise RuntimeError(f"processus de traitement non démarré après {START_TIMEOUT} s")
+        parent.recv()
+        logger.debug(f"Processus de traitement démarré (pid {self._process.pid})")
+
+    def call(self, timeout, function, *args):
+        """
+        Exécute function(*args) dans le processus de traitement.
+
+        Args:
+            timeout: Délai maximal en secondes (None: sans délai)
+            function: Fonction de module à appeler
+            *args: Arguments de l'appel
+
+        Returns:
+            Tuple (résultat, arguments après l'appel), les fichiers des arguments
+            étant remplacés par None
+
+        Raises:
+            ParseTimeout: Délai dépassé (le processus est arrêté)
+            RuntimeError: Erreur levée par la fonction ou arrêt du processus
+        """
+        if self._process is None or not self._process.is_alive():
+            self._start()
+
+        start = time.monotonic()
+        self._connection.send((function, args))
+        if timeout is not None:
+            remaining = timeout - (time.monotonic() - start)
+            if not self._connection.poll(max(0.0, remaining)):
+                self.kill()
+                raise ParseTimeout(f"traitement interrompu après {timeout:.1f} s")
+
+        try:
+            status, result, args_after = self._connection.recv()
+        except EOFError:
+            self.kill()
+            raise RuntimeError("processus de traitement arrêté de façon inattendue")
+        if status == 'error':
+            raise RuntimeError(f"erreur dans le processus de traitement:\n{result}")
+        return result, args_after
+
+    def kill(self):
+        """Arrête immédiatement le processus de traitement."""
+        if self._process is None:
+            return
+        self._process.kill()
+        self._process.join(STOP_TIMEOUT)
+        self._connection.close()
+        logger.debug(f"Processus de traitement arrêté (pid {self._process.pid})")
+        self._process = None
+        self._connection = None
+
+    def close(self):
+        """Arrête le processus de traitement après son appel en cours."""
+        if self._process is None:
+            return
+        try:
+            self._connection.send(None)
+        except OSError:
+            pass
+        self._process.join(STOP_TIMEOUT)
+        if self._process.is_alive():
+            self._process.kill()
+            self._process.join(STOP_TIMEOUT)
+        self._connection.close()
+        self._process = None
+        self._connection = None
+
+
+class ParsePool:
+    """
+    Groupe de processus de traitement exécutant des appels en parallèle (un
+    fichier ou une plage de lignes par processus), pour utiliser plusieurs cœurs.
+    Chaque appel garde son propre délai.
+    """
+
+    def __init__(self, size, preload=(), settings=None):
+        """
+        Args:
+            size: Nombre de processus
+            preload: Modules importés au démarrage de chaque processus
+            settings: Réglages de lecture Excel des processus (excel_reader.make_settings)
+        """
+        self.size = size
+        self._workers = [ParseWorker(preload, settings) for _ in range(size)]
+        self._idle = queue.Queue()
+        for worker in self._workers:
+            self._idle.put(worker)
+
+    def _run(self, call):
+        timeout, function, args = call
+        worker = self._idle.get()
+        try:
+            # Délai évalué au démarrage effectif de l'appel (après l'attente d'un processus libre)
+            return worker.call(timeout() if callable(timeout) else timeout, function, *args)
+        except Exception as e:
+            return e
+        finally:
+            self._idle.put(worker)
+
+    def map(self, calls):
+        """
+        Exécute des appels en parallèle.
+
+        Args:
+            calls: Liste de tuples (délai, fonction, arguments); le délai est un nombre
+                de secondes, None, ou une fonction sans argument qui le retourne
+
+        Returns:
+            Liste, dans l'ordre des appels, de tuples (résultat, arguments après
+            l'appel) ou de l'exception levée (ParseTimeout, RuntimeError): l'échec
+            d'un appel n'interrompt pas les autres
+        """
+        if not calls:
+            return []
+        # Un thread par processus: il attend la réponse, le calcul se fait dans le processus
+        with ThreadPoolExecutor(max_workers=min(self.size, len(calls))) as executor:
+            return list(executor.map(self._run, calls))
+
+    def close(self):
+        """Arrête tous les processus du groupe (relancés au prochain appel)."""
+        for worker in self._workers:
+            worker.close()
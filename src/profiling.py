@@ -0,0 +1,128 @@
+import os
+import io
+import re
+import csv
+import time
+import pstats
+import cProfile
+import logging
+import tracemalloc
+import contextlib
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+# Nombre de fonctions listées dans le rapport CPU (tri par temps cumulé)
+PROFILE_TOP = 30
+
+# Nombre de sites d'allocation listés dans le rapport mémoire
+ALLOCATION_TOP = 10
+
+# Profondeur de pile enregistrée par allocation
+TRACE_FRAMES = 5
+
+SUMMARY_HEADER = ["Ordre", "Fichier", "Fonction", "Durée (s)", "Pic mémoire (Mo)", "Rapport"]
+
+
+def profile_dir(output_path):
+    """Répertoire des artefacts de profilage associé au fichier de sortie."""
+    root, ext = os.path.splitext(output_path)
+    return f"{root}_profil"
+
+
+class Profiler:
+    """
+    Profilage à la demande des appels de parseurs: profil CPU (cProfile) et
+    pic mémoire / principaux sites d'allocation (tracemalloc), écrits dans
+    '<sortie>_profil/'.
+    """
+
+    def __init__(self, output_path):
+        """
+        Args:
+            output_path: Fichier de sortie CSV (les artefacts sont placés à côté)
+        """
+        self.directory = profile_dir(output_path)
+        os.makedirs(self.directory, exist_ok=True)
+
+        # Les artefacts d'une exécution précédente sont remplacés
+        for name in os.listdir(self.directory):
+            if name.endswith(('.prof', '.txt')) or name == 'resume.csv':
+                os.remove(os.path.join(self.directory, name))
+
+        self.entries = []
+
+    @contextlib.contextmanager
+    def profile(self, label, function_name):
+        """
+        Profile le bloc d'instructions (un appel de parseur).
+
+        Args:
+            label: Fichier traité (nom des artefacts)
+            function_name: Parseur appelé (clorian, shopify, st, treat_skidata_file...)
+        """
+        order = len(self.entries) + 1
+        base = os.path.join(self.directory, f"{order:02d}_{re.sub(r'[^A-Za-z0-9_.-]', '_', label)}")
+
+        was_tracing = tracemalloc.is_tracing()
+        if not was_tracing:
+            tracemalloc.start(TRACE_FRAMES)
+        tracemalloc.reset_peak()
+        profiler = cProfile.Profile()
+
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            snapshot = tracemalloc.take_snapshot()
+            if not was_tracing:
+                tracemalloc.stop()
+
+            try:
+                self._write_report(base, label, function_name, profiler, elapsed, peak, snapshot)
+                self.entries.append([order, label, function_name, f"{elapsed:.3f}",
+                                     f"{peak / 1024 / 1024:.2f}", os.path.basename(base) + '.txt'])
+                self._write_summary()
+                logger.info(f"🔬 Profil {function_name}({label}): {elapsed:.2f} s, "
+                            f"pic mémoire {peak / 1024 / 1024:.2f} Mo → {base}.txt")
+            except OSError as e:
+                logger.error(f"❌ Écriture du profil impossible ({base}): {e}")
+
+    def _write_report(self, base, label, function_name, profiler, elapsed, peak, snapshot):
+        """Écrit le profil binaire (.prof, lisible par pstats/snakeviz) et le rapport texte."""
+        profiler.dump_stats(f"{base}.prof")
+
+        cpu = io.StringIO()
+        pstats.Stats(profiler, stream=cpu).strip_dirs().sort_stats('cumulative').print_stats(PROFILE_TOP)
+
+        snapshot = snapshot.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+        ])
+
+        with open(f"{base}.txt", 'w', encoding='utf-8') as report:
+            report.write(f"Fichier: {label}\n")
+            report.write(f"Fonction: {function_name}\n")
+            report.write(f"Durée: {elapsed:.3f} s\n")
+            report.write(f"Pic mémoire: {peak / 1024 / 1024:.2f} Mo\n\n")
+
+            report.write(f"=== Principaux sites d'allocation (mémoire encore allouée en fin d'appel) ===\n")
+            for stat in snapshot.statistics('traceback')[:ALLOCATION_TOP]:
+                report.write(f"{stat.size / 1024:.1f} Ko en {stat.count} bloc(s)\n")
+                for line in stat.traceback.format(most_recent_first=True):
+                    report.write(f"    {line}\n")
+
+            report.write(f"\n=== Profil CPU ({PROFILE_TOP} premières fonctions, temps cumulé) ===\n")
+            report.write(cpu.getvalue())
+
+    def _write_summary(self):
+        """Réécrit la synthèse de tous les appels profilés."""
+        with open(os.path.join(self.directory, 'resume.csv'), 'w', newline='', encoding='utf-8') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(SUMMARY_HEADER)
+            writer.writerows(self.entries)
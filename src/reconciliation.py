@@ -0,0 +1,279 @@
+import os
+import csv
+import bisect
+import logging
+from collections import namedtuple, defaultdict, deque
+from datetime import date
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+# Transaction à rapprocher: montant en centimes pour des comparaisons exactes
+Record = namedtuple('Record', ['source', 'date', 'cents', 'reference'])
+
+# Résultat d'un rapprochement: record_b est None pour un élément non rapproché
+Match = namedtuple('Match', ['status', 'record_a', 'record_b'])
+
+# Statuts de rapprochement
+MATCHED = 'rapproché'
+MISMATCHED = 'écart'
+UNMATCHED = 'non rapproché'
+
+# Index des colonnes d'une ligne comptable
+COL_JOURNAL, COL_DATE, COL_ACCOUNT, COL_LABEL = 0, 1, 3, 5
+COL_DEBIT, COL_REFERENCE = 7, 15
+
+RECONCILIATION_HEADER = [
+    "Rapprochement", "Statut",
+    "Source A", "Date A", "Montant A", "Référence A",
+    "Source B", "Date B", "Montant B", "Référence B",
+    "Écart"
+]
+
+
+def _parse_date(value):
+    """Convertit une date jj/mm/aaaa en date (None si invalide)."""
+    try:
+        return date(int(value[6:10]), int(value[3:5]), int(value[0:2]))
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_cents(value):
+    """Convertit un montant en centimes (None si vide ou invalide)."""
+    try:
+        return int(round(float(value) * 100))
+    except (TypeError, ValueError):
+        return None
+
+
+def extract_records(lines, source):
+    """
+    Extrait les transactions à rapprocher des lignes comptables détaillées d'une source.
+
+    - stripe: lignes B5 411SAP (une par paiement, référence = email client)
+    - shopify: lignes 411SHOPI (une par commande, référence = Order Name)
+    - clorian_tpe: lignes 467300 'CB TPE Virtuel' (un total par jour)
+
+    Args:
+        lines: Lignes comptables détaillées (avant agrégation)
+        source: 'stripe', 'shopify' ou 'clorian_tpe'
+
+    Returns:
+        Liste de Record
+    """
+    records = []
+    for line in lines:
+        if source == 'stripe':
+            keep = line[COL_JOURNAL] == 'B5' and line[COL_ACCOUNT] == '411SAP'
+            reference = line[COL_LABEL]
+        elif source == 'shopify':
+            keep = line[COL_ACCOUNT] == '411SHOPI'
+            reference = line[COL_REFERENCE]
+        elif source == 'clorian_tpe':
+            keep = line[COL_ACCOUNT] == 467300 and str(line[COL_LABEL]).endswith('TPE Virtuel')
+            reference = line[COL_LABEL]
+        else:
+            raise ValueError(f"Source de rapprochement inconnue: {source}")
+
+        if not keep:
+            continue
+
+        record_date = _parse_date(line[COL_DATE])
+        cents = _to_cents(line[COL_DEBIT])
+        if record_date is None or cents is None:
+            continue
+        records.append(Record(source, record_date, cents, reference))
+    return records
+
+
+def reconcile_transactions(left, right, date_window_days=1, amount_tolerance_cents=0):
+    """
+    Rapproche deux ensembles de transactions en temps quasi linéaire.
+
+    1. Index de hachage sur (date, montant): appariement exact en O(1) par transaction.
+    2. Sur le reste, un groupe par montant (centimes), trié par date: seuls les
+       groupes dans la tolérance de montant sont consultés, du plus proche au plus
+       éloigné (arrêt dès qu'un groupe plus éloigné ne peut plus faire mieux), avec
+       une recherche dichotomique de la fenêtre de dates dans chacun.
+
+    Args:
+        left: Transactions de référence (ex: commandes Shopify)
+        right: Transactions à rapprocher (ex: paiements Stripe)
+        date_window_days: Écart de dates accepté au second passage
+        amount_tolerance_cents: Écart de montant accepté au second passage (statut 'écart')
+
+    Returns:
+        Liste de Match (rapprochés, écarts, puis non rapprochés des deux côtés)
+    """
+    results = []
+
+    # 1. Appariement exact par index de hachage
+    by_key = defaultdict(deque)
+    for record in right:
+        by_key[(record.date, record.cents)].append(record)
+
+    remaining_left = []
+    for record in left:
+        candidates = by_key.get((record.date, record.cents))
+        if candidates:
+            results.append(Match(MATCHED, record, candidates.popleft()))
+        else:
+            remaining_left.append(record)
+
+    # 2. Transactions restantes groupées par montant, triées par date dans chaque groupe
+    remaining_right = sorted(
+        (r for candidates in by_key.values() for r in candidates),
+        key=lambda r: (r.cents, r.date.toordinal())
+    )
+    buckets = {}  # centimes -> (dates ordinales triées, positions dans remaining_right)
+    for position, candidate in enumerate(remaining_right):
+        ordinals, positions = buckets.setdefault(candidate.cents, ([], []))
+        ordinals.append(candidate.date.toordinal())
+        positions.append(position)
+    amounts = sorted(buckets)
+    used = [False] * len(remaining_right)
+
+    unmatched_left = []
+    for record in remaining_left:
+        ordinal = record.date.toordinal()
+        first = bisect.bisect_left(amounts, record.cents - amount_tolerance_cents)
+        last = bisect.bisect_right(amounts, record.cents + amount_tolerance_cents)
+        below = bisect.bisect_left(amounts, record.cents) - 1
+        above = below + 1
+
+        best = None
+        while below >= first or above < last:
+            # Groupe suivant par écart de montant croissant (le montant inférieur d'abord à égalité)
+            if above >= last or (below >= first and record.cents - amounts[below] <= amounts[above] - record.cents):
+                cents = amounts[below]
+                below -= 1
+            else:
+                cents = amounts[above]
+                above += 1
+            if best is not None and abs(cents - record.cents) > best[0][0]:
+                break
+            ordinals, positions = buckets[cents]
+            start = bisect.bisect_left(ordinals, ordinal - date_window_days)
+            end = bisect.bisect_right(ordinals, ordinal + date_window_days)
+            for index in range(start, end):
+                if used[positions[index]]:
+                    continue
+                score = (abs(cents - record.cents), abs(ordinals[index] - ordinal))
+                if best is None or score < best[0]:
+                    best = (score, positions[index])
+
+        if best is None:
+            unmatched_left.append(record)
+            continue
+
+        used[best[1]] = True
+        candidate = remaining_right[best[1]]
+        status = MATCHED if candidate.cents == record.cents else MISMATCHED
+        results.append(Match(status, record, candidate))
+
+    results.extend(Match(UNMATCHED, record, None) for record in unmatched_left)
+    results.extend(Match(UNMATCHED, record, None)
+                   for position, record in enumerate(remaining_right) if not used[position])
+    return results
+
+
+def reconcile_daily_totals(left, right, amount_tolerance_cents=1):
+    """
+    Rapproche les totaux journaliers de deux sources (ex: Stripe / Clorian TPE Virtuel).
+
+    Args:
+        left: Transactions de la première source
+        right: Transactions de la seconde source
+        amount_tolerance_cents: Écart toléré entre les deux totaux
+
+    Returns:
+        Liste de Match dont les Record portent les totaux par date
+    """
+    def totals(records):
+        by_date = {}
+        for record in records:
+            by_date[record.date] = by_date.get(record.date, 0) + record.cents
+        return by_date
+
+    left_totals = totals(left)
+    right_totals = totals(right)
+    left_source = left[0].source if left else 'A'
+    right_source = right[0].source if right else 'B'
+
+    results = []
+    for day in sorted(set(left_totals) | set(right_totals)):
+        record_a = Record(left_source, day, left_totals[day], 'total jour') if day in left_totals else None
+        record_b = Record(right_source, day, right_totals[day], 'total jour') if day in right_totals else None
+
+        if record_a is None or record_b is None:
+            results.append(Match(UNMATCHED, record_a or record_b, None))
+        elif abs(record_a.cents - record_b.cents) <= amount_tolerance_cents:
+            results.append(Match(MATCHED, record_a, record_b))
+        else:
+            results.append(Match(MISMATCHED, record_a, record_b))
+    return results
+
+
+def reconcile(lines_by_source, date_window_days=1, amount_tolerance_cents=0, daily_tolerance_cents=1):
+    """
+    Exécute tous les rapprochements inter-sources disponibles.
+
+    Args:
+        lines_by_source: Dictionnaire {type de fichier: lignes comptables détaillées}
+        date_window_days: Écart de dates accepté pour les transactions
+        amount_tolerance_cents: Écart de montant accepté pour les transactions
+        daily_tolerance_cents: Écart accepté entre deux totaux journaliers (arrondis)
+
+    Returns:
+        Dictionnaire {nom du rapprochement: liste de Match}
+    """
+    stripe = extract_records(lines_by_source.get('stripe', []), 'stripe')
+    shopify = extract_records(lines_by_source.get('shopify', []), 'shopify')
+    clorian_tpe = extract_records(lines_by_source.get('clorian', []), 'clorian_tpe')
+
+    reports = {}
+    if stripe or clorian_tpe:
+        reports['Stripe / Clorian TPE Virtuel'] = reconcile_daily_totals(stripe, clorian_tpe, daily_tolerance_cents)
+    if shopify:
+        reports['Shopify / paiements Stripe'] = reconcile_transactions(
+            shopify, stripe, date_window_days, amount_tolerance_cents
+        )
+
+    for name, matches in reports.items():
+        counts = defaultdict(int)
+        for match in matches:
+            counts[match.status] += 1
+        logger.info(f"Rapprochement {name}: {counts[MATCHED]} rapproché(s), "
+                    f"{counts[MISMATCHED]} écart(s), {counts[UNMATCHED]} non rapproché(s)")
+    return reports
+
+
+def reconciliation_path(output_path):
+    """Chemin du rapport de rapprochement associé au fichier de sortie."""
+    root, ext = os.path.splitext(output_path)
+    return f"{root}_rapprochement{ext or '.csv'}"
+
+
+def write_report(reports, path):
+    """
+    Écrit le rapport de rapprochement au format CSV.
+
+    Args:
+        reports: Résultat de reconcile()
+        path: Chemin du fichier CSV
+    """
+    def columns(record):
+        if record is None:
+            return ["", "", "", ""]
+        return [record.source, record.date.strftime('%d/%m/%Y'), f"{record.cents / 100:.2f}", record.reference]
+
+    with open(path, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(RECONCILIATION_HEADER)
+        for name, matches in reports.items():
+            for match in matches:
+                gap = ""
+                if match.record_b is not None:
+                    gap = f"{(match.record_a.cents - match.record_b.cents) / 100:.2f}"
+                writer.writerow([name, match.status] + columns(match.record_a) + columns(match.record_b) + [gap])
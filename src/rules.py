@@ -0,0 +1,219 @@
+import os
+import csv
+import logging
+from functools import lru_cache
+import numpy as np
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+# Répertoire des tables de règles comptables (surchargeable pour un autre plan comptable)
+RULES_DIR = os.getenv('RULES_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rules'))
+
+# Joker: la condition est satisfaite quelle que soit la valeur
+ANY = '*'
+
+# Sens d'une écriture
+SIDES = ['debit', 'credit']
+
+
+def _read_table(name, rules_dir=None):
+    """
+    Lit une table de règles CSV.
+
+    Args:
+        name: Nom de la table (sans extension)
+        rules_dir: Répertoire des tables (défaut RULES_DIR)
+
+    Returns:
+        Liste de dictionnaires, une entrée par ligne de la table
+    """
+    path = os.path.join(rules_dir or RULES_DIR, f"{name}.csv")
+    with open(path, newline='', encoding='utf-8') as csvfile:
+        rows = [{key: (value or '').strip() for key, value in row.items()} for row in csv.DictReader(csvfile)]
+    logger.debug(f"Table de règles {path}: {len(rows)} règle(s)")
+    return rows
+
+
+def _account(value):
+    """Numéro de compte: entier s'il est numérique (ex: 707101), chaîne sinon (ex: 411SHOPI)."""
+    return int(value) if value.isdigit() else value
+
+
+def _side(value, table):
+    if value not in SIDES:
+        raise ValueError(f"Table {table}: sens '{value}' invalide (attendu: {', '.join(SIDES)})")
+    return value
+
+
+def _values(value):
+    """Ensemble de valeurs acceptées ('11|12'), None pour le joker."""
+    if value == ANY:
+        return None
+    return {part.strip() for part in value.split('|') if part.strip()}
+
+
+class ShopifyRules:
+    """
+    Règles Shopify compilées: zone géographique par pays, puis modèle d'écritures
+    par (zone, présence d'une note de TVA).
+    """
+
+    def __init__(self, countries, lines):
+        """
+        Args:
+            countries: Lignes de la table pays (pays, zone)
+            lines: Lignes de la table shopify (zone, note, categorie, compte, analytique, sens, montant)
+        """
+        self.zones = {row['pays']: row['zone'] for row in countries if row['pays'] != ANY}
+        defaults = [row['zone'] for row in countries if row['pays'] == ANY]
+        self.default_zone = defaults[0] if defaults else None
+
+        zones = sorted(set(self.zones.values()) | set(defaults))
+        self.templates = {}
+        self.categories = {}
+        for zone in zones:
+            for has_note in (True, False):
+                note = 'oui' if has_note else 'non'
+                template = []
+                for row in lines:
+                    if row['zone'] not in (zone, ANY) or row['note'] not in (note, ANY):
+                        continue
+                    template.append((
+                        _account(row['compte']), row['analytique'] or None,
+                        _side(row['sens'], 'shopify'), row['montant']
+                    ))
+                    if row['categorie']:
+                        self.categories.setdefault((zone, has_note), row['categorie'])
+                self.templates[(zone, has_note)] = template
+
+        self.amount_columns = sorted({row['montant'] for row in lines})
+        self.category_order = list(dict.fromkeys(row['categorie'] for row in lines if row['categorie']))
+
+        # Catégorie de vente d'un compte, pour les seuls comptes propres à une catégorie
+        # (ex: 707101 -> France; 708500, commun à deux catégories, n'en détermine aucune)
+        categories_by_account = {}
+        for row in lines:
+            if row['categorie']:
+                categories_by_account.setdefault(_account(row['compte']), set()).add(row['categorie'])
+        self.account_categories = {account: next(iter(categories))
+                                   for account, categories in categories_by_account.items()
+                                   if len(categories) == 1}
+
+    def zone_of(self, countries):
+        """
+        Zone de chaque pays (table de hachage appliquée à toute la colonne).
+
+        Args:
+            countries: Series des pays de livraison
+
+        Returns:
+            Series des zones
+        """
+        zones = countries.map(self.zones)
+        if self.default_zone is not None:
+            zones = zones.fillna(self.default_zone)
+        return zones
+
+
+class SkidataRules:
+    """
+    Règles Skidata compilées: une condition vectorisée (code produit, type de
+    paiement) par compte de caisse, évaluée par ordre de priorité.
+    """
+
+    def __init__(self, lines):
+        """
+        Args:
+            lines: Lignes de la table skidata (compte, libelle, code_produit, type_paiement,
+                priorite, montant, sens), dans l'ordre des écritures générées
+        """
+        self.entries = []
+        self.buckets = []
+        for row in lines:
+            entry = {
+                'account': _account(row['compte']),
+                'label': row['libelle'],
+                'amount': row['montant'],
+                'side': _side(row['sens'], 'skidata'),
+            }
+            self.entries.append(entry)
+            if row['priorite']:
+                self.buckets.append((int(row['priorite']), len(self.entries) - 1,
+                                     _values(row['code_produit']), _values(row['type_paiement'])))
+        # La première règle satisfaite l'emporte
+        self.buckets.sort(key=lambda bucket: bucket[0])
+
+    def classify(self, product_codes, payment_types):
+        """
+        Affecte chaque ligne à une écriture de la table.
+
+        Args:
+            product_codes: Series des codes produit (colonne A)
+            payment_types: Series des types de paiement (colonne B)
+
+        Returns:
+            Tableau numpy des indices d'écriture (-1 si aucune règle ne s'applique)
+        """
+        conditions = []
+        for _, _, codes, types in self.buckets:
+            condition = np.ones(len(product_codes), dtype=bool)
+            if codes is not None:
+                condition &= product_codes.isin(codes).to_numpy()
+            if types is not None:
+                condition &= payment_types.isin(types).to_numpy()
+            conditions.append(condition)
+        choices = [index for _, index, _, _ in self.buckets]
+        return np.select(conditions, choices, default=-1)
+
+
+@lru_cache(maxsize=None)
+def shopify_rules(rules_dir=None):
+    """Règles Shopify compilées (chargées une seule fois)."""
+    return ShopifyRules(_read_table('pays', rules_dir), _read_table('shopify', rules_dir))
+
+
+@lru_cache(maxsize=None)
+def skidata_rules(rules_dir=None):
+    """Règles Skidata compilées (chargées une seule fois)."""
+    return SkidataRules(_read_table('skidata', rules_dir))
+
+
+@lru_cache(maxsize=None)
+def clorian_payment_methods(rules_dir=None):
+    """
+    Méthodes de paiement Clorian à journaliser.
+
+    Returns:
+        Dictionnaire {méthode: {'account', 'label'}} dans l'ordre de la table
+    """
+    return {
+        row['methode']: {'account': _account(row['compte']), 'label': row['libelle']}
+        for row in _read_table('clorian', rules_dir)
+    }
+
+
+# Écritures complémentaires Clorian: CA HT et TVA (ligne 'Total'), remise des espèces
+CLORIAN_COMPLEMENTS = ['ht', 'tva', 'especes_remise', 'especes_caisse']
+
+
+@lru_cache(maxsize=None)
+def clorian_complements(rules_dir=None):
+    """
+    Écritures complémentaires Clorian.
+
+    Returns:
+        Dictionnaire {ligne: {'account', 'analytic', 'label', 'side'}}
+
+    Raises:
+        ValueError: Écriture manquante ou sens invalide dans la table
+    """
+    complements = {
+        row['ligne']: {'account': _account(row['compte']), 'analytic': row['analytique'] or None,
+                       'label': row['libelle'], 'side': _side(row['sens'], 'clorian_complements')}
+        for row in _read_table('clorian_complements', rules_dir)
+    }
+    missing = [name for name in CLORIAN_COMPLEMENTS if name not in complements]
+    if missing:
+        raise ValueError(f"Table clorian_complements: écriture(s) manquante(s): {', '.join(missing)}")
+    return complements
@@ -0,0 +1,275 @@
+import os
+import re
+import sqlite3
+import logging
+import zipfile
+import statistics
+from datetime import datetime
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+# Nombre minimal d'exécutions précédentes pour établir une référence
+MIN_BASELINE_RUNS = 3
+
+# Durée en deçà de laquelle une étape n'est jamais signalée (bruit de mesure)
+MIN_STAGE_SECONDS = 0.5
+
+# Dimension déclarée en tête d'une feuille xlsx (ex: <dimension ref="A1:V1234"/>)
+DIMENSION_REGEX = re.compile(rb'<dimension ref="[A-Z]+\d+(?::[A-Z]+(\d+))?"')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started_at TEXT NOT NULL,
+    output TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    files INTEGER NOT NULL,
+    lines INTEGER NOT NULL,
+    errors INTEGER NOT NULL,
+    bytes INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_by_output ON runs (output, id);
+
+CREATE TABLE IF NOT EXISTS source_stats (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    source TEXT NOT NULL,
+    files INTEGER NOT NULL,
+    rows INTEGER NOT NULL,
+    lines INTEGER NOT NULL,
+    bytes INTEGER NOT NULL,
+    errors INTEGER NOT NULL,
+    PRIMARY KEY (run_id, source)
+);
+
+CREATE TABLE IF NOT EXISTS stage_durations (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    stage TEXT NOT NULL,
+    seconds REAL NOT NULL,
+    PRIMARY KEY (run_id, stage)
+);
+"""
+
+
+def count_rows(file_obj, filename):
+    """
+    Compte les lignes d'un classeur xlsx sans le parser, d'après la dimension
+    déclarée en tête de chaque feuille (sans lire les cellules).
+
+    Les lignes des fichiers CSV / JSONL sont comptées par leur parseur, qui les
+    lit de toute façon: aucune lecture supplémentaire n'est faite ici.
+
+    Le curseur du fichier est remis au début.
+
+    Args:
+        file_obj: Objet fichier binaire (BytesIO ou MappedFile)
+        filename: Nom du fichier (pour l'extension)
+
+    Returns:
+        Nombre de lignes, 0 si indéterminable (ex: ancien format xls) ou hors xlsx
+    """
+    rows = 0
+    try:
+        file_obj.seek(0)
+        if os.path.splitext(filename)[1].lower() != '.xlsx':
+            return rows
+        with zipfile.ZipFile(file_obj) as archive:
+            for name in archive.namelist():
+                if not (name.startswith('xl/worksheets/') and name.endswith('.xml')):
+                    continue
+                with archive.open(name) as sheet:
+                    match = DIMENSION_REGEX.search(sheet.read(2048))
+                if match:
+                    rows += int(match.group(1) or 1)
+    except (OSError, zipfile.BadZipFile, ValueError) as e:
+        logger.debug(f"Comptage des lignes impossible pour {filename}: {e}")
+        rows = 0
+    finally:
+        file_obj.seek(0)
+    return rows
+
+
+class RunHistory:
+    """
+    Historique des exécutions (base SQLite locale): volumes par source et
+    durées par étape, pour suivre les tendances et détecter les régressions.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path: Chemin de la base SQLite (créée si absente)
+        """
+        self.path = path
+        self.connection = sqlite3.connect(path, timeout=30)
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def record(self, output, stats, timings, sources, mode='run', started_at=None):
+        """
+        Enregistre une exécution.
+
+        Args:
+            output: Fichier de sortie (identifie le site / la configuration)
+            stats: Statistiques UsrRequest.stats
+            timings: Durées par étape en secondes
+            sources: Types de fichiers à enregistrer
+            mode: 'run' ou 'veille'
+            started_at: Date de début (défaut: maintenant)
+
+        Returns:
+            Identifiant de l'exécution
+        """
+        started_at = started_at or datetime.now()
+        with self.connection:
+            cursor = self.connection.execute(
+                "INSERT INTO runs (started_at, output, mode, files, lines, errors, bytes) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (started_at.isoformat(timespec='seconds'), output, mode, stats['total_files'],
+                 stats['total_lines'], stats['total_errors'], sum(stats[s]['bytes'] for s in sources))
+            )
+            run_id = cursor.lastrowid
+            self.connection.executemany(
+                "INSERT INTO source_stats (run_id, source, files, rows, lines, bytes, errors) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(run_id, source, stats[source]['files'], stats[source]['rows'], stats[source]['lines'],
+                  stats[source]['bytes'], stats[source]['errors']) for source in sources]
+            )
+            self.connection.executemany(
+                "INSERT INTO stage_durations (run_id, stage, seconds) VALUES (?, ?, ?)",
+                [(run_id, stage, seconds) for stage, seconds in sorted(timings.items())]
+            )
+        logger.debug(f"Exécution {run_id} enregistrée dans l'historique {self.path}")
+        return run_id
+
+    def baselines(self, output, window, mode='run'):
+        """
+        Référence glissante de chaque étape: médiane des dernières exécutions
+        du même mode (un cycle de veille ne traite que les fichiers nouveaux et
+        n'est pas comparable à une exécution complète).
+
+        Args:
+            output: Fichier de sortie (site)
+            window: Nombre d'exécutions précédentes considérées
+            mode: 'run' ou 'veille'
+
+        Returns:
+            Dictionnaire {étape: (médiane en secondes, nombre d'exécutions)}
+        """
+        rows = self.connection.execute(
+            "SELECT stage, seconds FROM stage_durations WHERE run_id IN "
+            "(SELECT id FROM runs WHERE output = ? AND mode = ? ORDER BY id DESC LIMIT ?)",
+            (output, mode, window)
+        ).fetchall()
+        by_stage = {}
+        for stage, seconds in rows:
+            by_stage.setdefault(stage, []).append(seconds)
+        return {stage: (statistics.median(values), len(values)) for stage, values in by_stage.items()}
+
+    def check_regressions(self, output, timings, window, factor, mode='run'):
+        """
+        Compare les durées d'une exécution à leur référence glissante.
+
+        Args:
+            output: Fichier de sortie (site)
+            timings: Durées par étape de l'exécution courante
+            window: Nombre d'exécutions précédentes formant la référence
+            factor: Rapport durée / médiane au-delà duquel l'étape est signalée
+            mode: 'run' ou 'veille' (référence calculée sur les exécutions du même mode)
+
+        Returns:
+            Liste des alertes (messages)
+        """
+        alerts = []
+        baselines = self.baselines(output, window, mode)
+        for stage, seconds in sorted(timings.items()):
+            if stage not in baselines or seconds < MIN_STAGE_SECONDS:
+                continue
+            median, count = baselines[stage]
+            if count < MIN_BASELINE_RUNS or median <= 0:
+                continue
+            if seconds > median * factor:
+                alerts.append(f"Étape '{stage}': {seconds:.2f} s, soit {seconds / median:.1f}× la médiane "
+                              f"des {count} dernière(s) exécution(s) ({median:.2f} s)")
+        return alerts
+
+    def recent_runs(self, limit):
+        """
+        Dernières exécutions, avec leurs volumes par source et durées par étape.
+
+        Args:
+            limit: Nombre d'exécutions par fichier de sortie
+
+        Returns:
+            Dictionnaire {sortie: liste de dictionnaires, de la plus ancienne à la plus récente}
+        """
+        runs = self.connection.execute(
+            "SELECT id, started_at, output, mode, files, lines, errors, bytes FROM runs r WHERE id IN "
+            "(SELECT id FROM runs WHERE output = r.output ORDER BY id DESC LIMIT ?) ORDER BY output, id",
+            (limit,)
+        ).fetchall()
+
+        by_output = {}
+        for run_id, started_at, output, mode, files, lines, errors, size in runs:
+            stages = dict(self.connection.execute(
+                "SELECT stage, seconds FROM stage_durations WHERE run_id = ?", (run_id,)
+            ).fetchall())
+            sources = {source: {'rows': rows, 'bytes': source_bytes} for source, rows, source_bytes in
+                       self.connection.execute(
+                           "SELECT source, rows, bytes FROM source_stats WHERE run_id = ?", (run_id,)
+                       ).fetchall()}
+            by_output.setdefault(output, []).append({
+                'id': run_id, 'started_at': started_at, 'mode': mode, 'files': files, 'lines': lines,
+                'errors': errors, 'bytes': size, 'stages': stages, 'sources': sources,
+            })
+        return by_output
+
+
+def print_history(path, limit=20):
+    """
+    Affiche les tendances de l'historique des exécutions (commande 'history').
+
+    Args:
+        path: Chemin de la base SQLite
+        limit: Nombre d'exécutions affichées par fichier de sortie
+    """
+    if not os.path.exists(path):
+        print(f"Aucun historique: {path} introuvable")
+        return
+
+    history = RunHistory(path)
+    try:
+        by_output = history.recent_runs(limit)
+    finally:
+        history.close()
+
+    if not by_output:
+        print(f"Historique vide: {path}")
+        return
+
+    stages = ['connexion', 'telechargement', 'traitement', 'sauvegarde', 'rapprochement', 'total']
+    for output, runs in by_output.items():
+        print(f"\n=== {output} ({len(runs)} dernière(s) exécution(s)) ===")
+        header = f"{'Date':<20} {'Mode':<7} {'Fichiers':>8} {'Lignes':>8} {'Erreurs':>7} {'Ko':>9} {'Lignes in':>9}"
+        print(header + ''.join(f" {stage:>14}" for stage in stages))
+        for run in runs:
+            rows = sum(source['rows'] for source in run['sources'].values())
+            line = (f"{run['started_at']:<20} {run['mode']:<7} {run['files']:>8} {run['lines']:>8} "
+                    f"{run['errors']:>7} {run['bytes'] / 1024:>9.1f} {rows:>9}")
+            print(line + ''.join(
+                f" {run['stages'][stage]:>14.2f}" if stage in run['stages'] else f" {'-':>14}" for stage in stages
+            ))
+
+        # Tendance: médiane de la première moitié contre la seconde moitié de la fenêtre
+        if len(runs) >= 2 * MIN_BASELINE_RUNS:
+            half = len(runs) // 2
+            print("Tendance (médiane récente / médiane ancienne):")
+            for stage in stages + ['bytes']:
+                values = [run['bytes'] if stage == 'bytes' else run['stages'].get(stage) for run in runs]
+                older = [v for v in values[:half] if v is not None]
+                recent = [v for v in values[half:] if v is not None]
+                if older and recent and statistics.median(older) > 0:
+                    ratio = statistics.median(recent) / statistics.median(older)
+                    print(f"  {stage:<15} ×{ratio:.2f}")
@@ -0,0 +1,209 @@
+import time
+import stat
+import logging
+import configparser
+import paramiko
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+# Options d'un profil de transport SFTP
+PROFILE_OPTIONS = ['port', 'ciphers', 'compression', 'window_size', 'max_packet_size']
+
+# Profils prédéfinis (surchargeables par un fichier INI)
+# - defaut: réglages paramiko (fenêtre 2 Mo, paquets 32 Ko, sans compression)
+# - wan_compresse: compression zlib, pour les CSV sur un lien lent
+# - wan_large: grande fenêtre, pour un lien à forte latence (produit débit × délai élevé)
+# - lan_rapide: chiffrement AES-GCM en priorité (moins coûteux en CPU), grande fenêtre
+PROFILES = {
+    'defaut': {},
+    'wan_compresse': {'compression': True},
+    'wan_large': {'window_size': 16 * 1024 * 1024},
+    'lan_rapide': {
+        'ciphers': ['aes128-gcm@openssh.com', 'aes256-gcm@openssh.com', 'aes128-ctr'],
+        'window_size': 16 * 1024 * 1024,
+        'max_packet_size': 64 * 1024,
+    },
+}
+
+# Taille des blocs lus pendant un transfert de test
+PROBE_CHUNK_SIZE = 1024 * 1024
+
+
+def load_profiles(path=None):
+    """
+    Profils de transport disponibles: profils prédéfinis et profils du fichier INI.
+
+    Chaque section du fichier décrit un profil (une section portant le nom d'un
+    profil prédéfini le remplace). Exemple:
+
+        [wan_bureau]
+        port = 2222
+        ciphers = aes128-ctr, aes256-ctr
+        compression = oui
+        window_size = 8388608
+        max_packet_size = 32768
+
+    Args:
+        path: Chemin du fichier INI (vide: profils prédéfinis seulement)
+
+    Returns:
+        Dictionnaire {nom: options}
+
+    Raises:
+        FileNotFoundError: Fichier introuvable
+        ValueError: Option inconnue ou valeur invalide
+    """
+    profiles = {name: dict(options) for name, options in PROFILES.items()}
+    if not path:
+        return profiles
+
+    parser = configparser.ConfigParser(interpolation=None)
+    if not parser.read(path, encoding='utf-8'):
+        raise FileNotFoundError(f"Fichier des profils SFTP introuvable: {path}")
+
+    for name in parser.sections():
+        section = parser[name]
+        options = {}
+        for key, raw_value in section.items():
+            if key not in PROFILE_OPTIONS:
+                raise ValueError(f"Option inconnue '{key}' pour le profil SFTP [{name}] "
+                                 f"(attendu: {', '.join(PROFILE_OPTIONS)})")
+            if key == 'ciphers':
+                options[key] = [cipher.strip() for cipher in raw_value.split(',') if cipher.strip()]
+            elif key == 'compression':
+                options[key] = raw_value.strip().lower() in ('1', 'true', 'oui', 'yes', 'on')
+            else:
+                try:
+                    options[key] = int(raw_value)
+                except ValueError:
+                    raise ValueError(f"Valeur entière attendue pour '{key}' du profil SFTP [{name}]: {raw_value}")
+        profiles[name] = options
+    return profiles
+
+
+def open_transport(host, port, username, password, profile=None, keepalive=0):
+    """
+    Ouvre le transport SSH et le client SFTP avec les réglages d'un profil.
+
+    Args:
+        host: Adresse du serveur
+        port: Port par défaut (remplacé par celui du profil s'il en définit un)
+        username: Utilisateur
+        password: Mot de passe
+        profile: Options du profil (load_profiles), None pour les réglages par défaut
+        keepalive: Intervalle keepalive en secondes (0 pour désactiver)
+
+    Returns:
+        Tuple (transport, client SFTP)
+
+    Raises:
+        ValueError: Chiffrement non supporté par paramiko
+    """
+    profile = profile or {}
+    window = {}
+    if profile.get('window_size'):
+        window['window_size'] = profile['window_size']
+    if profile.get('max_packet_size'):
+        window['max_packet_size'] = profile['max_packet_size']
+
+    transport = paramiko.Transport(
+        (host, profile.get('port') or port),
+        **{f"default_{key}": value for key, value in window.items()}
+    )
+    try:
+        if profile.get('ciphers'):
+            # Ordre de préférence proposé au serveur (seuls ces chiffrements sont acceptés)
+            transport.get_security_options().ciphers = tuple(profile['ciphers'])
+        transport.use_compression(bool(profile.get('compression')))
+        if keepalive > 0:
+            transport.set_keepalive(keepalive)
+        transport.connect(username=username, password=password)
+        sftp = paramiko.SFTPClient.from_transport(transport, **window)
+    except Exception:
+        transport.close()
+        raise
+    return transport, sftp
+
+
+def _probe_file(sftp, directories):
+    """Plus gros fichier des répertoires distants (fichier de test par défaut)."""
+    candidates = []
+    for directory in directories:
+        try:
+            for attr in sftp.listdir_attr(directory):
+                if stat.S_ISREG(attr.st_mode or 0):
+                    candidates.append((attr.st_size or 0, f"{directory.rstrip('/')}/{attr.filename}"))
+        except OSError as e:
+            logger.warning(f"⚠️  Répertoire {directory} illisible: {e}")
+    if not candidates:
+        raise FileNotFoundError("aucun fichier distant pour le transfert de test")
+    return max(candidates)[1]
+
+
+def _timed_download(sftp, remote_path):
+    """Télécharge un fichier distant sans le conserver; retourne (octets, secondes)."""
+    start = time.perf_counter()
+    received = 0
+    with sftp.open(remote_path, 'rb') as remote:
+        remote.prefetch(remote.stat().st_size)
+        for data in iter(lambda: remote.read(PROBE_CHUNK_SIZE), b''):
+            received += len(data)
+    return received, time.perf_counter() - start
+
+
+def probe(args, profiles, remote_path='', rounds=1):
+    """
+    Mesure un transfert de test avec chaque profil et recommande le plus rapide.
+
+    Args:
+        args: Arguments de la ligne de commande (serveur, identifiants, répertoires)
+        profiles: Profils à comparer (load_profiles)
+        remote_path: Fichier distant téléchargé (vide: le plus gros fichier des répertoires SFTP)
+        rounds: Nombre de transferts par profil (le meilleur est retenu)
+
+    Returns:
+        Nom du profil le plus rapide, ou None si aucun profil n'a abouti
+    """
+    results = []
+    for name, profile in profiles.items():
+        try:
+            start = time.perf_counter()
+            transport, sftp = open_transport(args.sftp_host, args.sftp_port, args.sftp_user, args.sftp_pass, profile)
+            connect_time = time.perf_counter() - start
+            try:
+                if not remote_path:
+                    remote_path = _probe_file(sftp, [d for d in args.sftp_dir if d])
+                    logger.info(f"Fichier de test: {remote_path}")
+                size, transfer_time = min(
+                    (_timed_download(sftp, remote_path) for _ in range(max(1, rounds))),
+                    key=lambda measure: measure[1]
+                )
+                cipher = transport.remote_cipher
+                compression = transport.remote_compression
+            finally:
+                sftp.close()
+                transport.close()
+            results.append((name, connect_time, transfer_time, size, cipher, compression, ''))
+            logger.info(f"✓ Profil {name}: {size} octets en {transfer_time:.2f} s")
+        except Exception as e:
+            logger.warning(f"⚠️  Profil {name} en échec: {e}")
+            results.append((name, None, None, 0, '', '', str(e)))
+
+    print(f"{'Profil':<16} {'Connexion (s)':>13} {'Transfert (s)':>13} {'Débit (Mo/s)':>12} "
+          f"{'Chiffrement':<24} {'Compression':<18}")
+    for name, connect_time, transfer_time, size, cipher, compression, error in results:
+        if error:
+            print(f"{name:<16} {'échec: ' + error}")
+            continue
+        throughput = size / transfer_time / (1024 * 1024) if transfer_time else 0.0
+        print(f"{name:<16} {connect_time:>13.2f} {transfer_time:>13.2f} {throughput:>12.2f} "
+              f"{cipher:<24} {compression:<18}")
+
+    succeeded = [result for result in results if not result[6]]
+    if not succeeded:
+        print("❌ Aucun profil n'a abouti")
+        return None
+    best = min(succeeded, key=lambda result: result[2])[0]
+    print(f"✅ Profil recommandé pour ce lien: {best} (SFTP_PROFILE={best})")
+    return best
@@ -3,12 +3,22 @@ import io
 import logging
 from datetime import datetime
 import pandas as pd
-from contstants import PAYS_UE, PRINT_ERR
+from contstants import PRINT_ERR
+from excel_reader import read_excel
+from rules import shopify_rules
+from journal import sort_lines, merge_streams
+from ledger import COL_REFERENCE
 
 # Configuration du logging
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+# Colonnes utiles à la génération du journal (les autres ne sont pas chargées en mode incrémental)
+SHOPIFY_COLUMNS = [
+    'Date', 'Total Sales', 'Shipping Country', 'Net Sales',
+    'Shipping', 'Tax', 'Order Name', 'Note'
+]
+
 
 def safe_float(value, default=0.0):
     """
@@ -28,6 +38,20 @@ def safe_float(value, default=0.0):
         return default
 
 
+def to_amounts(values, default=0.0):
+    """
+    Convertit une colonne de montants en float de manière vectorisée.
+    Les valeurs vides valent default; les valeurs non numériques sont signalées puis valent default.
+    """
+    stripped = values.str.strip()
+    amounts = pd.to_numeric(stripped, errors='coerce')
+    invalid = amounts.isna() & stripped.notna() & (stripped != '')
+    if invalid.any():
+        samples = stripped[invalid].unique()[:5].tolist()
+        logger.warning(f"{int(invalid.sum())} valeur(s) non numérique(s) {samples}. Valeur par défaut: {default}")
+    return amounts.fillna(default).astype(float)
+
+
 def date_format(date_str):
     """
     Formate une date en format jj/mm/aaaa.
@@ -57,203 +81,291 @@ def date_format(date_str):
     raise ValueError(f"Format de date non reconnu : {date_str}")
 
 
-def add_montant_ttc(out_data, Date, amount, Reference):
+def _date_or_none(value):
+    """Date au format jj/mm/aaaa, None si elle est invalide."""
+    try:
+        return date_format(value)
+    except ValueError:
+        return None
+
+
+def order_fingerprints(df):
     """
-    Ajoute une ligne de montant TTC dans les données de sortie.
+    Calcule l'empreinte de chaque commande à partir de ses colonnes (calcul vectorisé).
+    
+    Args:
+        df: DataFrame Shopify (une ou plusieurs lignes par 'Order Name')
+    
+    Returns:
+        Tuple (références nettoyées, empreintes) sous forme de Series alignées sur df
     """
-    out_data.append([
-        "VES", Date, None, "411SHOPI", None, "Shopify", Date, amount, None, 
-        "", "", "", "", "", "", Reference, "", "", "", "", ""
-    ])
-    logger.debug(f"  Ligne TTC ajoutée: {amount:.2f}€")
+    names = df['Order Name'].fillna('').astype(str).str.strip()
+    
+    # Ordre des colonnes normalisé pour que l'empreinte ne dépende pas de l'export
+    columns = sorted(df.columns)
+    row_hash = pd.util.hash_pandas_object(df[columns].fillna(''), index=False)
+    fingerprints = row_hash.map('{:016x}'.format)
+    
+    # Commande répartie sur plusieurs lignes: empreinte combinée
+    if not names.is_unique:
+        fingerprints = fingerprints.groupby(names).transform('-'.join)
+    
+    return names, fingerprints
 
 
-def shopify(src) -> list:
+def select_new_orders(df, order_index):
     """
-    Traite un fichier Excel Shopify et génère les écritures comptables.
+    Filtre les commandes déjà journalisées et inchangées.
+    
+    Args:
+        df: DataFrame Shopify à traiter
+        order_index: OrderIndex des commandes déjà journalisées
+    
+    Returns:
+        Tuple (DataFrame des commandes nouvelles ou modifiées, {référence: empreinte})
+    """
+    names, fingerprints = order_fingerprints(df)
+    known = names.map(order_index.orders)
+    
+    is_new = known.isna()
+    is_modified = known.notna() & (known != fingerprints)
+    # Les lignes sans référence ne peuvent pas être indexées: toujours traitées
+    no_reference = names == ''
+    mask = is_new | is_modified | no_reference
+    
+    logger.info(f"Mode incrémental: {int(is_new.sum())} nouvelle(s) commande(s), "
+                f"{int(is_modified.sum())} modifiée(s), {int((~mask).sum())} déjà journalisée(s)")
+    for reference in names[is_modified].unique():
+        logger.warning(f"Commande {reference} modifiée depuis sa journalisation, écritures précédentes "
+                       f"contre-passées et nouvelles écritures générées")
+    
+    indexed = mask & ~no_reference
+    return df[mask], dict(zip(names[indexed], fingerprints[indexed]))
+
+
+def read_export(src, order_index=None):
+    """
+    Lit un export Shopify et sélectionne les lignes à journaliser.
     
     Args:
         src: Chemin du fichier Excel ou objet file-like (BytesIO)
+        order_index: OrderIndex optionnel (mode incrémental)
     
     Returns:
-        Liste des lignes comptables générées
+        Tuple (lignes à journaliser, ligne de total exclue, ou None si le fichier est vide;
+        {référence: empreinte} des commandes sélectionnées; nombre de lignes du fichier)
+    
+    Raises:
+        ValueError: Colonnes requises manquantes
     """
+    # Règles comptables compilées (zones par pays, modèles d'écritures)
+    compiled = shopify_rules()
+    
+    # Lecture du fichier Excel
+    read_kwargs = {'dtype': str}
+    if order_index is not None:
+        # Mode incrémental: seules les colonnes utiles au journal sont chargées
+        read_kwargs['usecols'] = lambda col: col in SHOPIFY_COLUMNS or col in compiled.amount_columns
+    df = read_excel(src, **read_kwargs)
+    logger.info(f"✓ Fichier Excel chargé avec {len(df)} lignes")
+    logger.info(f"✓ Colonnes détectées: {list(df.columns)}")
+    
+    # Vérification des colonnes requises (dont les montants référencés par les règles)
+    required_columns = [
+        'Date', 'Total Sales', 'Shipping Country', 
+        'Net Sales', 'Shipping', 'Tax', 'Order Name'
+    ]
+    required_columns += [col for col in compiled.amount_columns if col not in required_columns]
+    missing_columns = [col for col in required_columns if col not in df.columns]
+    
+    if missing_columns:
+        raise ValueError(f"Colonnes manquantes: {missing_columns}")
+    
+    logger.info(f"✓ Toutes les colonnes requises sont présentes")
+    
+    # Vérification si le DataFrame est vide
+    if df.empty:
+        logger.warning("Le fichier est vide (aucune ligne de données)")
+        return None, {}, 0
+    
+    # Afficher un aperçu des premières lignes
+    logger.info(f"\nAperçu des premières lignes:\n{df.head(3)}")
+    logger.info("="*80)
+    
+    # Exclure la dernière ligne qui peut être un total
+    rows = df.iloc[:-1]
+    fingerprints = {}
+    if order_index is not None:
+        rows, fingerprints = select_new_orders(rows, order_index)
+    return rows, fingerprints, len(df)
+
+
+def journal_rows(rows):
+    """
+    Génère les écritures d'une plage de lignes Shopify. Les lignes sont
+    indépendantes: un export peut être découpé en plages traitées séparément.
+    
+    Args:
+        rows: DataFrame des lignes à journaliser (index d'origine conservé pour les logs)
+    
+    Returns:
+        Tuple (lignes comptables triées par (date, journal), statistiques de la plage)
+    """
+    compiled = shopify_rules()
     out_data = []
     stats = {
-        'total_rows': 0,
         'processed_rows': 0,
         'skipped_rows': 0,
-        'france': 0,
-        'ue_avec_tva': 0,
-        'ue_sans_tva': 0,
-        'hors_ue': 0,
+        'categories': {},
         'errors': 0
     }
+    
+    # Conversion vectorisée des colonnes utiles
+    dates = rows['Date'].map(_date_or_none)
+    amounts = {column: to_amounts(rows[column]) for column in compiled.amount_columns}
+    countries = rows['Shipping Country'].map(lambda value: str(value).strip())
+    references = rows['Order Name'].map(lambda value: str(value).strip())
+    # Toute note (même vide dans Excel) vaut présence de TVA; sans colonne Note, '0' est retenu
+    notes = rows['Note'].map(bool) if 'Note' in rows.columns else pd.Series(True, index=rows.index)
+    
+    # Validation des lignes, dans l'ordre des contrôles historiques
+    invalid_date = dates.isna()
+    non_positive = ~invalid_date & (amounts['Total Sales'] <= 0)
+    no_country = ~invalid_date & ~non_positive & (countries == '')
+    valid = ~(invalid_date | non_positive | no_country)
+    
+    for index in rows.index[invalid_date]:
+        logger.error(f"Ligne {index + 1}: Date invalide '{rows.at[index, 'Date']}'")
+    for index in rows.index[non_positive]:
+        logger.warning(f"Ligne {index + 1}: Montant total <= 0 ({amounts['Total Sales'][index]}), ligne ignorée")
+    for index in rows.index[no_country]:
+        logger.warning(f"Ligne {index + 1}: Pays non spécifié, ligne ignorée")
+    stats['errors'] += int(invalid_date.sum())
+    stats['skipped_rows'] += int((~valid).sum())
+    
+    # Affectation des modèles d'écritures: zone du pays (table de hachage) et note de TVA
+    keys = list(zip(compiled.zone_of(countries[valid]).tolist(), notes[valid].tolist()))
+    values = {column: amount[valid].tolist() for column, amount in amounts.items()}
+    
+    for position, (Date, Reference, key) in enumerate(zip(dates[valid].tolist(), references[valid].tolist(), keys)):
+        for account, analytic, side, column in compiled.templates[key]:
+            amount = values[column][position]
+            out_data.append([
+                "VES", Date, None, account, analytic, "Shopify", Date,
+                amount if side == 'debit' else None, amount if side == 'credit' else None,
+                "", "", "", "", "", "", Reference, "", "", "", "", ""
+            ])
+        category = compiled.categories.get(key, key[0])
+        stats['categories'][category] = stats['categories'].get(category, 0) + 1
+    stats['processed_rows'] = len(keys)
+    
+    # Tri par (date, journal): flux prêt pour la fusion globale du journal
+    sort_lines(out_data)
+    return out_data, stats
+
+
+def combine_ranges(results):
+    """
+    Regroupe les résultats des plages d'un même export (journal_rows).
+    
+    Args:
+        results: Tuples (lignes triées, statistiques), dans l'ordre des plages
+    
+    Returns:
+        Tuple (lignes comptables, statistiques): à clé égale, l'ordre des lignes
+        est celui d'un traitement de l'export en une seule fois
+    """
+    out_data = list(merge_streams([lines for lines, _ in results]))
+    stats = {'processed_rows': 0, 'skipped_rows': 0, 'categories': {}, 'errors': 0}
+    for _, range_stats in results:
+        for key in ('processed_rows', 'skipped_rows', 'errors'):
+            stats[key] += range_stats[key]
+        for category, count in range_stats['categories'].items():
+            stats['categories'][category] = stats['categories'].get(category, 0) + count
+    return out_data, stats
 
+
+def lines_by_reference(out_data):
+    """
+    Regroupe les écritures générées par référence de commande (conservées dans
+    l'index pour contre-passer une commande modifiée plus tard).
+    
+    Args:
+        out_data: Lignes comptables Shopify
+    
+    Returns:
+        Dictionnaire {référence: lignes}
+    """
+    grouped = {}
+    for line in out_data:
+        grouped.setdefault(line[COL_REFERENCE], []).append(line)
+    return grouped
+
+
+def book_orders(order_index, fingerprints, out_data):
+    """
+    Indexe les commandes journalisées et ajoute les contre-passations des
+    écritures précédentes des commandes modifiées.
+    
+    Args:
+        order_index: OrderIndex des commandes déjà journalisées
+        fingerprints: Dictionnaire {référence: empreinte} des commandes sélectionnées
+        out_data: Lignes comptables générées pour ces commandes, triées
+    
+    Returns:
+        Lignes comptables triées, contre-passations comprises
+    """
+    reversals = order_index.reversals(order_index.modified(fingerprints))
+    order_index.update(fingerprints, lines_by_reference(out_data))
+    return list(merge_streams([out_data, reversals])) if reversals else out_data
+
+
+def log_summary(stats, out_data):
+    """Logs de synthèse d'un traitement Shopify."""
+    logger.info("\n" + "="*80)
+    logger.info("SYNTHÈSE DU TRAITEMENT SHOPIFY")
+    logger.info("="*80)
+    logger.info(f"Lignes totales dans le fichier: {stats['total_rows']}")
+    logger.info(f"Lignes traitées avec succès: {stats['processed_rows']}")
+    logger.info(f"Lignes ignorées: {stats['skipped_rows']}")
+    logger.info(f"Erreurs rencontrées: {stats['errors']}")
+    logger.info(f"---")
+    for category in shopify_rules().category_order:
+        logger.info(f"Ventes {category}: {stats['categories'].get(category, 0)}")
+    logger.info(f"---")
+    logger.info(f"✓ {len(out_data)} lignes comptables générées au total")
+    logger.info("="*80 + "\n")
+
+
+def shopify(src, order_index=None) -> list:
+    """
+    Traite un fichier Excel Shopify et génère les écritures comptables.
+    
+    Args:
+        src: Chemin du fichier Excel ou objet file-like (BytesIO)
+        order_index: OrderIndex optionnel; si fourni, seules les commandes nouvelles
+            ou modifiées depuis la dernière journalisation sont traitées
+    
+    Returns:
+        Liste des lignes comptables générées
+    """
     try:
         logger.info("="*80)
         logger.info("DÉBUT DU TRAITEMENT SHOPIFY")
         logger.info("="*80)
         
-        # Lecture du fichier Excel
-        df = pd.read_excel(src, engine='openpyxl', dtype=str)
-        logger.info(f"✓ Fichier Excel chargé avec {len(df)} lignes")
-        logger.info(f"✓ Colonnes détectées: {list(df.columns)}")
-        
-        # Vérification des colonnes requises
-        required_columns = [
-            'Date', 'Total Sales', 'Shipping Country', 
-            'Net Sales', 'Shipping', 'Tax', 'Order Name'
-        ]
-        missing_columns = [col for col in required_columns if col not in df.columns]
-        
-        if missing_columns:
-            raise ValueError(f"Colonnes manquantes: {missing_columns}")
-        
-        logger.info(f"✓ Toutes les colonnes requises sont présentes")
-        
-        # Vérification si le DataFrame est vide
-        if df.empty:
-            logger.warning("Le fichier est vide (aucune ligne de données)")
+        rows, fingerprints, total_rows = read_export(src, order_index)
+        if rows is None:
             return []
         
-        # Afficher un aperçu des premières lignes
-        logger.info(f"\nAperçu des premières lignes:\n{df.head(3)}")
-        logger.info("="*80)
+        out_data, stats = journal_rows(rows)
+        stats['total_rows'] = total_rows
         
-        stats['total_rows'] = len(df)
+        # Les commandes évaluées sont indexées (enregistrement sur disque par l'appelant)
+        if order_index is not None:
+            out_data = book_orders(order_index, fingerprints, out_data)
         
-        # Traitement ligne par ligne (exclure la dernière ligne qui peut être un total)
-        for index, row in df.iloc[:-1].iterrows():
-            logger.debug(f"\n--- Traitement ligne {index + 1} ---")
-            
-            try:
-                # Extraction et validation des données
-                date_raw = row.get('Date', '')
-                amount_raw = row.get('Total Sales', '0')
-                country = str(row.get('Shipping Country', '')).strip()
-                tva_present = row.get('Note', '0')
-                amount_HT_TVA_raw = row.get('Net Sales', '0')
-                Frais_port_raw = row.get('Shipping', '0')
-                Tva_collect_raw = row.get('Tax', '0')
-                Reference = str(row.get('Order Name', '')).strip()
-                
-                logger.debug(f"Données brutes: Date={date_raw}, Country={country}, Total={amount_raw}, Ref={Reference}")
-                
-                # Formatage de la date
-                try:
-                    Date = date_format(date_raw)
-                except ValueError as e:
-                    logger.error(f"Ligne {index + 1}: Date invalide '{date_raw}' - {e}")
-                    stats['errors'] += 1
-                    stats['skipped_rows'] += 1
-                    continue
-                
-                # Conversion des montants
-                amount = safe_float(amount_raw)
-                amount_HT_TVA = safe_float(amount_HT_TVA_raw)
-                Frais_port = safe_float(Frais_port_raw)
-                Tva_collect = safe_float(Tva_collect_raw)
-                
-                logger.debug(f"Montants: TTC={amount:.2f}, HT={amount_HT_TVA:.2f}, Port={Frais_port:.2f}, TVA={Tva_collect:.2f}")
-                
-                # Vérification des montants négatifs ou nuls
-                if amount <= 0:
-                    logger.warning(f"Ligne {index + 1}: Montant total <= 0 ({amount}), ligne ignorée")
-                    stats['skipped_rows'] += 1
-                    continue
-                
-                # Validation du pays
-                if not country:
-                    logger.warning(f"Ligne {index + 1}: Pays non spécifié, ligne ignorée")
-                    stats['skipped_rows'] += 1
-                    continue
-                
-                # Traitement selon le pays
-                lines_added = 0
-                
-                if country == "France":
-                    logger.debug(f"  → Catégorie: FRANCE")
-                    out_data.extend([
-                        ["VES", Date, None, 707101, "REVOFFPBOOK", "Shopify", Date, None, amount_HT_TVA, 
-                         "", "", "", "", "", "", Reference, "", "", "", "", ""],
-                        ["VES", Date, None, 708502, "REVOFFPBOOK", "Shopify", Date, None, Frais_port, 
-                         "", "", "", "", "", "", Reference, "", "", "", "", ""],
-                        ["VES", Date, None, 445713, None, "Shopify", Date, None, Tva_collect, 
-                         "", "", "", "", "", "", Reference, "", "", "", "", ""],
-                    ])
-                    lines_added = 3
-                    stats['france'] += 1
-                
-                elif country in PAYS_UE:
-                    if tva_present:
-                        logger.debug(f"  → Catégorie: UE AVEC TVA")
-                        out_data.extend([
-                            ["VES", Date, None, 707400, "REVOFFPBOOK", "Shopify", Date, None, amount_HT_TVA, 
-                             "", "", "", "", "", "", Reference, "", "", "", "", ""],
-                            ["VES", Date, None, 708500, "REVOFFPBOOK", "Shopify", Date, None, Frais_port, 
-                             "", "", "", "", "", "", Reference, "", "", "", "", ""],
-                        ])
-                        lines_added = 2
-                        stats['ue_avec_tva'] += 1
-                    else:
-                        logger.debug(f"  → Catégorie: UE SANS TVA")
-                        out_data.extend([
-                            ["VES", Date, None, 707500, "REVOFFPBOOK", "Shopify", Date, None, amount_HT_TVA, 
-                             "", "", "", "", "", "", Reference, "", "", "", "", ""],
-                            ["VES", Date, None, 708503, "REVOFFPBOOK", "Shopify", Date, None, Frais_port, 
-                             "", "", "", "", "", "", Reference, "", "", "", "", ""],
-                            ["VES", Date, None, 445713, None, "Shopify", Date, None, Tva_collect, 
-                             "", "", "", "", "", "", Reference, "", "", "", "", ""],
-                        ])
-                        lines_added = 3
-                        stats['ue_sans_tva'] += 1
-                
-                else:
-                    logger.debug(f"  → Catégorie: HORS UE ({country})")
-                    out_data.extend([
-                        ["VES", Date, None, 707300, "REVOFFPBOOK", "Shopify", Date, None, amount_HT_TVA, 
-                         "", "", "", "", "", "", Reference, "", "", "", "", ""],
-                        ["VES", Date, None, 708500, "REVOFFPBOOK", "Shopify", Date, None, Frais_port, 
-                         "", "", "", "", "", "", Reference, "", "", "", "", ""],
-                    ])
-                    lines_added = 2
-                    stats['hors_ue'] += 1
-                
-                # Ajout du montant TTC
-                add_montant_ttc(out_data, Date, amount, Reference)
-                lines_added += 1
-                
-                stats['processed_rows'] += 1
-                logger.debug(f"  ✓ {lines_added} lignes comptables ajoutées")
-                
-            except ValueError as e:
-                logger.error(f"Ligne {index + 1}: Erreur de conversion - {e}")
-                stats['errors'] += 1
-                stats['skipped_rows'] += 1
-                continue
-            except Exception as e:
-                logger.error(f"Ligne {index + 1}: Erreur inattendue - {e}")
-                stats['errors'] += 1
-                stats['skipped_rows'] += 1
-                continue
-        
-        # Logs de synthèse
-        logger.info("\n" + "="*80)
-        logger.info("SYNTHÈSE DU TRAITEMENT SHOPIFY")
-        logger.info("="*80)
-        logger.info(f"Lignes totales dans le fichier: {stats['total_rows']}")
-        logger.info(f"Lignes traitées avec succès: {stats['processed_rows']}")
-        logger.info(f"Lignes ignorées: {stats['skipped_rows']}")
-        logger.info(f"Erreurs rencontrées: {stats['errors']}")
-        logger.info(f"---")
-        logger.info(f"Ventes France: {stats['france']}")
-        logger.info(f"Ventes UE avec TVA: {stats['ue_avec_tva']}")
-        logger.info(f"Ventes UE sans TVA: {stats['ue_sans_tva']}")
-        logger.info(f"Ventes Hors UE: {stats['hors_ue']}")
-        logger.info(f"---")
-        logger.info(f"✓ {len(out_data)} lignes comptables générées au total")
-        logger.info("="*80 + "\n")
+        log_summary(stats, out_data)
         
     except FileNotFoundError:
         logger.error(f"Fichier introuvable: {src}")
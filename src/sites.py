@@ -0,0 +1,104 @@
+import os
+import copy
+import logging
+import configparser
+from datetime import datetime
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+# Options dont la valeur est une liste séparée par des virgules
+LIST_OPTIONS = ['sftp_dir']
+
+# Options de type date (AAAA-MM-JJ)
+DATE_OPTIONS = ['from_date', 'to_date']
+
+# Fichiers d'état propres à un site: sans valeur dans sa section, nom préfixé par celui du site
+# (les références de commandes se recoupent d'une boutique à l'autre)
+PER_SITE_OPTIONS = ['shopify_index', 'journal_index', 'ledger_db', 'history_db']
+
+# Fichiers réécrits en entier à chaque enregistrement: jamais partagés entre sites
+EXCLUSIVE_OPTIONS = ['output', 'shopify_index', 'journal_index']
+
+
+def load_sites(config_path, base_args):
+    """
+    Charge la configuration multi-sites.
+
+    Chaque section du fichier INI décrit un site. Les clés reprennent le nom des
+    options de ligne de commande (sftp_host, sftp_user, sftp_pass, sftp_dir,
+    output, email_to, shopify_index...) et surchargent les valeurs de base_args.
+    Les fichiers d'état (index Shopify, index des lignes émises, grand livre,
+    historique) non définis dans une section sont propres au site: même
+    répertoire, nom préfixé par celui du site (ex: arles_shopify_commandes.json).
+
+    Exemple:
+        [arles]
+        sftp_host = sftp.arles.example
+        sftp_user = compta
+        sftp_pass = secret
+        sftp_dir = /all_uploads/shopify,/all_uploads/stripe
+        output = /opt/automation/arles.csv
+        email_to = compta-arles@example.org
+
+    Args:
+        config_path: Chemin du fichier INI
+        base_args: Namespace argparse servant de valeurs par défaut
+
+    Returns:
+        Liste de tuples (nom du site, Namespace argparse du site)
+
+    Raises:
+        ValueError: Option inconnue, ou fichier de sortie / index partagé par deux sites
+    """
+    parser = configparser.ConfigParser(interpolation=None)
+    if not parser.read(config_path, encoding='utf-8'):
+        raise FileNotFoundError(f"Fichier de configuration des sites introuvable: {config_path}")
+
+    sites = []
+    for name in parser.sections():
+        section = parser[name]
+        site_args = copy.deepcopy(base_args)
+
+        for key, raw_value in section.items():
+            if not hasattr(site_args, key):
+                raise ValueError(f"Option inconnue '{key}' pour le site [{name}]")
+
+            current = getattr(site_args, key)
+            if key in LIST_OPTIONS:
+                value = [part.strip() for part in raw_value.split(',') if part.strip()]
+            elif key in DATE_OPTIONS:
+                value = datetime.strptime(raw_value, '%Y-%m-%d').date()
+            elif isinstance(current, bool):
+                value = section.getboolean(key)
+            elif isinstance(current, int):
+                value = section.getint(key)
+            else:
+                value = raw_value
+            setattr(site_args, key, value)
+
+        for key in PER_SITE_OPTIONS:
+            value = getattr(site_args, key)
+            if key not in section and value:
+                directory, filename = os.path.split(value)
+                setattr(site_args, key, os.path.join(directory, f"{name}_{filename}"))
+
+        # Un site ne se relance pas lui-même en mode multi-sites
+        site_args.sites_config = None
+        sites.append((name, site_args))
+        logger.debug(f"Site [{name}] chargé: hôte {site_args.sftp_host}, sortie {site_args.output}")
+
+    if not sites:
+        raise ValueError(f"Aucun site défini dans {config_path}")
+
+    for key in EXCLUSIVE_OPTIONS:
+        owners = {}
+        for name, site_args in sites:
+            value = getattr(site_args, key)
+            if not value:
+                continue
+            path = os.path.abspath(value)
+            if path in owners:
+                raise ValueError(f"Sites [{owners[path]}] et [{name}]: même fichier '{value}' pour {key}")
+            owners[path] = name
+    return sites
@@ -5,7 +5,11 @@ from datetime import datetime
 import pandas as pd
 import logging
 from contstants import PRINT_ERR
-from shopify import safe_float
+from shopify import to_amounts
+from rules import skidata_rules
+from journal import sort_lines
+from excel_reader import read_excel
+from sniffer import sniff
 
 # Configuration du logging pour débogage
 logging.basicConfig(level=logging.DEBUG)
@@ -14,10 +18,12 @@ logger = logging.getLogger(__name__)
 FILENAME_REGEX = re.compile(r'rapport_jour_(\d{8})\.(xlsx|xls|csv)$', re.IGNORECASE)
 
 
-def treat_skidata_file(file_in_memory, filename, reference="SKIDATA_REF"):
+def treat_skidata_file(file_in_memory, filename, counts=None, reference="SKIDATA_REF"):
     """
     Traite un fichier Skidata sans en-têtes.
     Colonnes: A=code produit/secteur, B=type paiement, C=montant TTC, D=TVA
+    Le nombre de lignes d'un CSV est reporté dans counts['rows'] si counts est fourni,
+    celui des lignes mal formées (écartées) dans counts['bad_lines'].
     """
     out_data = []
     
@@ -45,26 +51,36 @@ def treat_skidata_file(file_in_memory, filename, reference="SKIDATA_REF"):
 
         # 2. Lecture du fichier avec détection automatique du séparateur
         if ext in ['xlsx', 'xls']:
-            df = pd.read_excel(file_in_memory, header=None, dtype=str)
+            # Repli sans moteur imposé: pandas choisit selon le format (xls/xlsx)
+            df = read_excel(file_in_memory, fallback=None, header=None, dtype=str)
             logger.info(f"Fichier Excel lu avec {len(df)} lignes")
         else:
-            # Essayer d'abord avec le séparateur déclaré, puis auto-détection
-            try:
-                df = pd.read_csv(file_in_memory, sep=';', header=None, dtype=str, encoding='utf-8')
-                logger.info(f"CSV lu avec séparateur ';' - {len(df)} lignes")
-            except Exception as e1:
-                logger.warning(f"Échec avec ';', tentative auto-détection: {e1}")
-                file_in_memory.seek(0)  # Repositionner le curseur
-                try:
-                    df = pd.read_csv(file_in_memory, sep=None, header=None, dtype=str, 
-                                   encoding='utf-8', engine='python')
-                    logger.info(f"CSV lu avec auto-détection - {len(df)} lignes")
-                except Exception as e2:
-                    logger.error(f"Échec auto-détection: {e2}")
-                    # Dernier essai avec virgule
-                    file_in_memory.seek(0)
-                    df = pd.read_csv(file_in_memory, sep=',', header=None, dtype=str, encoding='utf-8')
-                    logger.info(f"CSV lu avec séparateur ',' - {len(df)} lignes")
+            # Détection unique (encodage, séparateur, en-tête, décimales) sur le début du fichier
+            file_format = sniff(file_in_memory)
+            logger.info(f"Format détecté: séparateur '{file_format['delimiter']}', "
+                        f"encodage {file_format['encoding']}, en-tête: {file_format['has_header']}, "
+                        f"décimale: {file_format['decimal'] or 'indéterminée'}")
+            
+            # Lignes mal formées (trop de champs): écartées, journalisées et comptées
+            bad_lines = []
+
+            def skip_bad_line(fields):
+                bad_lines.append(fields)
+                logger.warning(f"Ligne mal formée ignorée ({len(fields)} champs): {fields}")
+                return None
+
+            # Lecture en une seule passe (moteur python: seul à accepter un traitement des lignes mal formées)
+            df = pd.read_csv(file_in_memory, sep=file_format['delimiter'], header=None, dtype=str,
+                             encoding=file_format['encoding'],
+                             skiprows=1 if file_format['has_header'] else 0,
+                             engine='python', on_bad_lines=skip_bad_line)
+            if counts is not None:
+                counts['rows'] = len(df) + len(bad_lines)
+                counts['bad_lines'] = len(bad_lines)
+            if bad_lines:
+                PRINT_ERR(f"[ERREUR] Fichier Skidata {filename}: {len(bad_lines)} ligne(s) mal formée(s) "
+                          f"ignorée(s), totaux de caisse incomplets")
+            logger.info(f"CSV lu - {len(df)} lignes")
 
         # 3. Vérifications de base
         if df.empty:
@@ -74,81 +90,60 @@ def treat_skidata_file(file_in_memory, filename, reference="SKIDATA_REF"):
         logger.info(f"Colonnes détectées: {df.shape[1]}")
         logger.info(f"Premières lignes du DataFrame:\n{df.head()}")
         
-        # 4. Traitement ligne par ligne
-        lignes_valides = 0
-        lignes_ignorees = 0
+        # Séparateur décimal (le point n'est retenu que s'il a été détecté dans un CSV)
+        decimal_point = ext == 'csv' and file_format['decimal'] == '.'
         
-        for idx, row in df.iterrows():
-            try:
-                # Vérifier le nombre de colonnes
-                if len(row) < 4:
-                    logger.warning(f"Ligne {idx} incomplète ({len(row)} colonnes): {row.values}")
-                    lignes_ignorees += 1
-                    continue
-
-                # Extraction et nettoyage des valeurs
-                col_a = str(row[0]).strip() if pd.notna(row[0]) else ""
-                col_b = str(row[1]).strip() if pd.notna(row[1]) else ""
-                col_c_raw = str(row[2]).strip() if pd.notna(row[2]) else "0"
-                col_d_raw = str(row[3]).strip() if pd.notna(row[3]) else "0"
-
-                logger.debug(f"Ligne {idx} - A:{col_a} | B:{col_b} | C:{col_c_raw} | D:{col_d_raw}")
-
-                # Vérifier si ce sont des données valides (pas d'en-tête caché)
-                if col_a.lower() in ['code', 'produit', 'secteur'] or col_b.lower() in ['type', 'paiement']:
-                    logger.info(f"Ligne {idx} ignorée (probable en-tête): {row.values}")
-                    lignes_ignorees += 1
-                    continue
-
-                # Conversion des montants avec gestion des formats français/anglais
-                montant_ttc_str = col_c_raw.replace(',', '.').replace(' ', '')
-                montant_tva_str = col_d_raw.replace(',', '.').replace(' ', '')
-                
-                montant_ttc = safe_float(montant_ttc_str, 0.0)
-                montant_tva = safe_float(montant_tva_str, 0.0)
-
-                logger.debug(f"  Montants convertis - TTC: {montant_ttc} | TVA: {montant_tva}")
-
-                # Ignorer les lignes avec montant nul ou négatif
-                if montant_ttc <= 0:
-                    logger.warning(f"Ligne {idx} ignorée (montant <= 0): TTC={montant_ttc}")
-                    lignes_ignorees += 1
-                    continue
-
-                # 5. Application des règles de catégorisation
-                ligne_traitee = False
-                
-                # Règle 1: Espèces (type paiement = '1')
-                if col_b == '1':
-                    espece_total += montant_ttc
-                    logger.debug(f"  → ESPÈCES: +{montant_ttc} (total: {espece_total})")
-                    ligne_traitee = True
-                
-                # Règle 2: CB caisse auto (codes 11 ou 12, type paiement = '3')
-                elif col_a in ['11', '12'] and col_b == '3':
-                    encaissement_cb_caisse_auto += montant_ttc
-                    logger.debug(f"  → CB CAISSE AUTO: +{montant_ttc} (total: {encaissement_cb_caisse_auto})")
-                    ligne_traitee = True
-                
-                # Règle 3: CB borne sortie (codes 41, 42, 43, type paiement = '3')
-                elif col_a in ['41', '42', '43'] and col_b == '3':
-                    encaissement_cb_borne_sortie += montant_ttc
-                    logger.debug(f"  → CB BORNE SORTIE: +{montant_ttc} (total: {encaissement_cb_borne_sortie})")
-                    ligne_traitee = True
-                
-                else:
-                    logger.warning(f"Ligne {idx} ne correspond à aucune règle: A={col_a}, B={col_b}")
-                    lignes_ignorees += 1
-
-                # Cumul TVA pour TOUTES les lignes valides (peu importe la catégorie)
-                if ligne_traitee:
-                    tva_collectee += montant_tva
-                    lignes_valides += 1
-
-            except Exception as e:
-                logger.error(f"[ERREUR] Ligne {idx}: {e} - Données: {row.values}")
-                lignes_ignorees += 1
-                continue
+        # 4. Traitement vectorisé de toutes les lignes
+        if df.shape[1] < 4:
+            logger.warning(f"Fichier incomplet ({df.shape[1]} colonnes au lieu de 4): aucune ligne exploitable")
+            df = df.reindex(columns=range(4))
+            complete = pd.Series(False, index=df.index)
+        else:
+            complete = pd.Series(True, index=df.index)
+
+        # Extraction et nettoyage des valeurs
+        col_a = df[0].fillna('').astype(str).str.strip()
+        col_b = df[1].fillna('').astype(str).str.strip()
+        col_c = df[2].fillna('0').astype(str).str.strip()
+        col_d = df[3].fillna('0').astype(str).str.strip()
+
+        # Vérifier si ce sont des données valides (pas d'en-tête caché)
+        header = col_a.str.lower().isin(['code', 'produit', 'secteur']) | col_b.str.lower().isin(['type', 'paiement'])
+        for idx in df.index[complete & header]:
+            logger.info(f"Ligne {idx} ignorée (probable en-tête): {df.loc[idx].values}")
+
+        # Conversion des montants avec gestion des formats français/anglais
+        if decimal_point:
+            # Format anglais: la virgule est un séparateur de milliers
+            montant_ttc = to_amounts(col_c.str.replace(',', '', regex=False).str.replace(' ', '', regex=False))
+            montant_tva = to_amounts(col_d.str.replace(',', '', regex=False).str.replace(' ', '', regex=False))
+        else:
+            montant_ttc = to_amounts(col_c.str.replace(',', '.', regex=False).str.replace(' ', '', regex=False))
+            montant_tva = to_amounts(col_d.str.replace(',', '.', regex=False).str.replace(' ', '', regex=False))
+
+        # Ignorer les lignes avec montant nul ou négatif
+        non_positive = complete & ~header & (montant_ttc <= 0)
+        for idx in df.index[non_positive]:
+            logger.warning(f"Ligne {idx} ignorée (montant <= 0): TTC={montant_ttc[idx]}")
+        candidates = complete & ~header & ~non_positive
+
+        # 5. Application des règles de catégorisation (table compilée, première règle satisfaite)
+        compiled = skidata_rules()
+        bucket = pd.Series(compiled.classify(col_a, col_b), index=df.index)
+        unmatched = candidates & (bucket < 0)
+        for idx in df.index[unmatched]:
+            logger.warning(f"Ligne {idx} ne correspond à aucune règle: A={col_a[idx]}, B={col_b[idx]}")
+
+        valid = candidates & (bucket >= 0)
+        lignes_valides = int(valid.sum())
+        lignes_ignorees = len(df) - lignes_valides
+
+        # Cumuls TTC par écriture; TVA (colonne D) cumulée sur TOUTES les lignes valides
+        totals = montant_ttc[valid].groupby(bucket[valid]).sum()
+        montants = {
+            'TTC': {index: float(totals.get(index, 0.0)) for index in range(len(compiled.entries))},
+            'TVA': float(montant_tva[valid].sum()),
+        }
 
         # 6. Logs de synthèse
         logger.info(f"\n{'='*60}")
@@ -158,32 +153,24 @@ def treat_skidata_file(file_in_memory, filename, reference="SKIDATA_REF"):
         logger.info(f"Lignes valides traitées: {lignes_valides}")
         logger.info(f"Lignes ignorées: {lignes_ignorees}")
         logger.info(f"---")
-        logger.info(f"Total ESPÈCES (TTC): {espece_total:.2f} €")
-        logger.info(f"Total CB CAISSE AUTO (TTC): {encaissement_cb_caisse_auto:.2f} €")
-        logger.info(f"Total CB BORNE SORTIE (TTC): {encaissement_cb_borne_sortie:.2f} €")
-        logger.info(f"Total TVA COLLECTÉE (Colonne D): {tva_collectee:.2f} €")
+        entries = []
+        for index, entry in enumerate(compiled.entries):
+            amount = montants['TTC'][index] if entry['amount'] == 'TTC' else montants['TVA']
+            entries.append((entry, amount))
+            logger.info(f"Total {entry['label']} ({entry['amount']}): {amount:.2f} €")
         logger.info(f"{'='*60}\n")
 
         # 7. Construction des lignes comptables (montants TTC directement)
-        out_data.extend([
-            ["CAIS", file_date, None, 511311, None, "Caisse Parking mois/année", file_date, 
-             encaissement_cb_caisse_auto, "", "", "", "", "", "", "", "", "", "", "", "", ""],
-            ["CAIS", file_date, None, 511312, None, "Caisse Parking mois/année", file_date, 
-             encaissement_cb_borne_sortie, "", "", "", "", "", "", "", "", "", "", "", "", ""],
-            ["CAIS", file_date, None, 539002, None, "Caisse Parking mois/année", file_date, 
-             espece_total, "", "", "", "", "", "", "", "", "", "", "", "", ""],
-            ["CAIS", file_date, None, 445711, None, "Caisse Parking mois/année", file_date, 
-             None, tva_collectee, "", "", "", "", "", "", "", "", "", "", "", ""],
-        ])
-
-        logger.info(f"Lignes comptables générées:")
-        logger.info(f"  511311 (CB Caisse Auto): {encaissement_cb_caisse_auto:.2f} €")
-        logger.info(f"  511312 (CB Borne Sortie): {encaissement_cb_borne_sortie:.2f} €")
-        logger.info(f"  539002 (Espèces): {espece_total:.2f} €")
-        logger.info(f"  445711 (TVA): {tva_collectee:.2f} €")
+        for entry, amount in entries:
+            out_data.append([
+                "CAIS", file_date, None, entry['account'], None, "Caisse Parking mois/année", file_date,
+                amount if entry['side'] == 'debit' else None, amount if entry['side'] == 'credit' else "",
+                "", "", "", "", "", "", "", "", "", "", "", ""
+            ])
+
         logger.info(f"\n✓ Fichier traité avec succès: {len(out_data)} lignes comptables générées\n")
         
-        return out_data
+        return sort_lines(out_data)
 
     except Exception as e:
         PRINT_ERR(f"[ERREUR CRITIQUE] Fichier Skidata {filename}: {e}")
@@ -0,0 +1,144 @@
+import re
+import csv
+import codecs
+import logging
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+# Taille de l'échantillon inspecté en début de fichier
+SAMPLE_SIZE = 8192
+
+# Séparateurs candidats, par ordre de préférence en cas d'égalité
+DELIMITERS = [';', ',', '\t', '|']
+
+# Montants au format français (1 234,50 / 1.234,50 / 12,5) ou anglais (1,234.50 / 12.5)
+DECIMAL_COMMA_REGEX = re.compile(r'^-?\d{1,3}([ .]\d{3})*,\d+$|^-?\d+,\d+$')
+DECIMAL_POINT_REGEX = re.compile(r'^-?\d{1,3}([ ,]\d{3})*\.\d+$|^-?\d+\.\d+$')
+NUMBER_REGEX = re.compile(r'^-?[\d ,.]*\d$')
+
+
+def detect_encoding(sample):
+    """
+    Détermine l'encodage d'un échantillon d'octets.
+
+    Args:
+        sample: Premiers octets du fichier
+
+    Returns:
+        'utf-8-sig', 'utf-16', 'utf-8' ou 'latin-1'
+    """
+    if sample.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    if sample.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return 'utf-16'
+
+    # Décodeur incrémental: un caractère multi-octets coupé en fin d'échantillon n'est pas une erreur
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return 'latin-1'
+
+
+def detect_delimiter(lines):
+    """
+    Choisit le séparateur le plus régulier sur les lignes de l'échantillon.
+
+    Args:
+        lines: Lignes de texte de l'échantillon
+
+    Returns:
+        Caractère séparateur (',' par défaut)
+    """
+    best, best_score = ',', 0
+    for delimiter in DELIMITERS:
+        counts = [line.count(delimiter) for line in lines]
+        if not counts or min(counts) == 0:
+            continue
+        # Séparateur présent sur toutes les lignes, avec le nombre de champs le plus stable
+        score = min(counts) * 2 - (max(counts) - min(counts))
+        if score > best_score:
+            best, best_score = delimiter, score
+    return best
+
+
+def detect_header(rows):
+    """
+    Détecte une ligne d'en-têtes: première ligne sans aucun champ numérique
+    alors que les lignes suivantes en contiennent.
+
+    Args:
+        rows: Lignes de l'échantillon découpées en champs
+
+    Returns:
+        True si la première ligne est une ligne d'en-têtes
+    """
+    if len(rows) < 2:
+        return False
+    is_numeric = lambda field: bool(NUMBER_REGEX.match(field.strip()))
+    first_has_number = any(is_numeric(field) for field in rows[0])
+    others_have_number = any(is_numeric(field) for row in rows[1:] for field in row)
+    return not first_has_number and others_have_number
+
+
+def detect_decimal(rows):
+    """
+    Détermine le séparateur décimal majoritaire des champs numériques.
+
+    Args:
+        rows: Lignes de l'échantillon découpées en champs
+
+    Returns:
+        ',' ou '.', ou None si l'échantillon ne contient aucun nombre décimal
+    """
+    comma = point = 0
+    for row in rows:
+        for field in row:
+            field = field.strip()
+            if DECIMAL_COMMA_REGEX.match(field):
+                comma += 1
+            elif DECIMAL_POINT_REGEX.match(field):
+                point += 1
+    if comma == point == 0:
+        return None
+    return ',' if comma > point else '.'
+
+
+def sniff(file_obj, sample_size=SAMPLE_SIZE):
+    """
+    Inspecte une seule fois le début d'un fichier texte pour choisir les paramètres de lecture.
+
+    Le curseur du fichier est remis à sa position initiale.
+
+    Args:
+        file_obj: Objet file-like binaire (BytesIO, fichier...)
+        sample_size: Nombre d'octets inspectés
+
+    Returns:
+        Dictionnaire {'encoding', 'delimiter', 'has_header', 'decimal'}
+    """
+    position = file_obj.tell()
+    sample = file_obj.read(sample_size)
+    file_obj.seek(position)
+
+    encoding = detect_encoding(sample)
+    text = codecs.getincrementaldecoder(encoding)(errors='replace').decode(sample, final=False)
+
+    lines = text.splitlines()
+    # Dernière ligne probablement tronquée si l'échantillon est plein
+    if len(sample) >= sample_size and len(lines) > 1:
+        lines = lines[:-1]
+    lines = [line for line in lines if line.strip()]
+
+    delimiter = detect_delimiter(lines)
+    rows = list(csv.reader(lines, delimiter=delimiter))
+
+    result = {
+        'encoding': encoding,
+        'delimiter': delimiter,
+        'has_header': detect_header(rows),
+        'decimal': detect_decimal(rows),
+    }
+    logger.debug(f"Format détecté: {result}")
+    return result
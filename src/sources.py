@@ -0,0 +1,140 @@
+import io
+import os
+import logging
+import paramiko
+import spool
+from sftp_profiles import open_transport
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+# Sources de fichiers disponibles
+SOURCE_BACKENDS = ['sftp', 'local']
+
+
+class SftpSource:
+    """
+    Source SFTP: fichiers lus à travers un transport SSH (profil de transport,
+    keepalive). Les fichiers sont reçus dans un tampon par UsrRequest, avec
+    reprise à l'octet en cas de coupure.
+    """
+
+    local = False
+
+    def __init__(self, host, port, username, password, profile=None, keepalive=0):
+        """
+        Args:
+            host: Adresse du serveur
+            port: Port par défaut (remplacé par celui du profil s'il en définit un)
+            username: Utilisateur
+            password: Mot de passe
+            profile: Options du profil de transport (sftp_profiles.load_profiles)
+            keepalive: Intervalle keepalive en secondes (0 pour désactiver)
+        """
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.profile = profile
+        self.keepalive = keepalive
+        self.transport = None
+        self.client = None
+
+    def connect(self):
+        """Ouvre le transport SSH et le client SFTP."""
+        self.transport, self.client = open_transport(
+            self.host, self.port, self.username, self.password, self.profile, self.keepalive
+        )
+
+    def is_active(self):
+        return self.transport is not None and self.transport.is_active()
+
+    def listdir_attr(self, path):
+        """Liste un répertoire distant (paramiko.SFTPAttributes, nom dans filename)."""
+        return self.client.listdir_attr(path)
+
+    def stat(self, path):
+        return self.client.stat(path)
+
+    def open(self, path):
+        """Ouvre un fichier distant en lecture (paramiko.SFTPFile)."""
+        return self.client.open(path, 'rb')
+
+    def close(self):
+        """Ferme le client SFTP puis le transport."""
+        if self.client:
+            self.client.close()
+            logger.debug("Client SFTP fermé")
+        if self.transport:
+            self.transport.close()
+            logger.debug("Transport SFTP fermé")
+        self.client = None
+        self.transport = None
+
+
+class LocalSource:
+    """
+    Source locale: répertoires du système de fichiers (partage monté sur le
+    serveur de traitement, ou fichiers capturés rejoués hors ligne).
+
+    Les répertoires sont listés avec os.scandir (attributs issus du même appel
+    système que le listing) et les fichiers au-delà de spool.SPOOL_MAX_SIZE sont
+    projetés en mémoire (mmap): les parseurs lisent directement les pages du
+    fichier, sans chiffrement, sans transfert réseau et sans copie dans un tampon
+    de réception. Les fichiers plus petits sont copiés en mémoire: un fichier
+    tronqué pendant sa projection interrompt le processus (SIGBUS), ce qu'une
+    copie évite pour l'essentiel des dépôts.
+    """
+
+    local = True
+
+    def connect(self):
+        """Sans objet en local: aucune connexion à établir."""
+
+    def is_active(self):
+        return True
+
+    def listdir_attr(self, path):
+        """
+        Liste un répertoire local avec les attributs de chaque fichier.
+
+        Args:
+            path: Répertoire local
+
+        Returns:
+            Liste de paramiko.SFTPAttributes (nom dans filename)
+        """
+        with os.scandir(path) as entries:
+            return [paramiko.SFTPAttributes.from_stat(entry.stat(), entry.name) for entry in entries]
+
+    def stat(self, path):
+        return paramiko.SFTPAttributes.from_stat(os.stat(path))
+
+    def read(self, path):
+        """
+        Ouvre un fichier local pour les parseurs: copié en mémoire jusqu'à
+        spool.SPOOL_MAX_SIZE, projeté en mémoire au-delà.
+
+        Args:
+            path: Chemin du fichier local
+
+        Returns:
+            BytesIO ou MappedFile positionné au début
+
+        Raises:
+            OSError: Fichier introuvable, illisible ou modifié pendant sa projection
+        """
+        file_obj = open(path, 'rb')
+        try:
+            if os.fstat(file_obj.fileno()).st_size <= spool.SPOOL_MAX_SIZE:
+                # Copie: une troncature pendant le traitement est sans effet (fichier vide compris,
+                # qui ne peut pas être projeté)
+                with file_obj:
+                    return io.BytesIO(file_obj.read())
+            return spool.MappedFile(file_obj)
+        except Exception:
+            file_obj.close()
+            raise
+
+    def close(self):
+        logger.debug("Source locale fermée")
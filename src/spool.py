@@ -0,0 +1,150 @@
+import io
+import os
+import mmap
+import logging
+import tempfile
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+# Taille au-delà de laquelle un téléchargement est écrit dans un fichier temporaire
+SPOOL_MAX_SIZE = int(os.getenv('SPOOL_MAX_SIZE', 32 * 1024 * 1024))
+
+
+def _signature(file_obj):
+    """Taille et date de modification (ns) d'un fichier ouvert."""
+    stat = os.fstat(file_obj.fileno())
+    return stat.st_size, stat.st_mtime_ns
+
+
+class MappedFile(io.RawIOBase):
+    """
+    Fichier binaire en lecture seule projeté en mémoire (mmap).
+
+    Les lectures copient directement depuis les pages du fichier vers le tampon
+    de l'appelant, sans copie intermédiaire du contenu complet.
+
+    Un fichier tronqué par un autre processus pendant sa projection provoque un
+    SIGBUS à la lecture des pages disparues (non interceptable): modified()
+    permet de vérifier après traitement que le fichier n'a pas changé.
+    """
+
+    def __init__(self, file_obj):
+        """
+        Args:
+            file_obj: Fichier ouvert (disposant d'un fileno) à projeter; fermé avec l'objet
+
+        Raises:
+            OSError: Fichier modifié pendant sa projection
+        """
+        super().__init__()
+        self._file = file_obj
+        self._signature = _signature(file_obj)
+        self._map = mmap.mmap(file_obj.fileno(), 0, access=mmap.ACCESS_READ)
+        self._size = len(self._map)
+        self._pos = 0
+        if self._size != self._signature[0]:
+            self._map.close()
+            raise OSError(f"fichier modifié pendant sa projection ({self._signature[0]} puis {self._size} octets)")
+
+    def modified(self):
+        """Indique si le fichier a changé (taille ou date de modification) depuis sa projection."""
+        return _signature(self._file) != self._signature
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        """Copie les octets suivants directement dans le tampon fourni."""
+        count = min(len(buffer), self._size - self._pos)
+        if count <= 0:
+            return 0
+        with memoryview(self._map) as view:
+            buffer[:count] = view[self._pos:self._pos + count]
+        self._pos += count
+        return count
+
+    def readall(self):
+        return self.read(self._size - self._pos)
+
+    def read(self, size=-1):
+        """Lit jusqu'à size octets (tout le reste si size < 0)."""
+        if size is None or size < 0:
+            size = self._size - self._pos
+        data = self._map[self._pos:self._pos + size]
+        self._pos += len(data)
+        return data
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._pos + offset
+        elif whence == io.SEEK_END:
+            position = self._size + offset
+        else:
+            raise ValueError(f"Valeur whence invalide: {whence}")
+        if position < 0:
+            raise ValueError(f"Position négative: {position}")
+        self._pos = position
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+    def getbuffer(self):
+        """Retourne une vue mémoire sur l'intégralité du contenu (sans copie)."""
+        return memoryview(self._map)
+
+    def close(self):
+        if not self.closed:
+            try:
+                self._map.close()
+            except BufferError:
+                # Une vue mémoire est encore référencée: le mmap sera libéré par le ramasse-miettes
+                logger.debug("Projection mémoire encore référencée, fermeture différée")
+            self._file.close()
+        super().close()
+
+
+def open_buffer(expected_size, max_size=None):
+    """
+    Crée le tampon de réception d'un téléchargement.
+
+    Args:
+        expected_size: Taille annoncée du fichier (attributs SFTP), None si inconnue
+        max_size: Seuil mémoire / fichier temporaire (défaut SPOOL_MAX_SIZE)
+
+    Returns:
+        BytesIO pour les petits fichiers, fichier temporaire anonyme sinon
+    """
+    max_size = SPOOL_MAX_SIZE if max_size is None else max_size
+    if expected_size is not None and expected_size > max_size:
+        logger.debug(f"  Fichier volumineux ({expected_size} octets): réception dans un fichier temporaire")
+        return tempfile.TemporaryFile()
+    return io.BytesIO()
+
+
+def finalize(buffer):
+    """
+    Prépare un tampon rempli pour la lecture par les parseurs.
+
+    Args:
+        buffer: Tampon retourné par open_buffer() et rempli
+
+    Returns:
+        Objet fichier binaire positionné au début (BytesIO ou MappedFile)
+    """
+    if isinstance(buffer, io.BytesIO):
+        buffer.seek(0)
+        return buffer
+
+    buffer.flush()
+    if os.fstat(buffer.fileno()).st_size == 0:
+        # Un fichier vide ne peut pas être projeté en mémoire
+        buffer.close()
+        return io.BytesIO()
+    return MappedFile(buffer)
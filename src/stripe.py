@@ -1,25 +1,231 @@
 import csv
 import io
+import json
+import codecs
 import logging
 from datetime import datetime
 from contstants import PRINT_ERR
+from journal import sort_lines
 from shopify import safe_float, date_format
+from sniffer import sniff
+
+try:
+    # Décodeur JSON rapide (optionnel), lit directement les octets
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
 
 # Configuration du logging
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+# Devises sans unité divisionnaire (montants Stripe déjà en unités)
+ZERO_DECIMAL_CURRENCIES = {
+    'bif', 'clp', 'djf', 'gnf', 'jpy', 'kmf', 'krw', 'mga',
+    'pyg', 'rwf', 'ugx', 'vnd', 'vuv', 'xaf', 'xof', 'xpf',
+}
+
+# Types de balance transactions journalisés (les remboursements, frais et
+# virements sont ignorés, comme les montants négatifs de l'export CSV)
+CHARGE_TYPES = {'charge', 'payment'}
+
+# Emplacements de l'email client selon l'objet exporté (transaction, paiement...)
+EMAIL_FIELDS = [
+    ('customer_email',), ('receipt_email',), ('billing_details', 'email'),
+    ('source', 'billing_details', 'email'), ('source', 'receipt_email'), ('customer', 'email'),
+]
+
+# Libellé de repli sans email (export standard des balance transactions, source non
+# développée): identifiant de la charge / source, description, identifiant de l'objet
+LABEL_FIELDS = [('source',), ('source', 'id'), ('description',), ('id',)]
+
+
+def transaction_lines(date, mail, amount):
+    """
+    Écritures d'une transaction Stripe: encaissement (B5) et vente (VE), TVA 10%.
+    
+    Args:
+        date: Date au format jj/mm/aaaa
+        mail: Email du client (libellé)
+        amount: Montant TTC en euros
+    
+    Returns:
+        Tuple (5 lignes comptables, montant HT, TVA)
+    """
+    amount_ht = round(amount / 1.10, 2)
+    Tva_collect = round(amount - amount_ht, 2)
+    return [
+        ["B5", date, None, "411SAP", None, mail, date, amount, None, 
+         "", "", "", "", "", "", "", "", "", "", "", ""],
+        ["B5", date, None, 512500, None, mail, date, None, amount, 
+         "", "", "", "", "", "", "", "", "", "", "", ""],
+        ["VE", date, None, "411SAP", None, mail, date, amount, None, 
+         "", "", "", "", "", "", "", "", "", "", "", ""],
+        ["VE", date, None, 706101, "REVSAPVISGR", mail, date, None, amount_ht, 
+         "", "", "", "", "", "", "", "", "", "", "", ""],
+        ["VE", date, None, 445712, None, mail, date, None, Tva_collect, 
+         "", "", "", "", "", "", "", "", "", "", "", ""],
+    ], amount_ht, Tva_collect
+
+
+def is_json(file_in_memory):
+    """
+    Indique si le fichier est un export JSON / JSONL (premier caractère '{' ou '[').
+    Le curseur est remis au début.
+    """
+    file_in_memory.seek(0)
+    head = file_in_memory.read(64)
+    file_in_memory.seek(0)
+    if head.startswith(codecs.BOM_UTF8):
+        head = head[len(codecs.BOM_UTF8):]
+    return head.lstrip()[:1] in (b'{', b'[')
+
+
+def iter_json_records(file_in_memory):
+    """
+    Parcourt les objets d'un export Stripe JSON ou JSONL.
+    
+    - JSONL: un objet par ligne, décodé au fil de la lecture
+    - JSON: liste d'objets, ou liste paginée de l'API ({"object": "list", "data": [...]})
+    
+    Args:
+        file_in_memory: Objet fichier binaire positionné au début
+    
+    Yields:
+        Tuples (numéro de ligne ou d'objet, dictionnaire)
+    """
+    # Lecture ligne à ligne tamponnée (MappedFile est un flux brut)
+    reader = file_in_memory if isinstance(file_in_memory, io.BufferedIOBase) else io.BufferedReader(file_in_memory)
+    try:
+        first = reader.readline()
+        if first.startswith(codecs.BOM_UTF8):
+            first = first[len(codecs.BOM_UTF8):]
+        
+        if first.lstrip().startswith(b'['):
+            document = json_loads(first + reader.read())
+        else:
+            try:
+                document = json_loads(first) if first.strip() else None
+            except ValueError:
+                # Objet unique réparti sur plusieurs lignes (JSON indenté)
+                document = json_loads(first + reader.read())
+            else:
+                if document is not None and document.get('object') != 'list':
+                    # JSONL: un objet par ligne
+                    yield 1, document
+                    for index, line in enumerate(reader, 2):
+                        if line.strip():
+                            yield index, json_loads(line)
+                    return
+        
+        if isinstance(document, dict):
+            document = document.get('data', [])
+        for index, record in enumerate(document or [], 1):
+            yield index, record
+    finally:
+        if reader is not file_in_memory:
+            # Ne pas fermer le flux sous-jacent
+            reader.detach()
+
+
+def _field(record, path):
+    value = record
+    for key in path:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def fallback_label(record):
+    """
+    Libellé d'un objet Stripe sans email client (ex: 'ch_3P...' pour une balance
+    transaction dont la source n'est pas développée).
+    
+    Args:
+        record: Balance transaction ou paiement Stripe
+    
+    Returns:
+        Libellé, chaîne vide si aucun identifiant n'est disponible
+    """
+    return next((value.strip() for value in (_field(record, path) for path in LABEL_FIELDS)
+                 if isinstance(value, str) and value.strip()), '')
+
+
+def record_transaction(record):
+    """
+    Date, email et montant (euros) d'un objet Stripe exporté.
+    
+    Le montant est en unités mineures (centimes) et la date un horodatage Unix
+    (champ created), converti dans le fuseau local comme l'export du tableau de bord.
+    
+    Args:
+        record: Balance transaction ou paiement Stripe
+    
+    Returns:
+        Tuple (date jj/mm/aaaa, email, montant), ou None si l'objet n'est pas un paiement
+    
+    Raises:
+        ValueError: Date ou montant invalide
+    """
+    kind = record.get('object')
+    if kind == 'balance_transaction' and record.get('type') not in CHARGE_TYPES:
+        return None
+    if kind == 'charge' and record.get('status', 'succeeded') != 'succeeded':
+        return None
+    
+    created = record.get('created')
+    if isinstance(created, (int, float)) and not isinstance(created, bool):
+        date = datetime.fromtimestamp(created).strftime('%d/%m/%Y')
+    else:
+        date = date_format(record.get('created_date') or created or '')
+    
+    mail = next((value for value in (_field(record, path) for path in EMAIL_FIELDS) if value), '')
+    
+    minor_units = record.get('amount')
+    if not isinstance(minor_units, int) or isinstance(minor_units, bool):
+        raise ValueError(f"Montant en unités mineures invalide: {minor_units!r}")
+    exponent = 0 if str(record.get('currency', 'eur')).lower() in ZERO_DECIMAL_CURRENCIES else 2
+    return date, str(mail).strip(), minor_units / 10 ** exponent
+
+
+def read_csv_rows(file_in_memory, encoding, delimiter):
+    """
+    Lit toutes les lignes d'un CSV binaire en les décodant à la volée.
+    
+    Args:
+        file_in_memory: Objet file-like binaire positionné au début des données
+        encoding: Encodage du fichier
+        delimiter: Séparateur de champs
+    
+    Returns:
+        Liste de dictionnaires (une entrée par ligne)
+    """
+    text_stream = io.TextIOWrapper(file_in_memory, encoding=encoding, newline='')
+    try:
+        return list(csv.DictReader(text_stream, delimiter=delimiter))
+    finally:
+        # Ne pas fermer le flux binaire sous-jacent
+        text_stream.detach()
 
-def st(file_in_memory) -> list:
+
+def st(file_in_memory, counts=None) -> list:
     """
     Traite un fichier CSV Stripe en mémoire et génère les écritures comptables.
+    Les exports JSON / JSONL (balance transactions) sont reconnus à leur contenu
+    et traités par st_json.
     
     Args:
-        file_in_memory: Objet BytesIO contenant le fichier CSV Stripe
+        file_in_memory: Objet fichier binaire (BytesIO ou MappedFile) contenant le fichier Stripe
+        counts: Dictionnaire optionnel recevant le nombre de lignes lues ('rows')
     
     Returns:
         Liste des lignes comptables générées, triées par date
     """
+    if is_json(file_in_memory):
+        return st_json(file_in_memory, counts)
+    
     out_data = []
     stats = {
         'total_rows': 0,
@@ -40,20 +246,22 @@ def st(file_in_memory) -> list:
         file_in_memory.seek(0)
         logger.debug("Curseur du fichier repositionné au début")
         
-        # Lecture du fichier CSV depuis la mémoire
+        # Détection unique du format sur le début du fichier
+        file_format = sniff(file_in_memory)
+        logger.debug(f"Format détecté: encodage {file_format['encoding']}, séparateur '{file_format['delimiter']}'")
+        
+        # Lecture du CSV en une passe, décodage à la volée sans copie du contenu
         try:
-            file_content = file_in_memory.getvalue().decode('utf-8')
-            logger.debug(f"Fichier décodé en UTF-8 ({len(file_content)} caractères)")
+            rows = read_csv_rows(file_in_memory, file_format['encoding'], file_format['delimiter'])
         except UnicodeDecodeError:
-            logger.warning("Échec du décodage UTF-8, tentative avec latin-1")
+            # Octets invalides au-delà de l'échantillon inspecté
+            logger.warning(f"Échec du décodage {file_format['encoding']}, tentative avec latin-1")
             file_in_memory.seek(0)
-            file_content = file_in_memory.getvalue().decode('latin-1')
-        
-        # Création du lecteur CSV
-        csvreader = csv.DictReader(io.StringIO(file_content))
-        rows = list(csvreader)
+            rows = read_csv_rows(file_in_memory, 'latin-1', file_format['delimiter'])
         
         stats['total_rows'] = len(rows)
+        if counts is not None:
+            counts['rows'] = stats['total_rows']
         logger.info(f"✓ Fichier CSV chargé avec {stats['total_rows']} lignes")
         
         # Afficher les colonnes détectées
@@ -125,26 +333,12 @@ def st(file_in_memory) -> list:
                     stats['skipped_rows'] += 1
                     continue
                 
-                # Calcul HT et TVA (TVA 10%)
-                amount_ht = round(amount / 1.10, 2)
-                Tva_collect = round(amount - amount_ht, 2)
+                # Ajout des 5 lignes comptables pour chaque transaction (TVA 10%)
+                lines, amount_ht, Tva_collect = transaction_lines(Date, mail, amount)
+                out_data.extend(lines)
                 
                 logger.debug(f"  Montants: TTC={amount:.2f}€, HT={amount_ht:.2f}€, TVA={Tva_collect:.2f}€")
                 
-                # Ajout des 5 lignes comptables pour chaque transaction
-                out_data.extend([
-                    ["B5", Date, None, "411SAP", None, mail, Date, amount, None, 
-                     "", "", "", "", "", "", "", "", "", "", "", ""],
-                    ["B5", Date, None, 512500, None, mail, Date, None, amount, 
-                     "", "", "", "", "", "", "", "", "", "", "", ""],
-                    ["VE", Date, None, "411SAP", None, mail, Date, amount, None, 
-                     "", "", "", "", "", "", "", "", "", "", "", ""],
-                    ["VE", Date, None, 706101, "REVSAPVISGR", mail, Date, None, amount_ht, 
-                     "", "", "", "", "", "", "", "", "", "", "", ""],
-                    ["VE", Date, None, 445712, None, mail, Date, None, Tva_collect, 
-                     "", "", "", "", "", "", "", "", "", "", "", ""],
-                ])
-                
                 logger.debug(f"  ✓ 5 lignes comptables ajoutées")
                 
                 # Mise à jour des statistiques
@@ -167,33 +361,12 @@ def st(file_in_memory) -> list:
                 stats['skipped_rows'] += 1
                 continue
         
-        # Tri des données par date
+        # Tri des données par (date, journal) sur une clé entière précalculée
         if out_data:
-            logger.info("\nTri des données par date...")
-            try:
-                out_data.sort(key=lambda x: datetime.strptime(x[1], "%d/%m/%Y"))
-                logger.info("✓ Données triées avec succès")
-            except ValueError as e:
-                logger.error(f"Erreur lors du tri par date: {e}")
-                PRINT_ERR(f"[ERREUR] Problème de format de date lors du tri: {e}")
-                return []
+            sort_lines(out_data)
+            logger.info("✓ Données triées par date et journal")
         
-        # Logs de synthèse
-        logger.info("\n" + "="*80)
-        logger.info("SYNTHÈSE DU TRAITEMENT STRIPE")
-        logger.info("="*80)
-        logger.info(f"Lignes totales dans le fichier: {stats['total_rows']}")
-        logger.info(f"Lignes traitées avec succès: {stats['processed_rows']}")
-        logger.info(f"Lignes ignorées: {stats['skipped_rows']}")
-        logger.info(f"Erreurs rencontrées: {stats['errors']}")
-        logger.info(f"---")
-        logger.info(f"Montant total TTC: {stats['total_amount']:.2f} €")
-        logger.info(f"Montant total HT: {stats['total_ht']:.2f} €")
-        logger.info(f"TVA collectée totale: {stats['total_tva']:.2f} €")
-        logger.info(f"---")
-        logger.info(f"✓ {len(out_data)} lignes comptables générées au total")
-        logger.info(f"  ({stats['processed_rows']} transactions × 5 lignes)")
-        logger.info("="*80 + "\n")
+        log_summary(stats, out_data)
         
         return out_data if out_data else []
     
@@ -211,3 +384,128 @@ def st(file_in_memory) -> list:
         logger.exception("Erreur critique lors du traitement du fichier Stripe")
         PRINT_ERR(f"[ERREUR] Problème avec le traitement du fichier Stripe: {e}")
         return []
+
+
+def log_summary(stats, out_data):
+    """Logs de synthèse d'un traitement Stripe."""
+    logger.info("\n" + "="*80)
+    logger.info("SYNTHÈSE DU TRAITEMENT STRIPE")
+    logger.info("="*80)
+    logger.info(f"Lignes totales dans le fichier: {stats['total_rows']}")
+    logger.info(f"Lignes traitées avec succès: {stats['processed_rows']}")
+    logger.info(f"Lignes ignorées: {stats['skipped_rows']}")
+    logger.info(f"Erreurs rencontrées: {stats['errors']}")
+    logger.info(f"---")
+    logger.info(f"Montant total TTC: {stats['total_amount']:.2f} €")
+    logger.info(f"Montant total HT: {stats['total_ht']:.2f} €")
+    logger.info(f"TVA collectée totale: {stats['total_tva']:.2f} €")
+    logger.info(f"---")
+    logger.info(f"✓ {len(out_data)} lignes comptables générées au total")
+    logger.info(f"  ({stats['processed_rows']} transactions × 5 lignes)")
+    logger.info("="*80 + "\n")
+
+
+def st_json(file_in_memory, counts=None) -> list:
+    """
+    Traite un export Stripe JSON / JSONL (balance transactions ou paiements) et
+    génère les mêmes écritures que l'export CSV.
+    
+    Les objets JSONL sont décodés au fil de la lecture, sans décodage texte du
+    fichier; les montants en centimes sont convertis directement.
+    
+    Args:
+        file_in_memory: Objet fichier binaire (BytesIO ou MappedFile) contenant l'export
+        counts: Dictionnaire optionnel recevant le nombre d'objets lus ('rows')
+    
+    Returns:
+        Liste des lignes comptables générées, triées par date
+    """
+    out_data = []
+    stats = {
+        'total_rows': 0,
+        'processed_rows': 0,
+        'skipped_rows': 0,
+        'errors': 0,
+        'total_amount': 0.0,
+        'total_ht': 0.0,
+        'total_tva': 0.0,
+        'not_payments': 0,
+        'fallback_labels': 0
+    }
+    
+    try:
+        logger.info("="*80)
+        logger.info(f"DÉBUT DU TRAITEMENT STRIPE (JSON, décodeur {json_loads.__module__})")
+        logger.info("="*80)
+        
+        for index, record in iter_json_records(file_in_memory):
+            stats['total_rows'] += 1
+            try:
+                transaction = record_transaction(record)
+                if transaction is None:
+                    logger.debug(f"Objet {index}: {record.get('object')} / {record.get('type')} non journalisé")
+                    stats['skipped_rows'] += 1
+                    stats['not_payments'] += 1
+                    continue
+                
+                Date, mail, amount = transaction
+                if not mail:
+                    # Source non développée: libellé de repli plutôt qu'un paiement perdu
+                    mail = fallback_label(record)
+                    stats['fallback_labels'] += 1
+                if not mail:
+                    logger.warning(f"Objet {index}: Email client et identifiants manquants, ligne ignorée")
+                    stats['skipped_rows'] += 1
+                    continue
+                if amount <= 0:
+                    logger.warning(f"Objet {index}: Montant invalide ou nul ({amount}), ligne ignorée")
+                    stats['skipped_rows'] += 1
+                    continue
+                
+                lines, amount_ht, Tva_collect = transaction_lines(Date, mail, amount)
+                out_data.extend(lines)
+                
+                stats['processed_rows'] += 1
+                stats['total_amount'] += amount
+                stats['total_ht'] += amount_ht
+                stats['total_tva'] += Tva_collect
+            
+            except (ValueError, AttributeError) as e:
+                logger.error(f"Objet {index}: Erreur de conversion - {e}")
+                PRINT_ERR(f"[ERREUR] Objet {index}: Impossible de traiter l'objet Stripe: {e}")
+                stats['errors'] += 1
+                stats['skipped_rows'] += 1
+        
+        if counts is not None:
+            counts['rows'] = stats['total_rows']
+        if not stats['total_rows']:
+            logger.warning("Le fichier est vide (aucun objet)")
+            PRINT_ERR(f"[AVERTISSEMENT] Le fichier Stripe est vide")
+            return []
+        
+        if stats['not_payments']:
+            logger.info(f"{stats['not_payments']} objet(s) hors paiements ignoré(s) "
+                        f"(remboursements, frais, virements...)")
+        if stats['fallback_labels']:
+            logger.warning(f"⚠️  {stats['fallback_labels']} paiement(s) sans email client, libellés par "
+                           f"l'identifiant de la charge ou la description (source non développée)")
+        
+        # Tri des données par (date, journal) sur une clé entière précalculée
+        if out_data:
+            sort_lines(out_data)
+            logger.info("✓ Données triées par date et journal")
+        
+        log_summary(stats, out_data)
+        
+        return out_data
+    
+    except ValueError as e:
+        # JSON mal formé (les lignes JSONL valides qui précèdent ne sont pas conservées)
+        logger.error(f"Export Stripe JSON invalide: {e}")
+        PRINT_ERR(f"[ERREUR] Export Stripe JSON invalide: {e}")
+        return []
+    
+    except Exception as e:
+        logger.exception("Erreur critique lors du traitement de l'export Stripe JSON")
+        PRINT_ERR(f"[ERREUR] Problème avec le traitement de l'export Stripe JSON: {e}")
+        return []
@@ -0,0 +1,49 @@
+import pytest
+
+from aggregation import aggregate_lines
+
+
+def _line(journal, account, debit, credit, reference, analytic=None, day='18/10/2026'):
+    return [journal, day, None, account, analytic, reference, day, debit, credit,
+            '', '', '', '', '', '', reference, '', '', '', '', '']
+
+
+LINES = [
+    _line('VE', '411SHOPI', 30.0, None, '#1001'),
+    _line('VE', 707101, None, 25.0, '#1001', 'REVOFFPBOOK'),
+    _line('VE', 445713, None, 5.0, '#1001'),
+    _line('VE', '411SHOPI', 20.0, None, '#1002'),
+    _line('VE', 707300, None, 20.0, '#1002', 'REVOFFPBOOK'),
+]
+
+
+def _totals(lines):
+    return sorted((str(line[3]), line[5], line[7], line[8]) for line in lines)
+
+
+def test_transaction_granularity_keeps_lines():
+    assert aggregate_lines(LINES, 'shopify', 'transaction') is LINES
+
+
+def test_day_granularity():
+    assert _totals(aggregate_lines(LINES, 'shopify', 'day')) == [
+        ('411SHOPI', 'Shopify', 50.0, None),
+        ('445713', 'Shopify', None, 5.0),
+        ('707101', 'Shopify', None, 25.0),
+        ('707300', 'Shopify', None, 20.0),
+    ]
+
+
+def test_day_category_granularity_splits_orders_by_category():
+    assert _totals(aggregate_lines(LINES, 'shopify', 'day_category')) == [
+        ('411SHOPI', 'Shopify France', 30.0, None),
+        ('411SHOPI', 'Shopify Hors UE', 20.0, None),
+        ('445713', 'Shopify France', None, 5.0),
+        ('707101', 'Shopify France', None, 25.0),
+        ('707300', 'Shopify Hors UE', None, 20.0),
+    ]
+
+
+def test_unknown_granularity():
+    with pytest.raises(ValueError):
+        aggregate_lines(LINES, 'shopify', 'month')
@@ -0,0 +1,29 @@
+import io
+
+import pandas as pd
+
+from clorian import clorian, clorian_batch
+
+
+def _workbook(rows):
+    buffer = io.BytesIO()
+    pd.DataFrame(rows, columns=['Méthode de paiement', 'Montant (€)', 'Montant (HT)', 'TVA (€)']).to_excel(
+        buffer, sheet_name='Resultado consulta', index=False)
+    return buffer.getvalue()
+
+
+def _key(line):
+    return (line[3], line[7] or 0, line[8] or 0)
+
+
+def test_batch_keeps_both_files_of_the_same_date():
+    arles = _workbook([['Carte bancaire', 10.0, 8.33, 1.67], ['Total', 10.0, 8.33, 1.67]])
+    nimes = _workbook([['Carte bancaire', 25.0, 20.83, 4.17], ['Total', 25.0, 20.83, 4.17]])
+
+    lines = clorian_batch([(io.BytesIO(arles), '/depots/arles/clorian_18-10-2026.xlsx'),
+                           (io.BytesIO(nimes), '/depots/nimes/clorian_18-10-2026.xlsx')])
+
+    expected = (clorian(io.BytesIO(arles), '/depots/arles/clorian_18-10-2026.xlsx')
+                + clorian(io.BytesIO(nimes), '/depots/nimes/clorian_18-10-2026.xlsx'))
+    assert sorted(map(_key, lines)) == sorted(map(_key, expected))
+    assert len(lines) == 2 * len(clorian(io.BytesIO(arles), 'clorian_18-10-2026.xlsx'))
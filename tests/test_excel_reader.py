@@ -0,0 +1,81 @@
+import io
+from datetime import datetime
+
+import openpyxl
+import pandas as pd
+import pytest
+
+import excel_reader
+
+
+def _workbook(rows):
+    """Classeur .xlsx en mémoire contenant les lignes fournies."""
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    for row in rows:
+        sheet.append(row)
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    buffer.seek(0)
+    return buffer
+
+
+# Export Shopify: en-têtes, cellules de types mixtes (dates, nombres, texte, vides), ligne de total
+SHOPIFY_ROWS = [
+    ['Date', 'Order Name', 'Total Sales', 'Shipping Country', 'Net Sales', 'Shipping', 'Tax', 'Note'],
+    [datetime(2026, 10, 18, 9, 30), '#1001', 31.2, 'France', 26, 4.9, 5.2, None],
+    ['2026-10-18 10:00:00', 1002, '12.50', 'Italy', '10.42', '', '2.08', 'TVA'],
+    ['2026-10-18 11:15:00', '#1003', 0.1 + 0.2, 'United States', 0.3, None, 0, ''],
+    [None, None, 43.7, None, 36.42, 4.9, 7.28, None],
+]
+
+# Fichier Skidata: sans en-têtes, code produit, type de paiement, montant TTC, TVA
+SKIDATA_ROWS = [
+    ['P01', 'Espèces', 5, 0.83],
+    ['P02', 'CB Caisse Auto', 19.5, 3.25],
+    ['S01', 'CB Borne Sortie', '8,00', '1,33'],
+    [None, None, None, None],
+    ['Total', None, 32.5, 5.41],
+]
+
+
+@pytest.mark.parametrize('rows, read_kwargs', [
+    (SHOPIFY_ROWS, {'dtype': str}),
+    (SHOPIFY_ROWS, {}),
+    (SKIDATA_ROWS, {'header': None, 'dtype': str}),
+], ids=['shopify-str', 'shopify', 'skidata'])
+def test_calamine_openpyxl_parity(rows, read_kwargs):
+    pytest.importorskip('python_calamine')
+    source = _workbook(rows)
+
+    frames = {}
+    for engine in ['openpyxl', 'calamine']:
+        source.seek(0)
+        frames[engine] = pd.read_excel(source, engine=engine, **read_kwargs)
+
+    pd.testing.assert_frame_equal(frames['openpyxl'], frames['calamine'])
+    assert excel_reader.compare_engines(source, **read_kwargs)
+
+
+def test_sheet_argument():
+    assert excel_reader.sheet_name('0') == 0
+    assert excel_reader.sheet_name('12') == 12
+    assert excel_reader.sheet_name('Resultado consulta') == 'Resultado consulta'
+
+
+def test_legacy_xls_skips_openpyxl(monkeypatch):
+    source = io.BytesIO(excel_reader.XLS_SIGNATURE + b'\x00' * 504)
+    assert excel_reader.is_legacy_xls(source)
+    assert not excel_reader.is_legacy_xls(_workbook(SKIDATA_ROWS))
+
+    engines = []
+
+    def fake_read_excel(src, engine=None, **kwargs):
+        engines.append(engine)
+        return pd.DataFrame()
+
+    monkeypatch.setattr(pd, 'read_excel', fake_read_excel)
+    monkeypatch.setitem(excel_reader._config, 'cache_dir', None)
+    excel_reader.read_excel(source, engine='openpyxl', header=None, dtype=str)
+
+    assert engines == ['calamine' if excel_reader.calamine_available() else 'xlrd']
@@ -0,0 +1,87 @@
+import json
+
+from journal_diff import JournalIndex
+
+
+def _line(account, debit, credit, label='Clorian', day='18/10/2026'):
+    return ['VE', day, None, account, None, label, day, debit, credit,
+            '', '', '', '', '', '', '', '', '', '', '', '']
+
+
+def test_same_name_in_different_directories(tmp_path):
+    path = tmp_path / 'lignes_emises.json'
+    arles = [_line('411CLO', 10.0, None), _line('706100', None, 10.0)]
+    nimes = [_line('411CLO', 25.0, None), _line('706100', None, 25.0)]
+
+    index = JournalIndex(str(path))
+    assert index.diff('/depots/arles/clorian_18-10-2026.xlsx', arles)[1:] == (2, 0)
+    assert index.diff('/depots/nimes/clorian_18-10-2026.xlsx', nimes)[1:] == (2, 0)
+    index.save()
+
+    # Retraitement à l'identique: aucune ligne pour aucun des deux fichiers
+    index = JournalIndex(str(path))
+    assert index.diff('/depots/arles/clorian_18-10-2026.xlsx', arles) == ([], 0, 0)
+    assert index.diff('/depots/nimes/clorian_18-10-2026.xlsx', nimes) == ([], 0, 0)
+
+
+def test_legacy_basename_entry_is_taken_over_once(tmp_path):
+    path = tmp_path / 'lignes_emises.json'
+    lines = [_line('411CLO', 10.0, None), _line('706100', None, 10.0)]
+    legacy = JournalIndex(str(path))
+    legacy.diff('clorian_18-10-2026.xlsx', lines)
+    legacy.save()
+
+    index = JournalIndex(str(path))
+    assert index.diff('/depots/arles/clorian_18-10-2026.xlsx', lines) == ([], 0, 0)
+    # Un second fichier du même nom ne reprend pas l'entrée déjà reprise
+    assert index.diff('/depots/nimes/clorian_18-10-2026.xlsx', lines)[1:] == (2, 0)
+    index.save()
+
+    with open(path, encoding='utf-8') as f:
+        assert sorted(json.load(f)) == ['/depots/arles/clorian_18-10-2026.xlsx',
+                                        '/depots/nimes/clorian_18-10-2026.xlsx']
+
+
+def test_corrected_file_emits_additions_and_reversals(tmp_path):
+    path = tmp_path / 'lignes_emises.json'
+    source = '/depots/arles/clorian_18-10-2026.xlsx'
+    first = [_line('411CLO', 10.0, None), _line('706100', None, 10.0), _line('706100', None, 10.0)]
+    index = JournalIndex(str(path))
+    index.diff(source, first)
+    index.save()
+
+    # Une ligne répétée disparaît, un montant est corrigé
+    corrected = [_line('411CLO', 12.0, None), _line('706100', None, 10.0)]
+    index = JournalIndex(str(path))
+    emitted, additions, reversals = index.diff(source, corrected)
+
+    assert (additions, reversals) == (1, 2)
+    assert sorted((line[3], line[7] or 0, line[8] or 0) for line in emitted) == [
+        ('411CLO', 0, 10.0), ('411CLO', 12.0, 0), ('706100', 10.0, 0)]
+
+
+def test_state_is_pending_until_save(tmp_path):
+    path = tmp_path / 'lignes_emises.json'
+    source = '/depots/arles/clorian_18-10-2026.xlsx'
+    lines = [_line('411CLO', 10.0, None), _line('706100', None, 10.0)]
+
+    index = JournalIndex(str(path))
+    index.diff(source, lines)
+    assert source in index.pending and index.files == {}
+    assert not path.exists()
+    # Sans enregistrement, le fichier est de nouveau émis en entier
+    assert index.diff(source, lines)[1:] == (2, 0)
+
+    index.save()
+    assert index.pending == {}
+    assert JournalIndex(str(path)).diff(source, lines) == ([], 0, 0)
+
+
+def test_in_memory_index_is_not_written(tmp_path):
+    lines = [_line('411CLO', 10.0, None)]
+    index = JournalIndex(None)
+    index.diff('clorian_18-10-2026.xlsx', lines)
+    index.save()
+
+    assert index.diff('clorian_18-10-2026.xlsx', lines) == ([], 0, 0)
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,38 @@
+from ledger import Ledger
+
+
+def _line(account, debit, credit, day='18/10/2026'):
+    return ['CA', day, None, account, None, 'Clorian', day, debit, credit,
+            '', '', '', '', '', '', '', '', '', '', '', '']
+
+
+def _balance(ledger):
+    return {account: (debit, credit) for account, debit, credit in ledger.trial_balance()}
+
+
+def test_replace_file_replaces_previous_entries_of_the_same_output(tmp_path):
+    ledger = Ledger(str(tmp_path / 'grand_livre.sqlite'))
+    source = '/depots/arles/clorian_18-10-2026.xlsx'
+    ledger.replace_file('/sorties/arles.csv', source, 'clorian', [_line('467300', 10.0, None)])
+    ledger.replace_file('/sorties/nimes.csv', source, 'clorian', [_line('467300', 5.0, None)])
+
+    count = ledger.replace_file('/sorties/arles.csv', source, 'clorian', [_line('467300', 12.5, None)])
+
+    assert count == 1
+    # Les écritures de l'autre sortie sont conservées
+    assert _balance(ledger) == {'467300': (1750, 0)}
+    ledger.close()
+
+
+def test_replace_file_replaces_legacy_basename_entries(tmp_path):
+    ledger = Ledger(str(tmp_path / 'grand_livre.sqlite'))
+    # Base antérieure: sortie inconnue, fichier source rattaché par son seul nom
+    ledger.replace_file('', 'clorian_18-10-2026.xlsx', 'clorian', [_line('467300', 10.0, None)])
+    ledger.replace_file('', 'clorian_19-10-2026.xlsx', 'clorian', [_line('467300', 3.0, None, '19/10/2026')])
+
+    ledger.replace_file('/sorties/arles.csv', '/depots/arles/clorian_18-10-2026.xlsx', 'clorian',
+                        [_line('467300', 12.5, None)])
+
+    assert _balance(ledger) == {'467300': (1550, 0)}
+    assert [line[7] for line in ledger.extract()] == [12.5, 3.0]
+    ledger.close()
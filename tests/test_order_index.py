@@ -0,0 +1,40 @@
+import json
+
+from order_index import OrderIndex
+
+
+def _line(account, debit, credit, reference):
+    return ['VE', '18/10/2026', None, account, None, reference, '18/10/2026', debit, credit,
+            '', '', '', '', '', '', reference, '', '', '', '', '']
+
+
+def test_modified_ignores_new_and_unchanged_orders(tmp_path):
+    index = OrderIndex(str(tmp_path / 'commandes.json'))
+    index.update({'#1001': 'a', '#1002': 'b'})
+
+    assert index.modified({'#1001': 'a', '#1002': 'c', '#1003': 'd'}) == ['#1002']
+
+
+def test_reversals_of_modified_orders(tmp_path):
+    path = tmp_path / 'commandes.json'
+    index = OrderIndex(str(path))
+    lines = {'#1001': [_line('411SHOPI', 30.0, None, '#1001'), _line('707101', None, 30.0, '#1001')]}
+    index.update({'#1001': 'a'}, lines)
+    index.save()
+
+    index = OrderIndex(str(path))
+    reversed_lines = index.reversals(index.modified({'#1001': 'b'}))
+
+    assert sorted((line[3], line[7] or 0, line[8] or 0) for line in reversed_lines) == [
+        ('411SHOPI', 0, 30.0), ('707101', 30.0, 0)]
+
+
+def test_legacy_index_has_no_lines_to_reverse(tmp_path):
+    path = tmp_path / 'commandes.json'
+    path.write_text(json.dumps({'#1001': 'a'}), encoding='utf-8')
+
+    index = OrderIndex(str(path))
+
+    assert index.get('#1001') == 'a'
+    assert index.modified({'#1001': 'b'}) == ['#1001']
+    assert index.reversals(['#1001']) == []
@@ -0,0 +1,44 @@
+from datetime import date
+
+import reconciliation
+from reconciliation import Record, MATCHED, MISMATCHED, UNMATCHED
+
+
+def _record(source, day, cents, reference):
+    return Record(source, date(2026, 10, day), cents, reference)
+
+
+def test_transactions_match_within_tolerance_and_window():
+    orders = [
+        _record('shopify', 10, 3120, '#1001'),  # exact
+        _record('shopify', 11, 1250, '#1002'),  # un jour d'écart
+        _record('shopify', 12, 4370, '#1003'),  # 2 centimes d'écart
+        _record('shopify', 20, 9900, '#1004'),  # hors fenêtre
+    ]
+    payments = [
+        _record('stripe', 10, 3120, 'a@example.org'),
+        _record('stripe', 12, 1250, 'b@example.org'),
+        _record('stripe', 12, 4368, 'c@example.org'),
+        _record('stripe', 12, 4375, 'd@example.org'),
+        _record('stripe', 25, 9900, 'e@example.org'),
+    ]
+
+    matches = reconciliation.reconcile_transactions(orders, payments, date_window_days=1,
+                                                    amount_tolerance_cents=5)
+    by_order = {match.record_a.reference: match for match in matches if match.record_a.source == 'shopify'}
+
+    assert by_order['#1001'].status == MATCHED
+    assert by_order['#1002'].status == MATCHED
+    assert by_order['#1003'].status == MISMATCHED
+    assert by_order['#1003'].record_b.reference == 'c@example.org'  # le montant le plus proche
+    assert by_order['#1004'].status == UNMATCHED
+    unmatched_payments = {match.record_a.reference for match in matches if match.record_a.source == 'stripe'}
+    assert unmatched_payments == {'d@example.org', 'e@example.org'}
+
+
+def test_daily_totals_tolerance():
+    stripe = [_record('stripe', 10, 1000, 'x'), _record('stripe', 10, 2001, 'y')]
+    clorian = [_record('clorian_tpe', 10, 2998, 'CB TPE Virtuel')]
+
+    assert reconciliation.reconcile_daily_totals(stripe, clorian, 1)[0].status == MISMATCHED
+    assert reconciliation.reconcile_daily_totals(stripe, clorian, 3)[0].status == MATCHED
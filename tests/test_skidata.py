@@ -0,0 +1,29 @@
+import io
+
+from skidata import treat_skidata_file
+
+
+def _amounts(lines):
+    return {line[3]: line[7] if line[7] is not None else line[8] for line in lines}
+
+
+def test_malformed_rows_are_counted():
+    source = io.BytesIO("11;3;12,50;1,14\n41;3;8,00;0,73;x;y\n20;1;5,00;0,45\n".encode('utf-8'))
+    counts = {}
+
+    lines = treat_skidata_file(source, 'rapport_jour_20261017.csv', counts)
+
+    assert counts == {'rows': 3, 'bad_lines': 1}
+    amounts = _amounts(lines)
+    assert amounts[511311] == 12.5
+    assert amounts[511312] == 0.0  # ligne de la borne de sortie écartée
+    assert amounts[539002] == 5.0
+
+
+def test_well_formed_file_has_no_bad_lines():
+    source = io.BytesIO("11;3;12,50;1,14\n41;3;8,00;0,73\n".encode('utf-8'))
+    counts = {}
+
+    treat_skidata_file(source, 'rapport_jour_20261017.csv', counts)
+
+    assert counts == {'rows': 2, 'bad_lines': 0}
@@ -0,0 +1,40 @@
+import io
+import json
+from datetime import datetime
+
+import stripe
+
+CREATED = int(datetime(2026, 10, 18, 12, 0).timestamp())
+
+
+def _jsonl(records):
+    return io.BytesIO(b'\n'.join(json.dumps(record).encode('utf-8') for record in records))
+
+
+def test_unexpanded_balance_transactions():
+    # Export standard: 'source' est l'identifiant de la charge, sans email client
+    source = _jsonl([
+        {'id': 'txn_1', 'object': 'balance_transaction', 'type': 'charge', 'amount': 3120,
+         'currency': 'eur', 'created': CREATED, 'source': 'ch_1', 'description': 'Billet adulte'},
+        {'id': 'txn_2', 'object': 'balance_transaction', 'type': 'charge', 'amount': 1250,
+         'currency': 'eur', 'created': CREATED, 'source': None, 'description': 'Billet enfant'},
+        {'id': 'txn_3', 'object': 'balance_transaction', 'type': 'stripe_fee', 'amount': -30,
+         'currency': 'eur', 'created': CREATED, 'source': None},
+    ])
+    counts = {}
+
+    lines = stripe.st(source, counts)
+
+    assert counts == {'rows': 3}
+    assert len(lines) == 10
+    assert {line[5] for line in lines} == {'ch_1', 'Billet enfant'}
+    assert {line[1] for line in lines} == {'18/10/2026'}
+    assert round(sum(line[7] or 0 for line in lines if line[0] == 'B5'), 2) == 43.7
+
+
+def test_email_preferred_over_fallback_label():
+    record = {'id': 'txn_1', 'object': 'balance_transaction', 'type': 'charge', 'amount': 500,
+              'currency': 'eur', 'created': CREATED,
+              'source': {'id': 'ch_1', 'billing_details': {'email': 'a@example.org'}}}
+
+    assert stripe.st(_jsonl([record]))[0][5] == 'a@example.org'